@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class FeAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'FE_App'
+
+    def ready(self):
+        # Warm-up opcional de los modelos ML (ver ML_Nutricion/calentamiento.py)
+        if getattr(settings, 'ML_CALENTAMIENTO', False):
+            from ML_Nutricion.calentamiento import debe_calentar, calentar
+            if debe_calentar():
+                calentar()
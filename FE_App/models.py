@@ -2,6 +2,7 @@ from django.db import models
 from django.db.models import Q
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from ML_Nutricion.cache import cache_macros
 
 class UserProfile(models.Model):
     SEXO_CHOICES = [
@@ -70,6 +71,9 @@ class UserProfile(models.Model):
 
         super().save(*args, **kwargs)
 
+        # Invalidar la predicción de macronutrientes cacheada para este usuario
+        cache_macros.invalidar_usuario(self.usuario_id)
+
     
     def __str__(self):
         return f"Perfil de {self.usuario.username}"
@@ -1,3 +1,242 @@
-from django.test import TestCase
+import json
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import include, path
+
+from ML_Nutricion import calentamiento
+from ML_Nutricion.cache import cache_macros
+from ML_Nutricion.ejecutor import ejecutor_ml
+from ML_Nutricion.predictor import registro_macros
+from . import views
+from .models import PlanEntrenamiento, UserProfile
+
+# Las vistas async sólo se enrutan con settings.ML_VISTAS_ASYNC (ver urls.py):
+# para los tests se ponen delante de las del proyecto
+urlpatterns = [
+    path('generar-plan-inteligente/', views.generar_plan_inteligente_async, name='generar_plan_inteligente'),
+    path('api/macronutrientes/', views.get_macronutrientes_async, name='get_macronutrientes'),
+    path('', include('FitEvolution.urls')),
+]
+
+PERFIL = {
+    'edad': 30, 'sexo': 'M', 'peso': 80, 'altura': 180, 'nivel_actividad': 'moderado',
+    'objetivo': 'hipertrofia', 'porcentaje_grasa': 20,
+}
+MACROS = {'calorias': 2000, 'proteinas': 150, 'carbohidratos': 200, 'grasas': 60}
+
+
+def crear_usuario(username, is_staff=False, con_perfil=True):
+    usuario = get_user_model().objects.create_user(username, password='clave', is_staff=is_staff)
+    if con_perfil:
+        UserProfile.objects.create(usuario=usuario, **PERFIL)
+    return usuario
+
+
+class MacronutrientesLoteTests(TestCase):
+    url = '/api/macronutrientes/lote/'
+
+    def setUp(self):
+        self.client.force_login(crear_usuario('entrenador', is_staff=True))
+
+    def _post(self, cuerpo):
+        return self.client.post(self.url, cuerpo, content_type='application/json')
+
+    def test_solo_post_y_staff(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.client.force_login(crear_usuario('cliente'))
+        self.assertEqual(self._post(json.dumps({'usuarios': [1]})).status_code, 403)
+
+    def test_entrada_invalida_400(self):
+        cuerpos = [
+            'no es json',
+            '[1, 2]',
+            '{}',
+            json.dumps({'usuarios': ['abc']}),
+            json.dumps({'usuarios': 5}),
+            json.dumps({'perfiles': [1, 2]}),
+            json.dumps({'perfiles': [{}]}),
+            json.dumps({'perfiles': [dict(PERFIL, peso=None)]}),
+        ]
+        for cuerpo in cuerpos:
+            with self.subTest(cuerpo=cuerpo):
+                self.assertEqual(self._post(cuerpo).status_code, 400)
+
+    @mock.patch.object(views, 'predecir_lote', return_value={'resultados': [MACROS], 'metricas': {}})
+    def test_perfiles(self, predecir_lote):
+        response = self._post(json.dumps({'perfiles': [PERFIL]}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['resultados'], [MACROS])
+        predecir_lote.assert_called_once_with([PERFIL])
+
+    @mock.patch.object(views, 'predecir_lote_usuarios', return_value={'resultados': {3: MACROS}, 'no_encontrados': []})
+    def test_usuarios(self, predecir_lote_usuarios):
+        response = self._post(json.dumps({'usuarios': [3, '4']}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['resultados'], {'3': MACROS})
+        self.assertEqual(list(predecir_lote_usuarios.call_args.args[0]), [3, 4])
+
+
+class PerfilCacheTests(TestCase):
+
+    def test_guardar_perfil_invalida_su_prediccion(self):
+        self.addCleanup(cache_macros.limpiar)
+        usuario = crear_usuario('cliente')
+        otro = crear_usuario('otro')
+        cache_macros.set('clave', MACROS, usuario.id)
+        cache_macros.set('otra', MACROS, otro.id)
+
+        usuario.profile.peso = 75
+        usuario.profile.save()
+        self.assertIsNone(cache_macros.get('clave'))
+        self.assertEqual(cache_macros.get('otra'), MACROS)
+
+
+class SinModeloTests(TestCase):
+    """Checkout sin ningún paquete del modelo de macronutrientes publicado."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        for parche in (mock.patch.object(registro_macros, 'directorio', directorio.name),
+                       mock.patch.object(registro_macros, '_activo', None)):
+            parche.start()
+            self.addCleanup(parche.stop)
+        self.client.force_login(crear_usuario('entrenador', is_staff=True))
+
+    def test_macronutrientes_503(self):
+        response = self.client.get('/api/macronutrientes/')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('MacroNutrientes.py', response.json()['error'])
+
+    def test_lote_503(self):
+        response = self.client.post('/api/macronutrientes/lote/', json.dumps({'perfiles': [PERFIL]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class VistasAsyncTests(TestCase):
+    fixtures = ['entrenamiento_data.json']
+
+    def setUp(self):
+        self.usuario = crear_usuario('cliente')
+        self.client.force_login(self.usuario)
+
+    def test_sin_sesion_redirige_al_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/macronutrientes/').status_code, 302)
+
+    @mock.patch.object(views, 'predecir_perfil', return_value=MACROS)
+    def test_macronutrientes(self, _):
+        response = self.client.get('/api/macronutrientes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), MACROS)
+
+    def test_macronutrientes_sin_perfil_404(self):
+        self.client.force_login(crear_usuario('sin_perfil', con_perfil=False))
+        self.assertEqual(self.client.get('/api/macronutrientes/').status_code, 404)
+
+    def test_ejecutor_saturado_503(self):
+        with mock.patch.object(ejecutor_ml, 'max_pendientes', 0):
+            for url in ('/api/macronutrientes/', '/generar-plan-inteligente/'):
+                with self.subTest(url=url):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 503)
+                    self.assertEqual(response['Retry-After'], '1')
+
+    def test_generar_plan(self):
+        self.assertEqual(self.client.get('/generar-plan-inteligente/').status_code, 200)
+        response = self.client.post('/generar-plan-inteligente/')
+        self.assertEqual(response.status_code, 302)
+        plan = PlanEntrenamiento.objects.get(usuario=self.usuario, estado='activo')
+        self.assertTrue(plan.dias.exists())
+
+
+class MetricasMLTests(TestCase):
+    url = '/api/ml/metricas/'
+
+    def test_sin_token_solo_staff(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(crear_usuario('cliente'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(crear_usuario('entrenador', is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(ML_METRICAS_TOKEN='secreto')
+    def test_token(self):
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+        for cabecera in ('Bearer otro', 'secreto', ''):
+            with self.subTest(cabecera=cabecera):
+                self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=cabecera).status_code, 403)
+
+    @override_settings(ML_METRICAS_TOKEN=None)
+    def test_sin_token_configurado(self):
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer None').status_code, 403)
+
+
+class CalentamientoTests(TestCase):
+    url = '/api/ml/listo/'
+
+    def setUp(self):
+        estado = {'activo': False, 'listo': False, 'error': None, 'tiempo_s': None, 'etapas': {}}
+        parches = [
+            mock.patch.dict(calentamiento.estado, estado),
+            mock.patch.object(calentamiento, '_calentar_plan'),
+        ]
+        for parche in parches:
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_sin_calentamiento_esta_listo(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_listo_cuando_termina_el_calentamiento(self):
+        calentamiento.estado['activo'] = True  # calentando en el hilo de arranque
+        with mock.patch.object(calentamiento, 'calentar') as calentar:
+            self.assertEqual(self.client.get(self.url).status_code, 503)
+            calentar.assert_not_called()
+
+        with mock.patch.object(calentamiento, '_calentar_macros'):
+            calentamiento.calentar()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['etapas']), {'macronutrientes', 'plan_entrenamiento'})
+
+    def test_reintenta_tras_un_fallo(self):
+        with mock.patch.object(calentamiento, '_calentar_macros', side_effect=FileNotFoundError('ACTIVO')):
+            calentamiento.calentar()
+        self.assertEqual(self.client.get(self.url).status_code, 503)
+
+        # Ya se puede cargar el modelo, pero no ha pasado REINTENTO_S desde el último intento
+        with mock.patch.object(calentamiento, '_calentar_macros') as calentar_macros:
+            self.assertEqual(self.client.get(self.url).status_code, 503)
+            calentar_macros.assert_not_called()
+            with mock.patch.object(calentamiento, 'REINTENTO_S', 0):
+                response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['error'])
+
+    @override_settings(ML_CALENTAMIENTO=True)
+    def test_debe_calentar(self):
+        casos = [
+            (['manage.py', 'migrate'], False),
+            (['django-admin', 'shell'], False),
+            (['/usr/lib/python3/site-packages/django/__main__.py', 'collectstatic'], False),
+            (['manage.py', 'runserver'], False),          # proceso del autoreloader
+            (['manage.py', 'runserver', '--noreload'], True),
+            (['gunicorn', 'FitEvolution.wsgi'], True),
+            (['uvicorn', 'FitEvolution.asgi:application'], True),
+            (['gunicorn'], True),
+        ]
+        with mock.patch.dict('os.environ', clear=False) as entorno:
+            entorno.pop('RUN_MAIN', None)
+            for argv, esperado in casos:
+                with self.subTest(argv=argv):
+                    self.assertIs(calentamiento.debe_calentar(argv), esperado)
+            entorno['RUN_MAIN'] = 'true'
+            self.assertTrue(calentamiento.debe_calentar(['manage.py', 'runserver']))
+        with override_settings(ML_CALENTAMIENTO=False):
+            self.assertFalse(calentamiento.debe_calentar(['gunicorn', 'FitEvolution.wsgi']))
@@ -1,6 +1,15 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# En despliegues ASGI los endpoints con ML usan sus versiones async
+if settings.ML_VISTAS_ASYNC:
+    vista_macronutrientes = views.get_macronutrientes_async
+    vista_generar_plan = views.generar_plan_inteligente_async
+else:
+    vista_macronutrientes = views.get_macronutrientes
+    vista_generar_plan = views.generar_plan_inteligente
+
 urlpatterns = [
     path('', views.home, name='home'),  
     path('login/', views.login_view, name='login'),  
@@ -23,7 +32,11 @@ urlpatterns = [
     path('entrenamiento/', views.dashboard_entrenamiento, name='dashboard_entrenamiento'),
     path('plan/<int:plan_id>/', views.ver_plan_entrenamiento, name='ver_plan_entrenamiento'),
     path('plan/<int:plan_id>/editar/', views.editar_plan_entrenamiento, name='editar_plan_entrenamiento'),
-    path('generar-plan-inteligente/', views.generar_plan_inteligente, name='generar_plan_inteligente'),
-    path('api/macronutrientes/', views.get_macronutrientes, name='get_macronutrientes'),
+    path('generar-plan-inteligente/', vista_generar_plan, name='generar_plan_inteligente'),
+    path('api/macronutrientes/', vista_macronutrientes, name='get_macronutrientes'),
+    path('api/macronutrientes/lote/', views.get_macronutrientes_lote, name='get_macronutrientes_lote'),
+    path('api/macronutrientes/stats/', views.get_macronutrientes_stats, name='get_macronutrientes_stats'),
+    path('api/ml/metricas/', views.get_metricas_ml, name='get_metricas_ml'),
+    path('api/ml/listo/', views.ml_listo, name='ml_listo'),
 
 ]
@@ -1,6 +1,7 @@
-import joblib
-import os
-import numpy as np
+import hmac
+import json
+import logging
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.http import JsonResponse
 
@@ -16,8 +17,18 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
 from .forms import CustomUserCreationForm, UserProfileStep1Form, UserProfileStep2Form, UserProfileEditForm, PlanEntrenamientoForm, DiaEntrenamientoForm, DiaEjercicioForm
 from .models import UserProfile, PlanEntrenamiento, DiaEntrenamiento, DiaEjercicio, GrupoMuscular, Ejercicio
+from ML_Nutricion.cache import cache_macros
+from ML_Nutricion.features import CAMPOS_REQUERIDOS
+from ML_Nutricion.ejecutor import ejecutor_ml, EjecutorSaturado
+from ML_Nutricion.metricas import metricas_ml
+from ML_Nutricion import calentamiento
+from ML_Nutricion.predictor import (
+    ModeloNoDisponible, registro_macros, predecir_perfil, predecir_lote, predecir_lote_usuarios
+)
 from datetime import date, timedelta
 
+logger = logging.getLogger(__name__)
+
 def clear_messages(request, message_types=None):
     """
     Función auxiliar para limpiar mensajes específicos de la sesión
@@ -32,6 +43,17 @@ def clear_messages(request, message_types=None):
         # Limpiar todos los mensajes
         storage.used = True
 
+def _con_version(response):
+    """Añade a la respuesta la versión del modelo de macronutrientes activa en el worker."""
+    if registro_macros.version is not None:
+        response['X-Modelo-Version'] = registro_macros.version
+    return response
+
+def _respuesta_sin_modelo(e):
+    """503 mientras no se haya entrenado y publicado el modelo de macronutrientes (ver README)."""
+    logger.warning("%s", e)
+    return JsonResponse({'error': str(e)}, status=503)
+
 @login_required
 def get_macronutrientes(request):
     try:
@@ -39,80 +61,101 @@ def get_macronutrientes(request):
     except UserProfile.DoesNotExist:
         return JsonResponse({'error': 'Perfil no encontrado'}, status=404)
 
-    # Mapear los datos del perfil al formato esperado por el modelo
-    genero_map = {'M': 'Masculino', 'F': 'Femenino', 'O': 'Otro'}
-    nivel_exp_map = {
-        'principiante': 'Principiante',
-        'intermedio': 'Intermedio',
-        'avanzado': 'Avanzado'
-    }
+    try:
+        # Mapear el perfil a features y predecir (con caché) usando el modelo del worker
+        return _con_version(JsonResponse(predecir_perfil(profile, usuario_id=request.user.id)))
 
-    # Obtener valores del perfil con valores por defecto seguros
-    datos_usuario = {
-        'Edad': int(profile.edad or 25),
-        'Género': genero_map.get(profile.sexo, 'Masculino'),
-        'Peso_(kg)': float(profile.peso or 70),
-        'Altura_(m)': float(profile.altura or 1.70) / 100,  # Convertir cm a m
-        'Frecuencia_entrenamiento_(días/semana)': 5,  # Valor por defecto
-        'Duración_sesión_(horas)': 1.0,  # Valor por defecto
-        'Nivel_experiencia': nivel_exp_map.get(profile.nivel_actividad, 'Intermedio'),
-        'Objetivo': getattr(profile, 'objetivo', 'Mantener peso'),
-        'Porcentaje_grasa': float(getattr(profile, 'porcentaje_grasa', 20.0)),
-        'Masa_magra_(kg)': float(profile.peso or 70) * (1 - (float(getattr(profile, 'porcentaje_grasa', 20.0)) / 100))
-    }
+    except ModeloNoDisponible as e:
+        return _respuesta_sin_modelo(e)
+    except Exception as e:
+        # predecir_perfil ya contó el error en metricas_ml
+        logger.exception("Error prediciendo macronutrientes (usuario %s)", request.user.id)
+        return JsonResponse({'error': str(e)}, status=500)
+
+@login_required
+def get_macronutrientes_lote(request):
+    """
+    Predicción de macronutrientes para varios usuarios en una sola petición.
+
+    POST con JSON {"usuarios": [id, ...]} o {"perfiles": [{edad, sexo, peso,
+    altura, nivel_actividad, objetivo, porcentaje_grasa}, ...]}.
+    Sólo disponible para el staff (entrenadores).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
 
     try:
-        # Ruta al modelo y al escalador
-        model_path = os.path.join(settings.BASE_DIR, 'ModelosML', 'MacroNutrientes', 'modelo_macros.pkl')
-        scaler_path = os.path.join(settings.BASE_DIR, 'ModelosML', 'MacroNutrientes', 'scaler.pkl')
-        
-        # Cargar modelo y escalador
-        model = joblib.load(model_path)
-        scaler = joblib.load(scaler_path)
-        
-        # Codificar variables categóricas
-        genero_encoder = {'Masculino': 0, 'Femenino': 1, 'Otro': 2}
-        objetivo_encoder = {'Perder grasa': 0, 'Mantener peso': 1, 'Ganar músculo': 2}
-        nivel_encoder = {'Principiante': 0, 'Intermedio': 1, 'Avanzado': 2}
-
-        # Preparar datos para predicción
-        X_pred = np.array([[
-            datos_usuario['Edad'],
-            genero_encoder[datos_usuario['Género']],
-            datos_usuario['Peso_(kg)'],
-            datos_usuario['Altura_(m)'],
-            datos_usuario['Frecuencia_entrenamiento_(días/semana)'],
-            datos_usuario['Duración_sesión_(horas)'],
-            nivel_encoder[datos_usuario['Nivel_experiencia']],
-            objetivo_encoder.get(datos_usuario['Objetivo'], 1),  # Default a 'Mantener peso'
-            datos_usuario['Porcentaje_grasa'],
-            datos_usuario['Masa_magra_(kg)']
-        ]])
-
-        # Escalar características
-        X_scaled = scaler.transform(X_pred)
-        
-        # Realizar predicción
-        y_pred = model.predict(X_scaled)
-        
-        # Redondear valores
-        proteinas = round(y_pred[0][0])
-        carbohidratos = round(y_pred[0][1])
-        grasas = round(y_pred[0][2])
-        
-        # Calcular calorías totales
-        calorias = (proteinas * 4) + (carbohidratos * 4) + (grasas * 9)
-        
-        return JsonResponse({
-            'calorias': int(calorias),
-            'proteinas': proteinas,
-            'carbohidratos': carbohidratos,
-            'grasas': grasas
-        })
-        
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Se esperaba un objeto JSON'}, status=400)
+
+    # --- Validación de la entrada ---
+    if 'usuarios' in payload:
+        usuarios = payload['usuarios']
+        if not isinstance(usuarios, list) or not all(
+                (isinstance(i, int) and not isinstance(i, bool)) or (isinstance(i, str) and i.isdigit())
+                for i in usuarios):
+            return JsonResponse({'error': '"usuarios" debe ser una lista de ids enteros'}, status=400)
+    elif 'perfiles' in payload:
+        perfiles = payload['perfiles']
+        if not isinstance(perfiles, list) or not all(isinstance(p, dict) for p in perfiles):
+            return JsonResponse({'error': '"perfiles" debe ser una lista de objetos'}, status=400)
+        for n, perfil in enumerate(perfiles):
+            faltan = [c for c in CAMPOS_REQUERIDOS if perfil.get(c) is None]
+            if faltan:
+                return JsonResponse({'error': f'Al perfil {n} le faltan campos: {", ".join(faltan)}'}, status=400)
+    else:
+        return JsonResponse({'error': 'Se requiere "usuarios" o "perfiles"'}, status=400)
+
+    try:
+        if 'usuarios' in payload:
+            lote = predecir_lote_usuarios(int(i) for i in usuarios)
+            lote['resultados'] = {str(k): v for k, v in lote['resultados'].items()}
+        else:
+            lote = predecir_lote(perfiles)
+        return JsonResponse(lote)
+
+    except ModeloNoDisponible as e:
+        return _respuesta_sin_modelo(e)
     except Exception as e:
+        logger.exception("Error en la predicción de macronutrientes por lote")
         return JsonResponse({'error': str(e)}, status=500)
 
+@login_required
+def get_macronutrientes_stats(request):
+    """Estado del modelo de macronutrientes y contadores de la caché (sólo staff)."""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    return JsonResponse({
+        'modelo': registro_macros.stats(),
+        'cache': cache_macros.stats(),
+        'ejecutor': ejecutor_ml.stats(),
+    })
+
+def get_metricas_ml(request):
+    """
+    Histogramas de duración por etapa y errores por tipo de las rutas de ML
+    del worker que atiende la petición. Accesible para el staff o, para los
+    scrapers, con la cabecera "Authorization: Bearer <settings.ML_METRICAS_TOKEN>".
+    (No se mira REMOTE_ADDR: detrás de nginx todas las peticiones llegan de 127.0.0.1.)
+    """
+    token = getattr(settings, 'ML_METRICAS_TOKEN', None)
+    cabecera = request.META.get('HTTP_AUTHORIZATION', '')
+    con_token = bool(token) and hmac.compare_digest(cabecera.encode(), f'Bearer {token}'.encode())
+    if not con_token and not request.user.is_staff:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    return JsonResponse(metricas_ml.stats())
+
+def ml_listo(request):
+    """Readiness para el balanceador: 503 hasta que el warm-up de los modelos termine (reintenta si falló)."""
+    listo = calentamiento.listo(reintentar=True)
+    return JsonResponse({**calentamiento.estado, 'listo': listo}, status=200 if listo else 503)
+
 def login_view(request):
     if request.method == 'POST':
         username = request.POST['username']
@@ -732,10 +775,25 @@ def editar_plan_entrenamiento(request, plan_id):
 
 # ==================== FUNCIONES DE ML PARA PLANES INTELIGENTES ====================
 
-def generar_plan_inteligente_basico(profile):
+# Ejercicios (ids) que el plan inteligente básico usa para cada grupo muscular
+EJERCICIOS_POR_GRUPO = {
+    'Pecho': [1, 2, 3],  # Press Banca, Press Inclinado, Aperturas
+    'Espalda': [6, 7, 8],  # Dominadas, Remo, Jalón
+    'Piernas': [11, 12, 13, 14],  # Sentadilla, Prensa, Peso Muerto, Extensiones
+    'Hombros': [15, 16, 17],  # Press Militar, Elevaciones, Face Pulls
+    'Bíceps': [9, 10],  # Curl Barra, Curl Martillo
+    'Tríceps': [4, 5],  # Fondos, Press Francés
+    'Abdomen': [18, 19]  # Plancha, Crunch
+}
+
+@metricas_ml.medir('plan_inteligente')
+def generar_plan_inteligente_basico(profile, nombres_ejercicios=None):
     """
     Genera un plan de entrenamiento inteligente basado en reglas y datos del perfil
     Esta es una versión simplificada que no requiere modelo ML entrenado
+
+    nombres_ejercicios: dict opcional {id: nombre}; si se pasa no se consulta
+    la base de datos (permite ejecutarla fuera del hilo de la petición).
     """
     # Configuraciones basadas en nivel y objetivo
     configuraciones = {
@@ -812,17 +870,6 @@ def generar_plan_inteligente_basico(profile):
     dias_semana = config['dias_semana']
     distribucion = distribuciones_ejercicios[dias_semana]
     
-    # Seleccionar ejercicios por grupo muscular
-    ejercicios_por_grupo = {
-        'Pecho': [1, 2, 3],  # Press Banca, Press Inclinado, Aperturas
-        'Espalda': [6, 7, 8],  # Dominadas, Remo, Jalón
-        'Piernas': [11, 12, 13, 14],  # Sentadilla, Prensa, Peso Muerto, Extensiones
-        'Hombros': [15, 16, 17],  # Press Militar, Elevaciones, Face Pulls
-        'Bíceps': [9, 10],  # Curl Barra, Curl Martillo
-        'Tríceps': [4, 5],  # Fondos, Press Francés
-        'Abdomen': [18, 19]  # Plancha, Crunch
-    }
-    
     # Calcular parámetros personalizados
     peso_corporal = float(profile.peso)
     
@@ -843,7 +890,7 @@ def generar_plan_inteligente_basico(profile):
         ejercicios_dia = []
         
         for grupo in info_dia['grupos']:
-            ejercicios_disponibles = ejercicios_por_grupo.get(grupo, [])
+            ejercicios_disponibles = EJERCICIOS_POR_GRUPO.get(grupo, [])
             
             # Número de ejercicios por grupo
             if len(info_dia['grupos']) == 1:  # Día enfocado en un solo grupo
@@ -858,11 +905,15 @@ def generar_plan_inteligente_basico(profile):
             
             for ejercicio_id in ejercicios_seleccionados:
                 # Obtener el objeto ejercicio para acceder al nombre
-                try:
-                    ejercicio = Ejercicio.objects.get(id=ejercicio_id)
-                    nombre_ejercicio = ejercicio.nombre_ejercicio
-                except Ejercicio.DoesNotExist:
-                    nombre_ejercicio = f"Ejercicio {ejercicio_id}"
+                if nombres_ejercicios is not None:
+                    nombre_ejercicio = nombres_ejercicios.get(ejercicio_id, f"Ejercicio {ejercicio_id}")
+                else:
+                    try:
+                        with metricas_ml.etapa('plan_inteligente', 'consulta_ejercicio'):
+                            ejercicio = Ejercicio.objects.get(id=ejercicio_id)
+                        nombre_ejercicio = ejercicio.nombre_ejercicio
+                    except Ejercicio.DoesNotExist:
+                        nombre_ejercicio = f"Ejercicio {ejercicio_id}"
                 
                 # Calcular parámetros
                 series = config['series_range'][0] if objetivo == 'perdida_peso' else config['series_range'][1]
@@ -982,4 +1033,118 @@ def generar_plan_inteligente(request):
         'dias_semana': dias_semana
     }
     
-    return render(request, 'generar-plan-inteligente.html', context)
\ No newline at end of file
+    return render(request, 'generar-plan-inteligente.html', context)
+
+# ==================== VISTAS ASYNC (DESPLIEGUE ASGI) ====================
+# Versiones async de los endpoints con ML. Se enrutan en lugar de las síncronas
+# cuando settings.ML_VISTAS_ASYNC está activo (ver urls.py). La inferencia se
+# delega a ejecutor_ml para no bloquear el event loop.
+
+def _respuesta_saturado():
+    response = JsonResponse({'error': 'Servicio de predicción saturado, inténtalo de nuevo'}, status=503)
+    response['Retry-After'] = '1'
+    return response
+
+
+@login_required
+async def get_macronutrientes_async(request):
+    user = await request.auser()
+    try:
+        profile = await UserProfile.objects.aget(usuario_id=user.id)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({'error': 'Perfil no encontrado'}, status=404)
+
+    try:
+        macros = await ejecutor_ml.ejecutar(predecir_perfil, profile, usuario_id=user.id)
+        return _con_version(JsonResponse(macros))
+
+    except EjecutorSaturado as e:
+        metricas_ml.error('macronutrientes', e)
+        return _respuesta_saturado()
+    except ModeloNoDisponible as e:
+        return _respuesta_sin_modelo(e)
+    except Exception as e:
+        logger.exception("Error prediciendo macronutrientes (usuario %s)", user.id)
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@login_required
+async def generar_plan_inteligente_async(request):
+    """
+    Versión async de generar_plan_inteligente: perfil y ejercicios con el ORM
+    async, generación del plan en el ejecutor de inferencia.
+    """
+    user = await request.auser()
+    try:
+        profile = await UserProfile.objects.aget(usuario_id=user.id)
+    except UserProfile.DoesNotExist:
+        messages.error(request, 'Debes crear tu perfil primero para generar un plan inteligente.')
+        return redirect('crear_perfil')
+
+    # Sólo los ejercicios que puede elegir el plan, no la tabla entera
+    ids = [i for ids_grupo in EJERCICIOS_POR_GRUPO.values() for i in ids_grupo]
+    nombres_ejercicios = {
+        id_: nombre async for id_, nombre in Ejercicio.objects.filter(id__in=ids).order_by().values_list('id', 'nombre_ejercicio')
+    }
+    try:
+        plan_data, dias_semana = await ejecutor_ml.ejecutar(
+            generar_plan_inteligente_basico, profile, nombres_ejercicios=nombres_ejercicios
+        )
+    except EjecutorSaturado as e:
+        metricas_ml.error('plan_inteligente', e)
+        return _respuesta_saturado()
+
+    if request.method == 'POST':
+        # Desactivar planes activos previos
+        await PlanEntrenamiento.objects.filter(
+            usuario_id=user.id,
+            estado='activo'
+        ).aupdate(estado='pausado')
+
+        # Crear nuevo plan
+        nuevo_plan = await PlanEntrenamiento.objects.acreate(
+            usuario_id=user.id,
+            nombre_plan=f"Plan Inteligente {profile.get_objetivo_display()}",
+            fecha_inicio=date.today(),
+            fecha_fin=date.today() + timedelta(weeks=8),
+            objetivo=profile.objetivo,
+            estado='activo',
+            dias_semana=dias_semana
+        )
+
+        # Crear días y ejercicios
+        for numero_dia_semana, info_dia in plan_data.items():
+            dia_entrenamiento = await DiaEntrenamiento.objects.acreate(
+                plan=nuevo_plan,
+                numero_dia=numero_dia_semana,
+                nombre_dia=info_dia['nombre_dia'],
+                descripcion=f"Entrenamiento generado automáticamente para {profile.get_objetivo_display()}"
+            )
+            await DiaEjercicio.objects.abulk_create([
+                DiaEjercicio(
+                    dia=dia_entrenamiento,
+                    ejercicio_id=ejercicio_info['ejercicio_id'],
+                    orden=orden,
+                    series=ejercicio_info['series'],
+                    repeticiones=ejercicio_info['repeticiones'],
+                    peso_sugerido=ejercicio_info['peso_sugerido'],
+                    descanso_minutos=ejercicio_info['descanso_minutos']
+                )
+                for orden, ejercicio_info in enumerate(info_dia['ejercicios'], 1)
+            ])
+
+        # Marcar en la sesión que se acaba de generar un plan
+        await request.session.aset(
+            'plan_generado',
+            f'¡Plan inteligente generado exitosamente! Se creó un plan de {dias_semana} días adaptado a tu perfil.'
+        )
+        return redirect('ver_plan_entrenamiento', plan_id=nuevo_plan.id)
+
+    context = {
+        'profile': profile,
+        'plan_preview': plan_data,
+        'dias_semana': dias_semana
+    }
+
+    # La plantilla usa request.user (carga perezosa y síncrona)
+    return await sync_to_async(render)(request, 'generar-plan-inteligente.html', context)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -136,4 +137,43 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'Usuarios.Usuario'
 
 # Servir archivos estáticos con WhiteNoise
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
\ No newline at end of file
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# Motor de inferencia de macronutrientes: 'compilado' (bosque en arrays NumPy,
+# si existe modelo_macros_compilado/, mapeado en memoria) o 'sklearn' (modelo_macros.pkl)
+MACROS_MOTOR = 'compilado'
+
+# Modo rejilla: interpolar desde la tabla precalculada por ScriptsML/RejillaMacros.py
+# (más rápido, con el error máximo que informa el script al construirla)
+MACROS_REJILLA = False
+
+# Recarga en caliente del modelo de macronutrientes: cada worker comprueba cada
+# INTERVALO_S segundos si el entrenamiento publicó una versión nueva (ver ML_Nutricion/paquete.py)
+MACROS_RECARGA = {
+    'ACTIVA': True,
+    'INTERVALO_S': 10,
+}
+
+# Caché en memoria de predicciones de macronutrientes (ver ML_Nutricion/cache.py)
+MACROS_CACHE = {
+    'MAX_ENTRADAS': 1024,
+    'TTL': 3600,
+    'REDONDEO_PESO': 0.5,
+    'REDONDEO_GRASA': 0.5,
+}
+
+# Vistas async para los endpoints con ML (activar al desplegar con ASGI)
+ML_VISTAS_ASYNC = os.environ.get('ML_VISTAS_ASYNC', '0') == '1'
+
+# Pool de hilos para la inferencia desde vistas async (ver ML_Nutricion/ejecutor.py)
+ML_EJECUTOR = {
+    'WORKERS': 4,
+    'MAX_PENDIENTES': 32,
+}
+
+# Token para que los scrapers lean /api/ml/metricas/ sin sesión de staff
+# (cabecera "Authorization: Bearer <token>"); sin definir sólo accede el staff
+ML_METRICAS_TOKEN = os.environ.get('ML_METRICAS_TOKEN')
+
+# Warm-up de los modelos ML al arrancar cada worker (ver ML_Nutricion/calentamiento.py)
+ML_CALENTAMIENTO = os.environ.get('ML_CALENTAMIENTO', '0') == '1'
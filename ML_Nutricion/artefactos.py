@@ -0,0 +1,74 @@
+"""
+Formato de artefactos compartibles entre workers mediante memory-mapping.
+
+Dos variantes:
+
+* Objetos de sklearn (p. ej. el NearestNeighbors del plan de entrenamiento):
+  se guardan con joblib sin compresión, de modo que sus arrays NumPy quedan
+  como buffers crudos dentro del fichero y joblib.load(mmap_mode='r') los
+  mapea en memoria en vez de copiarlos.
+* Arrays sueltos (p. ej. el bosque compilado): un directorio con un .npy por
+  array y un meta.json, cargados con np.load(mmap_mode='r').
+
+Las páginas mapeadas son de sólo lectura y están respaldadas por el fichero,
+así que el sistema operativo las comparte entre todos los workers de
+gunicorn; si además se cargan en el master antes del fork (preload_app), ni
+siquiera se repite la apertura en cada worker. No importa Django.
+
+Los ficheros se escriben en uno temporal y se renombran encima del
+anterior: un proceso que tenga mapeada la versión anterior (p. ej. al
+reentrenar o ampliar el plan con el servidor en marcha) sigue leyendo el
+fichero viejo en vez de ver cómo se trunca debajo de él.
+"""
+import json
+import os
+
+import joblib
+import numpy as np
+
+META = 'meta.json'
+
+
+def _reemplazar(path, escribir):
+    """Escribe con escribir(f) en un temporal y lo renombra a path."""
+    temporal = f'{path}.tmp'
+    with open(temporal, 'wb') as f:
+        escribir(f)
+    os.replace(temporal, path)
+
+
+def guardar_objeto(obj, path):
+    """joblib.dump sin compresión (requisito para mmap_mode)."""
+    _reemplazar(path, lambda f: joblib.dump(obj, f, compress=0))
+
+
+def cargar_objeto(path, mmap=True):
+    """joblib.load con los arrays grandes mapeados en memoria de sólo lectura."""
+    return joblib.load(path, mmap_mode='r' if mmap else None)
+
+
+def guardar_arrays(directorio, arrays, meta=None):
+    """Guarda un dict nombre -> array como <directorio>/<nombre>.npy más meta.json."""
+    os.makedirs(directorio, exist_ok=True)
+    for nombre, array in arrays.items():
+        _reemplazar(os.path.join(directorio, f'{nombre}.npy'), lambda f: np.save(f, np.ascontiguousarray(array)))
+    with open(os.path.join(directorio, META), 'w', encoding='utf-8') as f:
+        json.dump({'arrays': sorted(arrays), **(meta or {})}, f, ensure_ascii=False, indent=2)
+
+
+def cargar_arrays(directorio, mmap=True):
+    """Inverso de guardar_arrays: devuelve (arrays, meta)."""
+    with open(os.path.join(directorio, META), encoding='utf-8') as f:
+        meta = json.load(f)
+    arrays = {
+        nombre: np.load(os.path.join(directorio, f'{nombre}.npy'), mmap_mode='r' if mmap else None)
+        for nombre in meta.pop('arrays')
+    }
+    return arrays, meta
+
+
+def tamano(path):
+    """Tamaño en disco de un fichero o de un directorio de artefactos."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(raiz, f)) for raiz, _, ficheros in os.walk(path) for f in ficheros)
+    return os.path.getsize(path)
@@ -0,0 +1,169 @@
+"""
+Bosque compilado: evaluación de RandomForest sobre arrays NumPy contiguos.
+
+Exporta los árboles ajustados (MultiOutputRegressor(RandomForestRegressor) o
+RandomForestRegressor multi-salida) a cinco arrays planos -feature,
+threshold, left, right, value- y recorre todos los árboles a la vez con
+operaciones vectorizadas, sin el despacho por estimador ni el overhead de
+joblib de sklearn.
+
+Los resultados son idénticos bit a bit a los de sklearn ejecutado con
+n_jobs=1: se compara en float32 como hace el árbol de sklearn y se acumulan
+las hojas en el mismo orden antes de dividir por el número de árboles.
+No importa Django, así que se puede usar desde ScriptsML.
+"""
+import numpy as np
+
+from .artefactos import guardar_arrays, cargar_arrays
+
+# Valor de sklearn.tree._tree.TREE_LEAF
+_TREE_LEAF = -1
+
+
+def _bosques_de(model):
+    """Lista de (RandomForestRegressor, columna_inicial) que componen el modelo."""
+    if hasattr(model, 'estimators_') and hasattr(model.estimators_[0], 'estimators_'):
+        # MultiOutputRegressor: un bosque de una salida por target
+        bosques = []
+        columna = 0
+        for bosque in model.estimators_:
+            bosques.append((bosque, columna))
+            columna += bosque.n_outputs_
+        return bosques
+    return [(model, 0)]
+
+
+class BosqueCompilado:
+    """
+    Conjunto de árboles aplanado en arrays contiguos.
+
+    Todos los nodos de todos los árboles viven en los mismos arrays; `raices`
+    indica el nodo inicial de cada árbol. En las hojas left == right == nodo.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, raices, grupos, n_salidas, profundidad):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)  # (n_nodos, salidas_por_arbol)
+        self.raices = np.ascontiguousarray(raices, dtype=np.intp)
+        # grupos: (arbol_inicio, arbol_fin, columna_inicial) por cada bosque original
+        self.grupos = np.asarray(grupos, dtype=np.intp).reshape(-1, 3)
+        self.n_salidas = int(n_salidas)
+        self.profundidad = int(profundidad)
+        self._es_hoja = self.left == np.arange(len(self.left))
+
+    @property
+    def n_arboles(self):
+        return len(self.raices)
+
+    @property
+    def n_nodos(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right, self.value, self.raices))
+
+    @classmethod
+    def desde_sklearn(cls, model):
+        """Exporta un modelo de sklearn ya ajustado."""
+        features, thresholds, lefts, rights, values, raices, grupos = [], [], [], [], [], [], []
+        salidas_por_arbol = None
+        n_salidas = 0
+        profundidad = 0
+        offset = 0
+        arbol = 0
+
+        for bosque, columna in _bosques_de(model):
+            inicio = arbol
+            for estimador in bosque.estimators_:
+                tree = estimador.tree_
+                n = tree.node_count
+                nodos = np.arange(n) + offset
+                es_hoja = tree.children_left == _TREE_LEAF
+
+                feature = np.where(es_hoja, 0, tree.feature)
+                threshold = np.where(es_hoja, 0.0, tree.threshold)
+                left = np.where(es_hoja, nodos, tree.children_left + offset)
+                right = np.where(es_hoja, nodos, tree.children_right + offset)
+                value = tree.value[:, :, 0]
+
+                if salidas_por_arbol is None:
+                    salidas_por_arbol = value.shape[1]
+                elif value.shape[1] != salidas_por_arbol:
+                    raise ValueError("Todos los árboles deben tener el mismo número de salidas")
+
+                features.append(feature)
+                thresholds.append(threshold)
+                lefts.append(left)
+                rights.append(right)
+                values.append(value)
+                raices.append(offset)
+                profundidad = max(profundidad, tree.max_depth)
+                offset += n
+                arbol += 1
+            grupos.append((inicio, arbol, columna))
+            n_salidas = max(n_salidas, columna + bosque.n_outputs_)
+
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(lefts), np.concatenate(rights),
+            np.concatenate(values), raices, grupos, n_salidas, profundidad
+        )
+
+    def hojas(self, X):
+        """Índice de hoja (global) de cada fila en cada árbol: array (n, n_arboles)."""
+        # sklearn evalúa los árboles sobre float32
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n, n_features = X.shape
+        X_plano = X.ravel()
+
+        nodos = np.tile(self.raices, n)
+        base_fila = np.repeat(np.arange(n) * n_features, self.n_arboles)
+        activos = np.flatnonzero(~self._es_hoja[nodos])
+        # Sólo se siguen recorriendo los pares (fila, árbol) que no han llegado a una hoja
+        while activos.size:
+            actual = nodos[activos]
+            ir_izquierda = X_plano[base_fila[activos] + self.feature[actual]] <= self.threshold[actual]
+            actual = np.where(ir_izquierda, self.left[actual], self.right[actual])
+            nodos[activos] = actual
+            activos = activos[~self._es_hoja[actual]]
+        return nodos.reshape(n, self.n_arboles)
+
+    def predict(self, X):
+        """Predicción media de los árboles, con la misma forma que model.predict."""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        valores = self.value[self.hojas(X)]  # (n, n_arboles, salidas_por_arbol)
+
+        y = np.empty((X.shape[0], self.n_salidas), dtype=np.float64)
+        for inicio, fin, columna in self.grupos:
+            # Suma secuencial en el orden de los árboles (como sklearn) y media
+            suma = np.cumsum(valores[:, inicio:fin], axis=1)[:, -1]
+            suma /= fin - inicio
+            y[:, columna:columna + suma.shape[1]] = suma
+        return y
+
+    def guardar(self, directorio):
+        """Guarda los arrays como .npy sueltos (cargables con mmap, ver artefactos.py)."""
+        guardar_arrays(
+            directorio,
+            {
+                'feature': self.feature, 'threshold': self.threshold, 'left': self.left,
+                'right': self.right, 'value': self.value, 'raices': self.raices, 'grupos': self.grupos,
+            },
+            {'n_salidas': self.n_salidas, 'profundidad': self.profundidad}
+        )
+
+    @classmethod
+    def cargar(cls, directorio, mmap=True):
+        """Carga el bosque; con mmap=True los arrays se comparten entre procesos."""
+        arrays, meta = cargar_arrays(directorio, mmap=mmap)
+        return cls(
+            arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'],
+            arrays['value'], arrays['raices'], arrays['grupos'],
+            meta['n_salidas'], meta['profundidad']
+        )
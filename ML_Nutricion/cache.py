@@ -0,0 +1,72 @@
+"""
+Caché en memoria (LRU + TTL) de predicciones de macronutrientes.
+
+La clave es el vector de features ya codificado, con peso y porcentaje de
+grasa redondeados para que perfiles casi idénticos compartan entrada (el
+modelo predice siempre con las features exactas del primero que la llena).
+Configuración en settings.MACROS_CACHE:
+
+    MACROS_CACHE = {
+        'MAX_ENTRADAS': 1024,    # 0 desactiva la caché
+        'TTL': 3600,             # segundos; None = sin expiración
+        'REDONDEO_PESO': 0.5,    # kg; 0 = sin redondeo
+        'REDONDEO_GRASA': 0.5,   # puntos porcentuales; 0 = sin redondeo
+    }
+"""
+from django.conf import settings
+
+from .features import FEATURE_COLUMNS
+from .lru import CachePredicciones
+
+CONFIG_DEFECTO = {
+    'MAX_ENTRADAS': 1024,
+    'TTL': 3600,
+    'REDONDEO_PESO': 0.5,
+    'REDONDEO_GRASA': 0.5,
+}
+
+# Posiciones dentro del vector de features
+IDX_PESO = FEATURE_COLUMNS.index('Peso_(kg)')
+IDX_GRASA = FEATURE_COLUMNS.index('Porcentaje_grasa')
+IDX_MASA_MAGRA = FEATURE_COLUMNS.index('Masa_magra_(kg)')
+
+
+def _config():
+    config = dict(CONFIG_DEFECTO)
+    config.update(getattr(settings, 'MACROS_CACHE', {}))
+    return config
+
+
+def _redondear(valor, paso):
+    if not paso:
+        return float(valor)
+    return round(round(float(valor) / paso) * paso, 6)
+
+
+def cuantizar(features, redondeo_peso=None, redondeo_grasa=None):
+    """
+    Redondea peso y porcentaje de grasa y recalcula la masa magra.
+
+    Devuelve una tupla (hashable) que se usa como clave de la caché; el
+    modelo sigue prediciendo con las features sin redondear.
+    """
+    config = _config()
+    if redondeo_peso is None:
+        redondeo_peso = config['REDONDEO_PESO']
+    if redondeo_grasa is None:
+        redondeo_grasa = config['REDONDEO_GRASA']
+
+    fila = [float(v) for v in features]
+    fila[IDX_PESO] = _redondear(fila[IDX_PESO], redondeo_peso)
+    fila[IDX_GRASA] = _redondear(fila[IDX_GRASA], redondeo_grasa)
+    fila[IDX_MASA_MAGRA] = fila[IDX_PESO] * (1 - (fila[IDX_GRASA] / 100))
+    return tuple(fila)
+
+
+def _crear_cache():
+    config = _config()
+    return CachePredicciones(max_entradas=config['MAX_ENTRADAS'], ttl=config['TTL'])
+
+
+# Instancia única por proceso (worker)
+cache_macros = _crear_cache()
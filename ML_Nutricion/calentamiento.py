@@ -0,0 +1,126 @@
+"""
+Calentamiento (warm-up) de los modelos ML al arrancar un worker.
+
+Con settings.ML_CALENTAMIENTO activo, FE_App.apps.FeAppConfig.ready() carga
+los artefactos de MacroNutrientes y PlanEntrenamiento y hace una predicción
+de prueba con cada uno, de modo que el primer usuario tras un despliegue o
+un reciclado del worker (max_requests) no paga la carga. Con gunicorn y
+preload_app se ejecuta en el master y los workers heredan el resultado.
+
+El estado se consulta en /api/ml/listo/ para que el balanceador sólo envíe
+tráfico a workers calentados. Si el calentamiento falla (p. ej. todavía no
+hay ningún paquete publicado) la propia sonda lo reintenta como mucho cada
+REINTENTO_S segundos, así que el worker pasa a estar listo en cuanto el
+modelo se puede cargar, sin reiniciarlo.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management import get_commands
+
+from .plan import USUARIO_EJEMPLO, recomendador_plan
+from .predictor import registro_macros
+
+logger = logging.getLogger(__name__)
+
+# Perfil de ejemplo para la predicción de prueba
+PERFIL_PRUEBA = {
+    'edad': 30, 'sexo': 'M', 'peso': 75, 'altura': 175, 'porcentaje_grasa': 20,
+    'nivel_actividad': 'moderado', 'objetivo': 'recomposicion',
+}
+
+# Comandos de gestión que sirven peticiones; el resto (migrate, shell...) no calienta
+COMANDOS_SERVIDOR = ('runserver',)
+
+# Segundos mínimos entre reintentos de un calentamiento fallido (ver listo)
+REINTENTO_S = 10
+
+_lock = threading.Lock()
+_ultimo_intento = None
+estado = {
+    'activo': False,
+    'listo': False,
+    'error': None,
+    'tiempo_s': None,
+    'etapas': {},
+}
+
+
+def debe_calentar(argv=None):
+    """
+    True si el warm-up está activado y el proceso va a servir peticiones.
+
+    Se decide por el comando y no por el ejecutable: manage.py, django-admin
+    y python -m django reciben el comando de gestión en argv[1]; si es uno
+    que no sirve peticiones (migrate, shell...) no se calienta. gunicorn o
+    uvicorn reciben la aplicación u opciones, que no son comandos.
+    """
+    if not getattr(settings, 'ML_CALENTAMIENTO', False):
+        return False
+    argv = sys.argv if argv is None else argv
+    if len(argv) < 2:
+        return True
+    comando = argv[1]
+    if comando in get_commands() and comando not in COMANDOS_SERVIDOR:
+        return False
+    # runserver con autoreload: sólo el proceso hijo sirve peticiones
+    if comando == 'runserver' and '--noreload' not in argv and os.environ.get('RUN_MAIN') != 'true':
+        return False
+    return True
+
+
+def _calentar_macros():
+    # Con preload_app esto corre en el master: el hilo de recarga lo arranca cada worker
+    modelo = registro_macros.modelo(vigilar=False)
+    modelo.predict(modelo.features([PERFIL_PRUEBA]), ruta='calentamiento')
+
+
+def _calentar_plan():
+    # El índice KNN está mapeado en memoria: la consulta de prueba trae sus páginas a la caché del SO
+    modelo = recomendador_plan.modelo()
+    modelo.vecinos(modelo.features([USUARIO_EJEMPLO]))
+
+
+def calentar():
+    """Carga los artefactos y hace una predicción de prueba con cada modelo."""
+    global _ultimo_intento
+    with _lock:
+        if estado['listo']:
+            return estado
+        _ultimo_intento = time.monotonic()
+        estado.update(activo=True, error=None)
+        inicio = time.perf_counter()
+        try:
+            for nombre, fn in (('macronutrientes', _calentar_macros), ('plan_entrenamiento', _calentar_plan)):
+                inicio_etapa = time.perf_counter()
+                fn()
+                estado['etapas'][nombre] = time.perf_counter() - inicio_etapa
+        except Exception as e:
+            estado['error'] = f"{type(e).__name__}: {e}"
+            logger.exception("Falló el calentamiento de los modelos ML")
+        else:
+            estado['listo'] = True
+        estado['tiempo_s'] = time.perf_counter() - inicio
+
+    if estado['listo']:
+        logger.info("Modelos ML calentados en %.3f s (%s)", estado['tiempo_s'],
+                    ', '.join(f"{k}: {v:.3f} s" for k, v in estado['etapas'].items()))
+    return estado
+
+
+def listo(reintentar=False):
+    """
+    Un worker está listo si el calentamiento terminó bien o no está activado.
+
+    reintentar=True (la sonda de /api/ml/listo/): si el calentamiento falló y
+    han pasado REINTENTO_S segundos desde el último intento, se repite.
+    """
+    if estado['listo'] or not estado['activo']:
+        return True
+    if reintentar and estado['error'] is not None and time.monotonic() - _ultimo_intento >= REINTENTO_S:
+        calentar()
+    return estado['listo']
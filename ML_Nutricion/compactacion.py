@@ -0,0 +1,114 @@
+"""
+Compactación del índice del recomendador del plan (ver plan.py).
+
+El índice KNN guarda todas las filas del histórico, así que su tamaño y la
+latencia de las consultas crecen con él. seleccionar_filas() elige como
+mucho max_filas filas representativas para reconstruir el índice con
+ellas:
+
+* primero una fila de cada ejercicio (la más cercana a la media de sus
+  filas), para que ninguno desaparezca de las recomendaciones;
+* el resto del presupuesto se reparte entre estratos (Objetivo x
+  Nivel_experiencia en el plan): una fila por estrato, para que ningún tipo
+  de usuario se quede sin vecinos propios, y lo que queda en proporción a
+  su tamaño;
+* dentro de cada estrato se agrupan las filas con k-means (tantos grupos
+  como filas le tocan) y se conserva la fila real más cercana a cada
+  centroide: un centroide no tiene ejercicio asociado, una fila sí.
+
+ScriptsML/EvaluarCompactacionPlan.py compara los ejercicios recomendados
+por el modelo completo y por el compactado. No importa Django.
+"""
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+TAMANO_MUESTRA = 100_000
+
+
+def cuotas(tamanos, max_filas):
+    """
+    Filas a conservar de cada estrato: primero 1 por estrato si el
+    presupuesto llega y el resto proporcional a las filas que le quedan a
+    cada uno (reparto por mayor resto), nunca más de las que tiene. Suman
+    exactamente min(max_filas, sum(tamanos)).
+    """
+    tamanos = np.asarray(tamanos, dtype=np.int64)
+    max_filas = min(int(max_filas), int(tamanos.sum()))
+    minimo = 1 if max_filas >= len(tamanos) else 0
+    cuota = np.minimum(minimo, tamanos)
+    # Los mínimos se reservan antes del reparto: si no, sumarlos tras redondear se pasa del presupuesto
+    libres = tamanos - cuota
+    resto = max_filas - cuota.sum()
+    ideal = cuota + (libres * resto / libres.sum() if resto > 0 else 0)
+    cuota = np.floor(ideal).astype(np.int64)
+    # El resto, a los estratos con mayor parte fraccionaria que aún tengan filas
+    for i in np.argsort(cuota - ideal, kind='stable'):
+        if cuota.sum() >= max_filas:
+            break
+        cuota[i] += min(tamanos[i] - cuota[i], max_filas - cuota.sum(), 1)
+    return cuota
+
+
+def _mas_cercanas(X, grupos, centros):
+    """Por cada grupo con filas, el índice de su fila más cercana a centros[grupo]."""
+    distancias = ((X - centros[grupos]) ** 2).sum(axis=1)
+    # Ordenar por (grupo, distancia) y quedarse con la primera fila de cada grupo
+    orden = np.lexsort((distancias, grupos))
+    primera = np.ones(len(X), dtype=bool)
+    primera[1:] = grupos[orden][1:] != grupos[orden][:-1]
+    return orden[primera]
+
+
+def una_por_grupo(X, grupos):
+    """Índice de una fila por valor distinto de `grupos`: la más cercana a la media de las filas del grupo."""
+    _, grupo = np.unique(grupos, return_inverse=True)
+    cuenta = np.bincount(grupo)
+    medias = np.column_stack([np.bincount(grupo, X[:, j]) for j in range(X.shape[1])]) / cuenta[:, None]
+    return _mas_cercanas(X, grupo, medias)
+
+
+def representantes(X, k, semilla=0, tamano_muestra=TAMANO_MUESTRA):
+    """
+    Índices (en X) de como mucho k filas: la más cercana al centroide de
+    cada grupo de k-means. Los grupos que quedan vacíos no aportan fila.
+    """
+    n = len(X)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.arange(n)
+    rng = np.random.default_rng(semilla)
+    muestra = X if n <= tamano_muestra else X[rng.choice(n, tamano_muestra, replace=False)]
+    # Con miles de grupos la inicialización k-means++ cuesta más que el ajuste: se parte de filas al azar
+    kmeans = MiniBatchKMeans(n_clusters=k, init='random', n_init=1, batch_size=4096, max_iter=20,
+                             random_state=semilla).fit(muestra)
+    return _mas_cercanas(X, kmeans.predict(X), kmeans.cluster_centers_)
+
+
+def seleccionar_filas(X, estratos, max_filas, semilla=0, ejercicios=None):
+    """
+    Índices ordenados de como mucho max_filas filas de X (ya escaladas)
+    representativas de cada estrato (array de etiquetas, una por fila).
+
+    ejercicios: ejercicio de cada fila; si se da, se conserva antes una fila
+    de cada uno (si hay más ejercicios que max_filas, una muestra de ellos).
+    """
+    n = len(X)
+    if n <= max_filas:
+        return np.arange(n)
+    fijas = np.empty(0, dtype=np.int64)
+    if ejercicios is not None:
+        fijas = una_por_grupo(X, ejercicios)
+        if len(fijas) >= max_filas:
+            return np.sort(np.random.default_rng(semilla).choice(fijas, max_filas, replace=False))
+    libres = np.setdiff1d(np.arange(n), fijas)
+    etiquetas, estrato = np.unique(np.asarray(estratos)[libres], return_inverse=True)
+    cuota = cuotas(np.bincount(estrato, minlength=len(etiquetas)), max_filas - len(fijas))
+    seleccion = [fijas]
+    for e in range(len(etiquetas)):
+        # Con menos presupuesto que estratos (tras las filas fijas) alguno se queda sin cuota
+        if cuota[e] == 0:
+            continue
+        filas = libres[estrato == e]
+        seleccion.append(filas[representantes(X[filas], int(cuota[e]), semilla)])
+    return np.sort(np.concatenate(seleccion))
@@ -0,0 +1,131 @@
+"""
+Carga compartida de Fit-Evolution_Dataset.csv para los scripts de ScriptsML.
+
+El CSV tiene 51 columnas, muchas de texto, y cada script sólo usa unas
+pocas. leer_csv() lee únicamente las columnas pedidas con dtypes explícitos
+(category para texto, float32 para numéricas) según ESQUEMA.
+
+cargar_dataset() además guarda el resultado ya limpio y codificado
+(dict nombre -> array) en un .npz dentro de ModelosML/cache_dataset/. La
+clave incluye el hash del CSV, las columnas y el código de la función de
+preparación, así que la caché se invalida sola si cambia el dataset o la
+forma de prepararlo. No importa Django.
+"""
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET_PATH = os.path.join(PROJECT_DIR, 'Fit-Evolution_Dataset.csv')
+CACHE_DIR = os.path.join(PROJECT_DIR, 'ModelosML', 'cache_dataset')
+
+CATEGORIA = 'category'
+NUMERICO = 'float32'
+
+# Tipos de las columnas que usan los scripts de entrenamiento
+ESQUEMA = {
+    'Edad': NUMERICO,
+    'Género': CATEGORIA,
+    'Peso_(kg)': NUMERICO,
+    'Altura_(m)': NUMERICO,
+    'IMC': NUMERICO,
+    'Porcentaje_grasa': NUMERICO,
+    'Masa_magra_(kg)': NUMERICO,
+    'Nivel_experiencia': NUMERICO,
+    'Duración_sesión_(horas)': NUMERICO,
+    'Frecuencia_entrenamiento_(días/semana)': NUMERICO,
+    'Objetivo': CATEGORIA,
+    'Proteínas': NUMERICO,
+    'Carbohidratos': NUMERICO,
+    'Grasas': NUMERICO,
+    'Tipo_entrenamiento': CATEGORIA,
+    'Entrenamiento': CATEGORIA,
+    'Grupo_muscular_objetivo': CATEGORIA,
+    'Equipamiento_necesario': CATEGORIA,
+    'Nivel_dificultad': CATEGORIA,
+    'Parte_cuerpo': CATEGORIA,
+}
+
+
+def hash_fichero(path, tamano_bloque=1 << 20):
+    """SHA-256 del contenido del fichero, leído por bloques."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def leer_csv(columnas, path=DATASET_PATH):
+    """DataFrame con sólo `columnas`, en ese orden y con los dtypes de ESQUEMA."""
+    faltan = [c for c in columnas if c not in ESQUEMA]
+    if faltan:
+        raise ValueError(f"Columnas sin tipo en ESQUEMA: {faltan}")
+    cabecera = pd.read_csv(path, nrows=0).columns
+    faltan = [c for c in columnas if c not in cabecera]
+    if faltan:
+        raise ValueError(f"Columnas faltantes en el dataset: {faltan}")
+    df = pd.read_csv(path, usecols=list(columnas), dtype={c: ESQUEMA[c] for c in columnas})
+    return df[list(columnas)]
+
+
+def clave_cache(path, columnas, preparar):
+    """Hash del CSV + lista de columnas + código fuente de la preparación."""
+    h = hashlib.sha256()
+    h.update(hash_fichero(path).encode())
+    h.update(json.dumps(list(columnas), ensure_ascii=False).encode())
+    h.update(inspect.getsource(preparar).encode())
+    return h.hexdigest()[:16]
+
+
+def cargar_dataset(nombre, columnas, preparar, path=DATASET_PATH, usar_cache=True, cache_dir=CACHE_DIR):
+    """
+    Devuelve (arrays, desde_cache).
+
+    preparar(df) recibe el DataFrame de leer_csv() y devuelve un dict
+    nombre -> np.ndarray (matrices codificadas, clases de los encoders...).
+    Los arrays de texto deben ser de tipo str (no object) para poder
+    guardarse en el .npz sin pickle.
+    """
+    cache_path = None
+    if usar_cache:
+        cache_path = os.path.join(cache_dir, f'{nombre}_{clave_cache(path, columnas, preparar)}.npz')
+        if os.path.exists(cache_path):
+            with np.load(cache_path, allow_pickle=False) as datos:
+                return {k: datos[k] for k in datos.files}, True
+
+    arrays = {k: np.asarray(v) for k, v in preparar(leer_csv(columnas, path)).items()}
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Las cachés de versiones anteriores del mismo dataset ya no sirven
+        for fichero in os.listdir(cache_dir):
+            if fichero.startswith(f'{nombre}_') and fichero.endswith('.npz'):
+                os.remove(os.path.join(cache_dir, fichero))
+        temporal = cache_path + '.tmp.npz'
+        np.savez(temporal, **arrays)
+        os.replace(temporal, cache_path)
+    return arrays, False
+
+
+def texto(serie):
+    """Columna categórica como array de str (apto para el .npz)."""
+    return serie.astype(str).to_numpy(dtype=str)
+
+
+def clases(encoder):
+    """classes_ de un LabelEncoder ajustado, como str si no son numéricas."""
+    return encoder.classes_ if encoder.classes_.dtype.kind in 'iuf' else encoder.classes_.astype(str)
+
+
+def label_encoder(clases):
+    """LabelEncoder ya ajustado a partir de sus clases (como las guarda la caché)."""
+    from sklearn.preprocessing import LabelEncoder
+
+    encoder = LabelEncoder()
+    encoder.classes_ = np.asarray(clases)
+    return encoder
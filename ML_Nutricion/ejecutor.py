@@ -0,0 +1,131 @@
+"""
+Ejecutor dedicado para inferencia ML desde vistas async (despliegues ASGI).
+
+La predicción es CPU-bound: si se ejecuta en el hilo del event loop bloquea
+todas las demás peticiones, y si se deja a sync_to_async comparte el único
+hilo "thread sensitive" con el resto de vistas síncronas. Aquí se delega a
+un ThreadPoolExecutor propio, de tamaño configurable, con un límite de
+tareas pendientes para que una ráfaga de cargas de la página de nutrición no
+acapare el proceso. Configuración en settings.ML_EJECUTOR:
+
+    ML_EJECUTOR = {
+        'WORKERS': 4,          # hilos de inferencia
+        'MAX_PENDIENTES': 32,  # en ejecución + en cola; el resto se rechaza
+    }
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+CONFIG_DEFECTO = {
+    'WORKERS': 4,
+    'MAX_PENDIENTES': 32,
+}
+
+# Número de tiempos de espera recientes que se guardan para los percentiles
+VENTANA_METRICAS = 1024
+
+
+class EjecutorSaturado(Exception):
+    """Se alcanzó MAX_PENDIENTES; la vista debería responder 503."""
+
+
+class EjecutorInferencia:
+    """ThreadPoolExecutor con control de admisión y métricas de tiempo en cola."""
+
+    def __init__(self, workers=4, max_pendientes=32):
+        self.workers = workers
+        self.max_pendientes = max_pendientes
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ml-inferencia')
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._esperas = deque(maxlen=VENTANA_METRICAS)
+        self._ejecuciones = deque(maxlen=VENTANA_METRICAS)
+        self.completadas = 0
+        self.rechazadas = 0
+        self.errores = 0
+
+    async def ejecutar(self, fn, *args, **kwargs):
+        """Ejecuta fn(*args, **kwargs) en el pool sin bloquear el event loop."""
+        with self._lock:
+            if self._pendientes >= self.max_pendientes:
+                self.rechazadas += 1
+                raise EjecutorSaturado(f"{self._pendientes} tareas de inferencia pendientes")
+            self._pendientes += 1
+
+        encolada = time.perf_counter()
+
+        def tarea():
+            inicio = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                fin = time.perf_counter()
+                with self._lock:
+                    self._esperas.append(inicio - encolada)
+                    self._ejecuciones.append(fin - inicio)
+
+        try:
+            futuro = self._executor.submit(tarea)
+        except BaseException:
+            self._liberar()
+            raise
+        # Se libera el hueco cuando termina la tarea del pool, no cuando deja de
+        # esperarla la vista: si la petición se cancela el hilo sigue ocupado
+        futuro.add_done_callback(self._liberar)
+
+        try:
+            resultado = await asyncio.wrap_future(futuro)
+        except Exception:
+            with self._lock:
+                self.errores += 1
+            raise
+
+        with self._lock:
+            self.completadas += 1
+        return resultado
+
+    def _liberar(self, futuro=None):
+        with self._lock:
+            self._pendientes -= 1
+
+    def stats(self):
+        with self._lock:
+            esperas = np.array(self._esperas) * 1000
+            ejecuciones = np.array(self._ejecuciones) * 1000
+            pendientes = self._pendientes
+
+        def percentiles(valores):
+            if not len(valores):
+                return {'p50_ms': None, 'p99_ms': None, 'max_ms': None}
+            return {
+                'p50_ms': float(np.percentile(valores, 50)),
+                'p99_ms': float(np.percentile(valores, 99)),
+                'max_ms': float(valores.max()),
+            }
+
+        return {
+            'workers': self.workers,
+            'max_pendientes': self.max_pendientes,
+            'pendientes': pendientes,
+            'completadas': self.completadas,
+            'rechazadas': self.rechazadas,
+            'errores': self.errores,
+            'espera_en_cola': percentiles(esperas),
+            'ejecucion': percentiles(ejecuciones),
+        }
+
+
+def _crear_ejecutor():
+    config = dict(CONFIG_DEFECTO)
+    config.update(getattr(settings, 'ML_EJECUTOR', {}))
+    return EjecutorInferencia(workers=config['WORKERS'], max_pendientes=config['MAX_PENDIENTES'])
+
+
+# Instancia única por proceso
+ejecutor_ml = _crear_ejecutor()
@@ -0,0 +1,119 @@
+"""
+Mapeo de perfiles de usuario a las features del modelo de macronutrientes.
+
+MapeoPerfil es el primer paso del Pipeline de preprocesado (ver
+preprocesado.py): traduce los campos de UserProfile al vocabulario del
+dataset de entrenamiento ('M' -> 'Hombre', 'hipertrofia' -> 'Hipertrofia',
+cm -> m...) para un lote de perfiles a la vez. Lo que el perfil no tiene
+(frecuencia de entrenamiento, duración si no la indicó) queda como NaN y lo
+rellena el imputador del pipeline con la mediana de entrenamiento.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+
+# Valores de UserProfile -> valores del dataset
+GENERO_PERFIL = {'M': 'Hombre', 'F': 'Mujer'}
+OBJETIVO_PERFIL = {
+    'perdida_peso': 'Pérdida de grasa',
+    'recomposicion': 'Recomposición',
+    'hipertrofia': 'Hipertrofia',
+}
+# Nivel_experiencia es numérico en el dataset (≈1 principiante, 2 intermedio, 3 avanzado)
+NIVEL_EXPERIENCIA_PERFIL = {
+    'sedentario': 1.0,
+    'ligero': 1.5,
+    'moderado': 2.0,
+    'intenso': 3.0,
+}
+
+CATEGORICAS = ('Género', 'Objetivo')
+NUMERICAS = (
+    'Edad', 'Peso_(kg)', 'Altura_(m)',
+    'Frecuencia_entrenamiento_(días/semana)', 'Duración_sesión_(horas)',
+    'Nivel_experiencia', 'Porcentaje_grasa', 'Masa_magra_(kg)',
+)
+# Orden de las columnas a la salida del preprocesado (antes de escalar); el
+# paquete del modelo (manifest.json) debe declarar las mismas
+FEATURE_COLUMNS = CATEGORICAS + NUMERICAS
+
+# Campos de UserProfile que intervienen en la predicción
+CAMPOS_PERFIL = ('edad', 'sexo', 'peso', 'altura', 'nivel_actividad', 'objetivo', 'porcentaje_grasa',
+                 'tiempo_entrenamiento')
+# Los que un perfil debe traer siempre (tiempo_entrenamiento es opcional en UserProfile)
+CAMPOS_REQUERIDOS = CAMPOS_PERFIL[:-1]
+
+
+def _valores(perfiles, campo):
+    if perfiles and isinstance(perfiles[0], dict):
+        return [p.get(campo) for p in perfiles]
+    return [getattr(p, campo, None) for p in perfiles]
+
+
+def _numeros(valores):
+    """Valores del perfil (int, Decimal, str, None...) como array float con NaN."""
+    resultado = np.empty(len(valores))
+    for i, v in enumerate(valores):
+        try:
+            resultado[i] = float(v)
+        except (TypeError, ValueError):
+            resultado[i] = np.nan
+    return resultado
+
+
+class MapeoPerfil(BaseEstimator, TransformerMixin):
+    """
+    Perfiles (UserProfile o dicts con sus campos) -> columnas del dataset.
+
+    Devuelve un dict columna -> array con las columnas FEATURE_COLUMNS (las
+    categóricas como texto del dataset, None si el valor no se reconoce).
+    Un DataFrame que ya tiene esas columnas (filas del CSV de entrenamiento)
+    pasa sin cambios. Sin pandas en el camino de los perfiles: para una
+    petición individual el coste es de microsegundos.
+    """
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        if isinstance(X, pd.DataFrame):
+            if set(FEATURE_COLUMNS) <= set(X.columns):
+                return X
+            X = X.to_dict('records')
+        perfiles = list(X)
+
+        peso = _numeros(_valores(perfiles, 'peso'))
+        grasa = _numeros(_valores(perfiles, 'porcentaje_grasa'))
+        return {
+            'Género': np.array([GENERO_PERFIL.get(v) for v in _valores(perfiles, 'sexo')], dtype=object),
+            'Objetivo': np.array([OBJETIVO_PERFIL.get(v) for v in _valores(perfiles, 'objetivo')], dtype=object),
+            'Edad': _numeros(_valores(perfiles, 'edad')),
+            'Peso_(kg)': peso,
+            'Altura_(m)': _numeros(_valores(perfiles, 'altura')) / 100,  # Convertir cm a m
+            'Frecuencia_entrenamiento_(días/semana)': np.full(len(perfiles), np.nan),
+            'Duración_sesión_(horas)': _numeros(_valores(perfiles, 'tiempo_entrenamiento')) / 60,
+            'Nivel_experiencia': np.array([NIVEL_EXPERIENCIA_PERFIL.get(v, np.nan)
+                                           for v in _valores(perfiles, 'nivel_actividad')]),
+            'Porcentaje_grasa': grasa,
+            'Masa_magra_(kg)': peso * (1 - (grasa / 100)),
+        }
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(FEATURE_COLUMNS, dtype=object)
+
+
+def macros_desde_prediccion(fila):
+    """Redondea una fila (Proteínas, Carbohidratos, Grasas) y calcula calorías."""
+    proteinas = round(fila[0])
+    carbohidratos = round(fila[1])
+    grasas = round(fila[2])
+
+    # Calcular calorías totales
+    calorias = (proteinas * 4) + (carbohidratos * 4) + (grasas * 9)
+
+    return {
+        'calorias': int(calorias),
+        'proteinas': proteinas,
+        'carbohidratos': carbohidratos,
+        'grasas': grasas
+    }
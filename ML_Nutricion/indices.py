@@ -0,0 +1,205 @@
+"""
+Índices de vecinos para el recomendador del plan (ver plan.py).
+
+Todos exponen la interfaz de NearestNeighbors que usa ModeloPlan:
+fit(X), kneighbors(X) -> (distancias, índices), n_samples_fit_ y
+n_features_in_, y se guardan con artefactos.guardar_objeto (arrays
+mapeables en memoria).
+
+    brute       búsqueda exacta recorriendo todo el catálogo
+    kd_tree     KDTree de sklearn (exacto)
+    ball_tree   BallTree de sklearn (exacto)
+    auto        lo que elija sklearn según el tamaño
+    ivf         aproximado: IndiceIVF (listas invertidas sobre k-means)
+
+Con millones de filas la búsqueda exacta recorre todo el catálogo o gran
+parte de él; IVF sólo mira las n_sondeos listas más cercanas a la consulta.
+ScriptsML/BenchmarkIndicePlan.py mide el recall frente a la búsqueda exacta
+y la latencia de cada uno. No importa Django.
+
+ampliar_indice() añade filas a un índice ya ajustado sin volver a leer el
+dataset: IVF las reparte entre sus listas con los centroides que ya tiene;
+los de sklearn se reconstruyen sobre sus propias filas más las nuevas.
+"""
+import copy
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import NearestNeighbors
+
+INDICES = ('auto', 'brute', 'kd_tree', 'ball_tree', 'ivf')
+
+TAMANO_BLOQUE = 10_000
+
+
+def crear_indice(tipo='auto', n_vecinos=20, **params):
+    """Índice sin ajustar del tipo pedido (ver INDICES)."""
+    if tipo == 'ivf':
+        return IndiceIVF(n_neighbors=n_vecinos, **params)
+    if tipo not in INDICES:
+        raise ValueError(f"Índice desconocido: {tipo} (opciones: {', '.join(INDICES)})")
+    return NearestNeighbors(n_neighbors=n_vecinos, metric='euclidean', algorithm=tipo, **params)
+
+
+def tipo_indice(indice):
+    """Nombre del algoritmo de un índice ajustado (el que eligió sklearn si era 'auto')."""
+    return getattr(indice, '_fit_method', None) or 'ivf'
+
+
+def filas_indice(indice):
+    """Filas (ya escaladas) con las que se ajustó el índice, en su orden original."""
+    if isinstance(indice, IndiceIVF):
+        X = np.empty_like(indice.X_)
+        X[indice.orden_] = indice.X_
+        return X
+    return np.asarray(indice._fit_X)
+
+
+def reajustar_indice(indice, X):
+    """Índice nuevo con los mismos parámetros que `indice`, ajustado sobre X (el original no cambia)."""
+    # fit() reasigna todos los atributos ajustados, así que basta una copia superficial
+    return copy.copy(indice).fit(X)
+
+
+def ampliar_indice(indice, X_nuevo):
+    """Índice nuevo con las filas de `indice` y después las de X_nuevo (el original no cambia)."""
+    if isinstance(indice, IndiceIVF):
+        return indice.ampliado(X_nuevo)
+    X_nuevo = np.asarray(X_nuevo, dtype=indice._fit_X.dtype)
+    return reajustar_indice(indice, np.concatenate([indice._fit_X, X_nuevo]))
+
+
+def _distancias2(Q, normas_q, X, normas_x):
+    """Distancias euclídeas al cuadrado (n_q, n_x) por la expansión ‖q‖² - 2q·x + ‖x‖²."""
+    # Operaciones en el sitio: con bloques grandes los temporales cuestan más que el producto
+    d = Q @ X.T
+    d *= -2
+    d += normas_x[None, :]
+    d += normas_q[:, None]
+    return d
+
+
+class IndiceIVF:
+    """
+    Índice aproximado de listas invertidas (IVF), en NumPy.
+
+    Las filas se reparten en n_listas grupos con k-means (ajustado sobre una
+    muestra) y se guardan ordenadas por grupo, contiguas en memoria. Una
+    consulta calcula la distancia a los centroides, recorre sólo las
+    n_sondeos listas más cercanas y se queda con los k mejores candidatos.
+    Más sondeos = más recall y más latencia; n_sondeos se puede cambiar
+    después de ajustar.
+
+    Con un lote de consultas el bucle es por lista, no por consulta: cada
+    lista se compara de una vez con todas las consultas que la sondean.
+    """
+
+    def __init__(self, n_neighbors=20, n_listas=None, n_sondeos=8, tamano_muestra=100_000, semilla=0):
+        self.n_neighbors = n_neighbors
+        self.n_listas = n_listas
+        self.n_sondeos = n_sondeos
+        self.tamano_muestra = tamano_muestra
+        self.semilla = semilla
+
+    def fit(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n = len(X)
+        # ~√n listas: los centroides y los candidatos de cada lista crecen igual
+        n_listas = min(self.n_listas or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(self.semilla)
+        muestra = X[rng.choice(n, min(n, max(self.tamano_muestra, 40 * n_listas)), replace=False)]
+        kmeans = MiniBatchKMeans(n_clusters=n_listas, n_init=1, batch_size=4096, random_state=self.semilla)
+        self.centroides_ = kmeans.fit(muestra).cluster_centers_.astype(np.float32)
+        self._normas_c = (self.centroides_ ** 2).sum(axis=1)
+
+        asignacion = self._listas_cercanas(X, 1)[:, 0]
+        orden = np.argsort(asignacion, kind='stable')
+        self.orden_ = orden.astype(np.int64)
+        self.X_ = X[orden]
+        self.normas_ = (self.X_ ** 2).sum(axis=1)
+        self.inicios_ = np.searchsorted(asignacion[orden], np.arange(n_listas + 1))
+        self.n_samples_fit_ = n
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    def ampliado(self, X):
+        """
+        Copia del índice con las filas de X añadidas al final (índices
+        n_samples_fit_, n_samples_fit_ + 1, ...). Cada fila va a la lista de
+        su centroide más cercano; los centroides no se recalculan.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n = self.n_samples_fit_
+        listas = np.concatenate([
+            np.repeat(np.arange(self.n_listas_), np.diff(self.inicios_)),
+            self._listas_cercanas(X, 1)[:, 0],
+        ])
+        orden = np.argsort(listas, kind='stable')
+        nuevo = copy.copy(self)
+        nuevo.X_ = np.concatenate([self.X_, X])[orden]
+        nuevo.normas_ = np.concatenate([self.normas_, (X ** 2).sum(axis=1)])[orden]
+        nuevo.orden_ = np.concatenate([self.orden_, np.arange(n, n + len(X), dtype=np.int64)])[orden]
+        nuevo.inicios_ = np.searchsorted(listas[orden], np.arange(self.n_listas_ + 1))
+        nuevo.n_samples_fit_ = n + len(X)
+        return nuevo
+
+    @property
+    def n_listas_(self):
+        return len(self.centroides_)
+
+    def _listas_cercanas(self, Q, n):
+        """Las n listas más cercanas a cada fila de Q (por bloques)."""
+        n = min(n, len(self.centroides_))
+        resultado = np.empty((len(Q), n), dtype=np.int64)
+        for inicio in range(0, len(Q), TAMANO_BLOQUE):
+            bloque = Q[inicio:inicio + TAMANO_BLOQUE]
+            d = _distancias2(bloque, (bloque ** 2).sum(axis=1), self.centroides_, self._normas_c)
+            if n == 1:
+                d_idx = d.argmin(axis=1)[:, None]
+            elif n < d.shape[1]:
+                d_idx = np.argpartition(d, n - 1, axis=1)[:, :n]
+            else:
+                d_idx = np.broadcast_to(np.arange(d.shape[1]), d.shape)
+            resultado[inicio:inicio + TAMANO_BLOQUE] = d_idx
+        return resultado
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True):
+        k = n_neighbors or self.n_neighbors
+        Q = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        n_q = len(Q)
+        normas_q = (Q ** 2).sum(axis=1)
+        mejores_d = np.full((n_q, k), np.inf, dtype=np.float32)
+        mejores_i = np.full((n_q, k), -1, dtype=np.int64)
+
+        # Pares (consulta, lista sondeada) agrupados por lista
+        sondeos = self._listas_cercanas(Q, self.n_sondeos)
+        pares_q = np.repeat(np.arange(n_q), sondeos.shape[1])
+        pares_l = sondeos.ravel()
+        orden = np.argsort(pares_l, kind='stable')
+        listas, inicios = np.unique(pares_l[orden], return_index=True)
+        fines = np.append(inicios[1:], len(orden))
+
+        for lista, a, b in zip(listas, inicios, fines):
+            ini, fin = self.inicios_[lista], self.inicios_[lista + 1]
+            if ini == fin:
+                continue
+            qs = pares_q[orden[a:b]]
+            d = _distancias2(Q[qs], normas_q[qs], self.X_[ini:fin], self.normas_[ini:fin])
+            cand_d = np.concatenate([mejores_d[qs], d], axis=1)
+            cand_i = np.concatenate([mejores_i[qs], np.broadcast_to(np.arange(ini, fin), d.shape)], axis=1)
+            sel = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+            mejores_d[qs] = np.take_along_axis(cand_d, sel, axis=1)
+            mejores_i[qs] = np.take_along_axis(cand_i, sel, axis=1)
+
+        orden_k = np.argsort(mejores_d, axis=1)
+        mejores_d = np.take_along_axis(mejores_d, orden_k, axis=1)
+        mejores_i = np.take_along_axis(mejores_i, orden_k, axis=1)
+        # Si las listas sondeadas tienen menos de k filas, se repite el mejor vecino
+        faltan = mejores_i < 0
+        if faltan.any():
+            mejores_d = np.where(faltan, mejores_d[:, :1], mejores_d)
+            mejores_i = np.where(faltan, mejores_i[:, :1], mejores_i)
+        indices = self.orden_[mejores_i]
+        if not return_distance:
+            return indices
+        return np.sqrt(np.maximum(mejores_d, 0)), indices
@@ -0,0 +1,193 @@
+"""
+Ingesta por bloques para entrenar con datasets más grandes que la RAM.
+
+Alternativa a dataset.cargar_dataset() + StandardScaler para el modelo de
+macronutrientes cuando el CSV no cabe en memoria. El CSV se lee en bloques
+con el esquema fijo de dataset.ESQUEMA y nunca se materializa entero:
+
+1. Lectura: cada bloque se filtra (NaN en obligatorias), las categóricas
+   se codifican con un diccionario que crece bloque a bloque y las filas se
+   añaden a un fichero float32 crudo. A la vez se mantiene una muestra
+   aleatoria uniforme (reservoir) de tamaño fijo, con la que se ajustan la
+   codificación y la imputación del Pipeline de preprocesado y se calculan
+   los cuartiles para los límites IQR.
+2. Compactación: sobre el fichero crudo (binario, mucho más rápido que el
+   CSV) cada bloque pasa por el preprocesado, se descartan outliers, se
+   separa train/test y se acumulan las estadísticas del StandardScaler del
+   pipeline con partial_fit sobre train.
+3. Escritura: las filas conservadas se escalan y se copian a X_train /
+   X_test (y sus targets), ya con el tamaño exacto.
+
+El resultado es un directorio con X_train/y_train/X_test/y_test en .npy
+float32 (ver artefactos.cargar_arrays) que se abre con mmap y se pasa
+directamente a model.fit. La memoria usada es O(tamano_bloque + muestra)
+más un byte por fila para las máscaras. No importa Django.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .artefactos import META, cargar_arrays
+from .dataset import ESQUEMA, CATEGORIA
+
+TAMANO_BLOQUE = 200_000
+TAMANO_MUESTRA = 200_000
+
+
+class _Reservoir:
+    """Muestra aleatoria uniforme de filas de tamaño fijo (claves aleatorias, se quedan las menores)."""
+
+    def __init__(self, tamano, n_columnas, rng):
+        self.tamano = tamano
+        self.rng = rng
+        self.filas = np.empty((0, n_columnas), dtype=np.float32)
+        self.claves = np.empty(0)
+
+    def agregar(self, filas):
+        claves = np.concatenate([self.claves, self.rng.random(len(filas))])
+        todas = np.concatenate([self.filas, filas])
+        if len(claves) > self.tamano:
+            elegidas = np.argpartition(claves, self.tamano)[:self.tamano]
+            claves, todas = claves[elegidas], todas[elegidas]
+        self.claves, self.filas = claves, todas
+
+
+def _bloques(n, tamano):
+    for inicio in range(0, n, tamano):
+        yield slice(inicio, min(inicio + tamano, n))
+
+
+def ingerir_por_bloques(path, features, obligatorias, targets, directorio, preprocesado,
+                        tamano_bloque=TAMANO_BLOQUE, tamano_muestra=TAMANO_MUESTRA,
+                        test_size=0.2, factor_iqr=3, semilla=42, progreso=None):
+    """
+    Lee `path` por bloques y deja en `directorio` las matrices de
+    entrenamiento escaladas. Devuelve (arrays mapeados, preprocesado, resumen).
+
+    preprocesado: Pipeline sin ajustar (ver preprocesado.py). Sus pasos de
+    codificación e imputación se ajustan con la muestra y el StandardScaler
+    final con partial_fit sobre todas las filas de train, así que el objeto
+    devuelto es el mismo que se usa al servir. progreso(etapa, filas) se
+    llama tras cada bloque si se pasa.
+    """
+    rng = np.random.default_rng(semilla)
+    columnas = list(features) + list(targets)
+    categoricas = [c for c in features if ESQUEMA[c] == CATEGORIA]
+    n_features = len(features)
+    os.makedirs(directorio, exist_ok=True)
+    crudo_path = os.path.join(directorio, 'crudo.f32')
+
+    # --- 1. CSV -> fichero crudo + muestra ---
+    # En el fichero crudo las categóricas van como código de orden de aparición
+    vistas = {c: {} for c in categoricas}
+    muestra = _Reservoir(tamano_muestra, n_features, rng)
+    n_original = n_crudo = 0
+    with open(crudo_path, 'wb') as crudo:
+        lector = pd.read_csv(path, usecols=columnas, dtype={c: ESQUEMA[c] for c in columnas},
+                             chunksize=tamano_bloque)
+        for bloque in lector:
+            n_original += len(bloque)
+            bloque = bloque.dropna(subset=list(obligatorias))
+            for col in categoricas:
+                codigos = vistas[col]
+                for valor in bloque[col].cat.categories:
+                    codigos.setdefault(valor, len(codigos))
+                bloque[col] = bloque[col].map(codigos).astype(np.float32)
+            filas = np.empty((len(bloque), n_features + len(targets)), dtype=np.float32)
+            filas[:, :n_features] = bloque[list(features)].to_numpy(dtype=np.float32)
+            filas[:, n_features:] = bloque[list(targets)].to_numpy(dtype=np.float32)
+            crudo.write(filas.tobytes())
+            muestra.agregar(filas[:, :n_features])
+            n_crudo += len(filas)
+            if progreso:
+                progreso('lectura', n_original)
+
+    crudo_mm = np.memmap(crudo_path, dtype=np.float32, mode='r', shape=(n_crudo, n_features + len(targets)))
+
+    # --- Preprocesado (codificación e imputación) y límites IQR a partir de la muestra ---
+    nombres = {c: np.array(list(vistas[c]) + [None], dtype=object) for c in categoricas}
+
+    def _decodificar(X):
+        """Filas del fichero crudo -> DataFrame con los valores originales del CSV."""
+        datos = {}
+        for j, col in enumerate(features):
+            if col in nombres:
+                codigos = np.where(np.isnan(X[:, j]), len(nombres[col]) - 1, X[:, j]).astype(np.intp)
+                datos[col] = nombres[col][codigos]
+            else:
+                datos[col] = X[:, j]
+        return pd.DataFrame(datos)
+
+    codificacion = preprocesado[:-1]
+    # Las columnas categóricas van primero y no cuentan para los outliers
+    n_cat = len(codificacion[-1].categoricas)
+    muestra_X = codificacion.fit_transform(_decodificar(muestra.filas))[:, n_cat:]
+    q1, q3 = np.quantile(muestra_X, [0.25, 0.75], axis=0)
+    iqr = q3 - q1
+    limite_inf, limite_sup = q1 - factor_iqr * iqr, q3 + factor_iqr * iqr
+    del muestra, muestra_X
+
+    # --- 2. Máscaras (1 byte por fila) y estadísticas del scaler ---
+    conservar = np.empty(n_crudo, dtype=bool)
+    es_test = np.empty(n_crudo, dtype=bool)
+    scaler = preprocesado.steps[-1][1]
+    for s in _bloques(n_crudo, tamano_bloque):
+        es_test[s] = rng.random(s.stop - s.start) < test_size
+        X = codificacion.transform(_decodificar(np.asarray(crudo_mm[s, :n_features])))
+        conservar[s] = ((X[:, n_cat:] >= limite_inf) & (X[:, n_cat:] <= limite_sup)).all(axis=1)
+        X_train = X[conservar[s] & ~es_test[s]]
+        if len(X_train):
+            scaler.partial_fit(X_train)
+        if progreso:
+            progreso('compactacion', s.stop)
+    feature_columns = list(codificacion.get_feature_names_out())
+
+    # --- 3. Matrices finales: compactadas y escaladas ---
+    mascaras = {'train': conservar & ~es_test, 'test': conservar & es_test}
+    destinos = {}
+    for nombre, mascara in mascaras.items():
+        n = int(mascara.sum())
+        destinos[nombre] = (
+            np.lib.format.open_memmap(os.path.join(directorio, f'X_{nombre}.npy'), mode='w+',
+                                      dtype=np.float32, shape=(n, len(feature_columns))),
+            np.lib.format.open_memmap(os.path.join(directorio, f'y_{nombre}.npy'), mode='w+',
+                                      dtype=np.float32, shape=(n, len(targets))),
+        )
+    posiciones = {nombre: 0 for nombre in mascaras}
+    media, escala = scaler.mean_.astype(np.float32), scaler.scale_.astype(np.float32)
+    for s in _bloques(n_crudo, tamano_bloque):
+        filas = np.array(crudo_mm[s])
+        X = codificacion.transform(_decodificar(filas[:, :n_features]))
+        for nombre, mascara in mascaras.items():
+            m = mascara[s]
+            n = int(m.sum())
+            X_destino, y_destino = destinos[nombre]
+            p = posiciones[nombre]
+            X_destino[p:p + n] = (X[m] - media) / escala
+            y_destino[p:p + n] = filas[m, n_features:]
+            posiciones[nombre] += n
+        if progreso:
+            progreso('escalado', s.stop)
+
+    for X_destino, y_destino in destinos.values():
+        X_destino.flush()
+        y_destino.flush()
+    del destinos, crudo_mm
+    os.remove(crudo_path)
+
+    resumen = {
+        'n_original': n_original,
+        'n_sin_nan': n_crudo,
+        'n_outliers': int(n_crudo - conservar.sum()),
+        'n_train': posiciones['train'],
+        'n_test': posiciones['test'],
+        'feature_columns': feature_columns,
+        'target_columns': list(targets),
+    }
+    with open(os.path.join(directorio, META), 'w', encoding='utf-8') as f:
+        json.dump({'arrays': ['X_test', 'X_train', 'y_test', 'y_train'], **resumen}, f, ensure_ascii=False, indent=2)
+
+    arrays, _ = cargar_arrays(directorio, mmap=True)
+    return arrays, preprocesado, resumen
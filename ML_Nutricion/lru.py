@@ -0,0 +1,102 @@
+"""
+Caché LRU en memoria con TTL opcional y contadores de aciertos/fallos.
+
+La usan la caché de macronutrientes (cache.py, configurada desde
+settings.MACROS_CACHE) y la de planes semanales (plan.py). No importa
+Django.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachePredicciones:
+    """LRU acotada con TTL opcional y contadores de aciertos/fallos/expulsiones."""
+
+    def __init__(self, max_entradas=1024, ttl=3600):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._datos = OrderedDict()   # clave -> (expira_en, valor)
+        self._por_usuario = {}        # usuario_id -> clave
+        self._usuarios = {}           # clave -> {usuario_id, ...} (para podar _por_usuario)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expiraciones = 0
+        self.invalidaciones = 0
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            expira_en, valor = entrada
+            if expira_en is not None and expira_en <= time.monotonic():
+                self._quitar(clave)
+                self.expiraciones += 1
+                self.misses += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def set(self, clave, valor, usuario_id=None):
+        if self.max_entradas <= 0:
+            return
+        expira_en = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._datos[clave] = (expira_en, valor)
+            self._datos.move_to_end(clave)
+            if usuario_id is not None:
+                anterior = self._por_usuario.get(usuario_id)
+                if anterior is not None and anterior != clave:
+                    self._desvincular(usuario_id, anterior)
+                self._por_usuario[usuario_id] = clave
+                self._usuarios.setdefault(clave, set()).add(usuario_id)
+            while len(self._datos) > self.max_entradas:
+                self._quitar(next(iter(self._datos)))
+                self.evictions += 1
+
+    def _desvincular(self, usuario_id, clave):
+        usuarios = self._usuarios.get(clave)
+        if usuarios is not None:
+            usuarios.discard(usuario_id)
+            if not usuarios:
+                del self._usuarios[clave]
+
+    def _quitar(self, clave):
+        """Saca una entrada (con el lock tomado) y olvida los usuarios que apuntaban a ella."""
+        entrada = self._datos.pop(clave, None)
+        for usuario_id in self._usuarios.pop(clave, ()):
+            self._por_usuario.pop(usuario_id, None)
+        return entrada
+
+    def invalidar_usuario(self, usuario_id):
+        """Elimina la entrada asociada a un usuario (p. ej. al guardar su perfil)."""
+        with self._lock:
+            clave = self._por_usuario.get(usuario_id)
+            if clave is not None and self._quitar(clave) is not None:
+                self.invalidaciones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._por_usuario.clear()
+            self._usuarios.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entradas': len(self._datos),
+                'max_entradas': self.max_entradas,
+                'ttl_s': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else None,
+                'evictions': self.evictions,
+                'expiraciones': self.expiraciones,
+                'invalidaciones': self.invalidaciones,
+            }
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from ML_Nutricion.dataset import DATASET_PATH
+from ML_Nutricion.indices import INDICES
+from ML_Nutricion.plan import UMBRAL_DERIVA, recomendador_plan
+
+
+class Command(BaseCommand):
+    help = ("Entrena el recomendador del plan de entrenamiento y guarda sus artefactos en ModelosML/PlanEntrenamiento/ "
+            "(con --agregar, añade filas nuevas al modelo ya entrenado; con --compactar, reduce su índice)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', default=DATASET_PATH, help="CSV con el esquema de Fit-Evolution_Dataset.csv")
+        parser.add_argument('--sin-cache', action='store_true', help="No usar la caché de dataset")
+        parser.add_argument('--indice', choices=INDICES, default='auto',
+                            help="Índice de vecinos: exacto (brute, kd_tree, ball_tree) o aproximado (ivf)")
+        parser.add_argument('--sondeos', type=int, default=None, help="Listas sondeadas por consulta (sólo ivf)")
+        parser.add_argument('--agregar', default=None, metavar='CSV',
+                            help="Añadir las filas de este CSV al modelo entrenado en vez de reentrenar")
+        parser.add_argument('--umbral-deriva', type=float, default=UMBRAL_DERIVA,
+                            help="Deriva del escalado a partir de la cual --agregar reconstruye el índice")
+        parser.add_argument('--max-filas', type=int, default=None,
+                            help="Tamaño máximo del índice al entrenar o agregar (compacta si lo supera)")
+        parser.add_argument('--compactar', type=int, default=None, metavar='FILAS',
+                            help="Compactar el modelo entrenado a este número de filas, sin reentrenar")
+
+    def handle(self, *args, **options):
+        if options['compactar']:
+            resumen = recomendador_plan.compactar(options['compactar'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Índice compactado de {resumen['filas_antes']} a {resumen['filas']} filas "
+                f"({resumen['ejercicios_en_indice']} ejercicios) en {resumen['tiempo_s']:.2f} s "
+                f"({resumen['tamano_disco_bytes'] / 1e6:.1f} MB)"
+            ))
+            return
+        if options['agregar']:
+            resumen = recomendador_plan.agregar(options['agregar'], umbral_deriva=options['umbral_deriva'],
+                                                max_filas=options['max_filas'])
+            detalle = f"reconstruido: {resumen['motivo']}" if resumen['reconstruido'] else f"deriva {resumen['deriva']:.3f}"
+            self.stdout.write(self.style.SUCCESS(
+                f"Añadidas {resumen['filas_nuevas']} filas ({resumen['ejercicios_nuevos']} ejercicios nuevos): "
+                f"{resumen['filas']} filas en el índice {resumen['indice']}, {resumen['tiempo_s']:.2f} s ({detalle})"
+            ))
+            return
+        params = {'n_sondeos': options['sondeos']} if options['sondeos'] else {}
+        resumen = recomendador_plan.entrenar(options['dataset'], usar_cache=not options['sin_cache'],
+                                             indice=options['indice'], max_filas=options['max_filas'], **params)
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomendador entrenado: {resumen['filas']} filas (índice {resumen['indice']}) "
+            f"en {resumen['tiempo_s']:.2f} s "
+            f"({resumen['tamano_disco_bytes'] / 1e6:.1f} MB en {recomendador_plan.directorio})"
+        ))
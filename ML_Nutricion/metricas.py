@@ -0,0 +1,141 @@
+"""
+Instrumentación ligera de las rutas de ML.
+
+Cada ruta (p. ej. 'macronutrientes') registra la duración de sus etapas
+(carga de artefactos, mapeo de features, scaler.transform, model.predict...)
+en histogramas de buckets fijos, y cuenta los errores por tipo de excepción.
+Los histogramas ocupan memoria constante y permiten estimar p50/p90/p99 por
+etapa sin guardar cada muestra.
+
+Las métricas son por proceso; la vista /api/ml/metricas/ devuelve las del
+worker que atiende la petición. No importa Django, así que también se puede
+usar desde ScriptsML.
+
+Uso:
+
+    with metricas_ml.etapa('macronutrientes', 'model_predict'):
+        y = model.predict(X)
+
+    @metricas_ml.medir('plan_inteligente')
+    def generar_plan(...): ...
+"""
+import bisect
+import functools
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Límites superiores de los buckets en milisegundos (el último es +inf)
+BUCKETS_MS = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000, float('inf'),
+)
+
+
+class Histograma:
+    """Conteos por bucket más suma y máximo de las duraciones (ms)."""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.conteos = [0] * len(buckets)
+        self.n = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, ms):
+        self.conteos[bisect.bisect_left(self.buckets, ms)] += 1
+        self.n += 1
+        self.suma += ms
+        self.maximo = max(self.maximo, ms)
+
+    def percentil(self, q):
+        """Límite superior del bucket que contiene el percentil q (cota del valor real)."""
+        if not self.n:
+            return None
+        objetivo = q / 100 * self.n
+        acumulado = 0
+        for limite, conteo in zip(self.buckets, self.conteos):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+    def stats(self):
+        return {
+            'n': self.n,
+            'media_ms': self.suma / self.n if self.n else None,
+            'p50_ms': self.percentil(50),
+            'p90_ms': self.percentil(90),
+            'p99_ms': self.percentil(99),
+            'max_ms': self.maximo if self.n else None,
+            'buckets': {
+                ('+inf' if limite == float('inf') else str(limite)): conteo
+                for limite, conteo in zip(self.buckets, self.conteos)
+            },
+        }
+
+
+class MetricasML:
+    """Histogramas por (ruta, etapa) y contadores de errores por (ruta, tipo)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histogramas = {}
+        self._errores = Counter()
+
+    def registrar(self, ruta, etapa, segundos):
+        with self._lock:
+            histograma = self._histogramas.get((ruta, etapa))
+            if histograma is None:
+                histograma = self._histogramas[(ruta, etapa)] = Histograma()
+            histograma.observar(segundos * 1000)
+
+    @contextmanager
+    def etapa(self, ruta, nombre):
+        """Mide el bloque y lo registra como etapa `nombre` de `ruta` (también si falla)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(ruta, nombre, time.perf_counter() - inicio)
+
+    def error(self, ruta, exc):
+        with self._lock:
+            self._errores[(ruta, type(exc).__name__)] += 1
+
+    def medir(self, ruta, etapa='total'):
+        """Decorador: registra la duración total de la función y cuenta sus excepciones."""
+        def decorador(fn):
+            @functools.wraps(fn)
+            def envoltura(*args, **kwargs):
+                try:
+                    with self.etapa(ruta, etapa):
+                        return fn(*args, **kwargs)
+                except Exception as e:
+                    self.error(ruta, e)
+                    raise
+            return envoltura
+        return decorador
+
+    def stats(self):
+        """{ruta: {'etapas': {etapa: {...}}, 'errores': {tipo: n}}}"""
+        with self._lock:
+            etapas = {clave: h.stats() for clave, h in self._histogramas.items()}
+            errores = dict(self._errores)
+
+        resultado = {}
+        for (ruta, etapa), valores in sorted(etapas.items()):
+            resultado.setdefault(ruta, {'etapas': {}, 'errores': {}})['etapas'][etapa] = valores
+        for (ruta, tipo), n in sorted(errores.items()):
+            resultado.setdefault(ruta, {'etapas': {}, 'errores': {}})['errores'][tipo] = n
+        return resultado
+
+    def limpiar(self):
+        with self._lock:
+            self._histogramas.clear()
+            self._errores.clear()
+
+
+# Instancia única por proceso
+metricas_ml = MetricasML()
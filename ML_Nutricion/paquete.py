@@ -0,0 +1,222 @@
+"""
+Paquete versionado de artefactos del modelo de macronutrientes.
+
+El entrenamiento deja todo lo que necesita una predicción en un único
+directorio inmutable:
+
+    ModelosML/MacroNutrientes/
+        ACTIVO                      <- nombre de la versión activa
+        versiones/<version>/
+            modelo_macros.pkl
+            modelo_macros_compilado/   (si el modelo es un bosque)
+            preprocesado.pkl        <- Pipeline perfil -> features escaladas
+            rejilla_macros/         <- (opcional) ScriptsML/RejillaMacros.py
+            manifest.json           <- features, targets, métricas, checksums
+
+Una versión publicada no se modifica: lo que se deriva después del modelo
+(p. ej. la rejilla) se publica como versión nueva con derivar_version().
+
+El paquete se escribe en un directorio temporal y se publica con
+os.rename; después ACTIVO se sustituye con os.replace. Así un lector nunca
+ve un preprocesado nuevo con un modelo viejo: o ve la versión anterior
+completa o la nueva completa. Si no existe ACTIVO se usa la estructura
+plana (los .pkl directamente en MacroNutrientes/). No importa Django.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+
+from .artefactos import guardar_objeto
+
+ACTIVO = 'ACTIVO'
+VERSIONES = 'versiones'
+MANIFIESTO = 'manifest.json'
+# Versiones que se conservan en disco (además de la activa)
+VERSIONES_CONSERVADAS = 3
+
+
+def _hash_fichero(path, tamano_bloque=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _checksums(directorio):
+    """sha256 de cada fichero del paquete (ruta relativa -> hash), sin el manifiesto."""
+    archivos = {}
+    for raiz, _, ficheros in os.walk(directorio):
+        for nombre in ficheros:
+            path = os.path.join(raiz, nombre)
+            relativo = os.path.relpath(path, directorio)
+            if relativo != MANIFIESTO:
+                archivos[relativo] = _hash_fichero(path)
+    return dict(sorted(archivos.items()))
+
+
+def _checksum_total(archivos):
+    return hashlib.sha256(json.dumps(archivos, sort_keys=True).encode()).hexdigest()
+
+
+def version_activa(base):
+    """Nombre de la versión activa, o None si no hay paquetes."""
+    try:
+        with open(os.path.join(base, ACTIVO), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def ruta_activa(base):
+    """Directorio con los artefactos a cargar: la versión activa o, si no hay, `base`."""
+    version = version_activa(base)
+    return os.path.join(base, VERSIONES, version) if version else base
+
+
+def leer_manifiesto(directorio):
+    """Manifiesto del paquete, o None en la estructura plana."""
+    try:
+        with open(os.path.join(directorio, MANIFIESTO), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def cargar_feature_columns(directorio):
+    manifiesto = leer_manifiesto(directorio)
+    if manifiesto is not None:
+        return manifiesto['feature_columns']
+    return joblib.load(os.path.join(directorio, 'feature_columns.pkl'))
+
+
+def verificar(directorio):
+    """
+    Comprueba los checksums del manifiesto; lanza ValueError si no coinciden.
+
+    Sólo se verifican los ficheros listados en el manifiesto.
+    """
+    manifiesto = leer_manifiesto(directorio)
+    if manifiesto is None:
+        return
+    try:
+        archivos = {nombre: _hash_fichero(os.path.join(directorio, nombre)) for nombre in manifiesto['archivos']}
+    except FileNotFoundError as e:
+        raise ValueError(f"Paquete {manifiesto.get('version')} incompleto: {e.filename}") from e
+    if archivos != manifiesto['archivos'] or _checksum_total(archivos) != manifiesto['checksum']:
+        raise ValueError(f"Checksum incorrecto en el paquete {manifiesto.get('version')}")
+
+
+def guardar_paquete(base, model, preprocesado, feature_columns, target_columns,
+                    metricas=None, compilado=None, activar=True):
+    """
+    Escribe un paquete nuevo en base/versiones/ y (por defecto) lo activa.
+
+    compilado: objeto con guardar(directorio) (p. ej. BosqueCompilado) o None.
+    Devuelve la versión creada.
+    """
+    def escribir(temporal):
+        # Sin compresión: el pickle y el bosque compilado se pueden mapear en memoria
+        guardar_objeto(model, os.path.join(temporal, 'modelo_macros.pkl'))
+        if compilado is not None:
+            compilado.guardar(os.path.join(temporal, 'modelo_macros_compilado'))
+        joblib.dump(preprocesado, os.path.join(temporal, 'preprocesado.pkl'))
+
+    manifiesto = {
+        'feature_columns': list(feature_columns),
+        'target_columns': list(target_columns),
+        'metricas': metricas or {},
+    }
+    return _publicar(base, escribir, manifiesto, activar)
+
+
+def derivar_version(base, extras, activar=True):
+    """
+    Publica una versión nueva con los ficheros de la versión activa más
+    `extras` (nombre del subdirectorio -> objeto con guardar(directorio),
+    p. ej. una RejillaMacros). La versión de origen no se toca, así que la
+    recarga en caliente ve el cambio como cualquier otra versión nueva.
+    Devuelve la versión creada.
+    """
+    origen = version_activa(base)
+    if origen is None:
+        raise FileNotFoundError(f"No hay versión activa en {base}")
+    directorio = os.path.join(base, VERSIONES, origen)
+    verificar(directorio)
+    anterior = leer_manifiesto(directorio)
+
+    def escribir(temporal):
+        for nombre in os.listdir(directorio):
+            if nombre == MANIFIESTO or nombre in extras:
+                continue
+            path = os.path.join(directorio, nombre)
+            if os.path.isdir(path):
+                shutil.copytree(path, os.path.join(temporal, nombre))
+            else:
+                shutil.copy2(path, os.path.join(temporal, nombre))
+        for nombre, objeto in extras.items():
+            objeto.guardar(os.path.join(temporal, nombre))
+
+    manifiesto = {clave: anterior[clave] for clave in ('feature_columns', 'target_columns', 'metricas')}
+    manifiesto['derivada_de'] = origen
+    return _publicar(base, escribir, manifiesto, activar)
+
+
+def _publicar(base, escribir, manifiesto, activar):
+    """Escribe con escribir(temporal) un paquete en un directorio temporal, lo publica y (opcional) lo activa."""
+    versiones_dir = os.path.join(base, VERSIONES)
+    os.makedirs(versiones_dir, exist_ok=True)
+    marca = time.strftime('%Y%m%d-%H%M%S')
+    temporal = tempfile.mkdtemp(prefix='.tmp-', dir=versiones_dir)
+    try:
+        escribir(temporal)
+        archivos = _checksums(temporal)
+        checksum = _checksum_total(archivos)
+        version = f'{marca}-{checksum[:8]}'
+        with open(os.path.join(temporal, MANIFIESTO), 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': version,
+                'creado': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                **manifiesto,
+                'archivos': archivos,
+                'checksum': checksum,
+            }, f, ensure_ascii=False, indent=2)
+        destino = os.path.join(versiones_dir, version)
+        if os.path.isdir(destino):
+            # Mismo contenido en el mismo segundo: la versión ya existe
+            shutil.rmtree(temporal)
+        else:
+            os.rename(temporal, destino)
+    except BaseException:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+
+    if activar:
+        activar_version(base, version)
+    return version
+
+
+def activar_version(base, version):
+    """Apunta ACTIVO a `version` de forma atómica y limpia versiones antiguas."""
+    if not os.path.isdir(os.path.join(base, VERSIONES, version)):
+        raise FileNotFoundError(f"No existe la versión {version}")
+    temporal = os.path.join(base, f'.{ACTIVO}.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+    os.replace(temporal, os.path.join(base, ACTIVO))
+    _limpiar_versiones(base, version)
+
+
+def _limpiar_versiones(base, activa):
+    # Los nombres empiezan por la fecha, así que el orden alfabético es cronológico.
+    # Borrar una versión que un worker aún tiene mapeada es seguro: el inodo vive hasta que la suelte.
+    versiones_dir = os.path.join(base, VERSIONES)
+    versiones = sorted(v for v in os.listdir(versiones_dir) if not v.startswith('.'))
+    for version in versiones[:-VERSIONES_CONSERVADAS]:
+        if version != activa:
+            shutil.rmtree(os.path.join(versiones_dir, version), ignore_errors=True)
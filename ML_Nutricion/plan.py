@@ -0,0 +1,760 @@
+"""
+Recomendador del plan de entrenamiento semanal (KNN sobre el dataset).
+
+Servicio con dos puntos de entrada explícitos:
+
+* entrenar(): lee del CSV sólo las columnas que usa el recomendador,
+  ajusta encoders, escalador e índice de vecinos (exacto o aproximado, ver
+  indices.py) y guarda los artefactos en
+  ModelosML/PlanEntrenamiento/ (también el catálogo de ejercicios ya
+  compilado a arrays, para no volver a leer el CSV al servir). Se lanza
+  con `python manage.py entrenar_plan` o ScriptsML/PlanEntrenamiento.py.
+* cargar(): carga los artefactos una vez por proceso. Se llama sola en la
+  primera recomendación.
+
+agregar() incorpora filas nuevas (DataFrame o CSV) sin reentrenar:
+las codifica con los encoders y el escalador actuales y amplía el índice
+y el catálogo. Sólo reconstruye (escalador e índice, sobre las filas que
+ya tiene el índice más las nuevas, sin releer el CSV) si aparecen
+categorías nuevas o si la deriva del escalado supera umbral_deriva.
+
+compactar() (o max_filas en entrenar/agregar) limita el índice a un número
+fijo de filas representativas por Objetivo y Nivel_experiencia (ver
+compactacion.py), por mucho que crezca el histórico.
+
+Sin usuario_id el orden de los ejercicios es aleatorio en cada llamada. Con
+usuario_id el orden sale de una semilla derivada del usuario y del periodo
+del plan (la semana ISO por defecto): el mismo perfil da el mismo plan toda
+la semana, y esos planes se sirven desde una caché LRU (recargas de página,
+vistas previas) cuyos aciertos se ven en stats().
+
+Importar este módulo no lee el dataset ni entrena nada. En memoria sólo
+quedan el índice KNN (mapeado, ver artefactos.py), media y escala del
+escalador, los códigos de las categóricas y el catálogo precalculado
+(ModeloPlan). No importa Django.
+"""
+import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from .artefactos import guardar_objeto, cargar_objeto, guardar_arrays, cargar_arrays, tamano
+from .compactacion import seleccionar_filas
+from .dataset import DATASET_PATH, PROJECT_DIR, cargar_dataset, clases, label_encoder, leer_csv, texto
+from .indices import ampliar_indice, crear_indice, filas_indice, reajustar_indice, tipo_indice
+from .lru import CachePredicciones
+from .metricas import metricas_ml
+
+logger = logging.getLogger(__name__)
+
+PLAN_DIR = os.path.join(PROJECT_DIR, 'ModelosML', 'PlanEntrenamiento')
+MODELO_KNN = 'fit_model_knn.pkl'
+SCALER = 'fit_scaler.pkl'
+ENCODERS = 'fit_encoders.pkl'
+CATALOGO = 'catalogo_plan'
+
+# Features del usuario (en este orden) y columnas del catálogo de ejercicios
+FEATURES = [
+    'Edad', 'Género', 'Peso_(kg)', 'Altura_(m)', 'IMC',
+    'Porcentaje_grasa', 'Nivel_experiencia',
+    'Duración_sesión_(horas)', 'Frecuencia_entrenamiento_(días/semana)', 'Objetivo'
+]
+COLUMNAS_CATALOGO = [
+    'Tipo_entrenamiento', 'Entrenamiento', 'Grupo_muscular_objetivo',
+    'Equipamiento_necesario', 'Nivel_dificultad', 'Parte_cuerpo'
+]
+COLUMNAS_USADAS = FEATURES + COLUMNAS_CATALOGO
+LABEL_COLS = ['Género', 'Nivel_experiencia', 'Objetivo']
+
+# Columnas que no se repiten dentro de un plan (diversidad)
+COLUMNAS_DIVERSIDAD = ['Entrenamiento', 'Grupo_muscular_objetivo', 'Parte_cuerpo']
+# Registro de salida de cada ejercicio: clave en el plan -> columna del catálogo
+SALIDA = {
+    "Entrenamiento": 'Entrenamiento',
+    "Tipo": 'Tipo_entrenamiento',
+    "Grupo_muscular": 'Grupo_muscular_objetivo',
+    "Parte_cuerpo": 'Parte_cuerpo',
+    "Dificultad": 'Nivel_dificultad',
+    "Equipamiento": 'Equipamiento_necesario',
+}
+
+N_VECINOS = 20  # Aumentamos para tener más variedad
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+
+# Deriva máxima (en desviaciones del escalador) de media o desviación de las
+# filas escaladas antes de que agregar() reconstruya escalador e índice
+UMBRAL_DERIVA = 0.1
+
+# Estratos de la compactación: cada combinación conserva su parte del índice
+COLUMNAS_ESTRATO = ['Objetivo', 'Nivel_experiencia']
+
+# Caché de planes con semilla (ver RecomendadorPlan.generar_plan_semanal)
+CACHE_MAX_ENTRADAS = 4096
+CACHE_TTL = None  # la semilla ya cambia con el periodo
+
+# Usuario de ejemplo (script de entrenamiento, calentamiento y benchmarks)
+USUARIO_EJEMPLO = {
+    "Edad": 28,
+    "Género": "Hombre",
+    "Peso_(kg)": 75.0,
+    "Altura_(m)": 1.75,
+    "IMC": 24.5,
+    "Porcentaje_grasa": 18.0,
+    "Nivel_experiencia": "Intermedio",
+    "Duración_sesión_(horas)": 1.5,
+    "Frecuencia_entrenamiento_(días/semana)": 4,
+    "Objetivo": "Hipertrofia"
+    # Opcional: "Días_entrenamiento": ["Lunes", "Martes", "Jueves", "Sábado"]
+}
+
+
+def preparar_datos(df):
+    """Filas completas, features codificadas (float32) y catálogo como texto."""
+    df = df[COLUMNAS_USADAS].dropna().reset_index(drop=True)
+    X = df[FEATURES].copy()
+    datos = {}
+    for i, col in enumerate(LABEL_COLS):
+        encoder = LabelEncoder()
+        X[col] = encoder.fit_transform(df[col])
+        datos[f'clases_{i}'] = clases(encoder)
+    datos['X'] = X.to_numpy(dtype=np.float32)
+    for i, col in enumerate(COLUMNAS_CATALOGO):
+        datos[f'catalogo_{i}'] = texto(df[col])
+    return datos
+
+
+def compilar_catalogo(columnas):
+    """
+    Columnas del catálogo (catalogo_<i> -> array de texto, una fila por fila
+    del índice) -> arrays del catálogo precalculado:
+
+        registro            int32 por fila: índice del ejercicio en valores_<i>
+        valores_<i>         texto de cada ejercicio distinto (sin repetir)
+        clave               int32 por ejercicio: combinación de
+                            COLUMNAS_DIVERSIDAD, para quitar repetidos
+
+    Muchas filas del histórico comparten ejercicio, así que el texto se
+    guarda una vez por ejercicio y no por fila.
+    """
+    tabla = pd.DataFrame({col: np.asarray(columnas[f'catalogo_{i}']) for i, col in enumerate(COLUMNAS_CATALOGO)})
+    registro = tabla.groupby(COLUMNAS_CATALOGO, sort=False).ngroup().to_numpy(dtype=np.int32)
+    ejercicios = tabla.drop_duplicates().reset_index(drop=True)
+    arrays = {'registro': registro}
+    for i, col in enumerate(COLUMNAS_CATALOGO):
+        arrays[f'valores_{i}'] = texto(ejercicios[col])
+    arrays['clave'] = ejercicios.groupby(COLUMNAS_DIVERSIDAD, sort=False).ngroup().to_numpy(dtype=np.int32)
+    return arrays
+
+
+def ampliar_catalogo(catalogo, columnas):
+    """
+    Catálogo precalculado con filas nuevas al final (columnas catalogo_<i>
+    como las de preparar_datos). Los ejercicios que ya existían reutilizan
+    su índice; los nuevos se añaden a valores_<i> y reciben la clave de su
+    combinación de COLUMNAS_DIVERSIDAD (nueva si no existía).
+    """
+    valores = [np.asarray(catalogo[f'valores_{i}']).tolist() for i in range(len(COLUMNAS_CATALOGO))]
+    posiciones = [COLUMNAS_CATALOGO.index(col) for col in COLUMNAS_DIVERSIDAD]
+    ejercicios = {fila: j for j, fila in enumerate(zip(*valores))}
+    claves = {}
+    for fila, clave in zip(zip(*valores), np.asarray(catalogo['clave']).tolist()):
+        claves.setdefault(tuple(fila[p] for p in posiciones), clave)
+
+    filas = list(zip(*(np.asarray(columnas[f'catalogo_{i}']).tolist() for i in range(len(COLUMNAS_CATALOGO)))))
+    registro = np.empty(len(filas), dtype=np.int32)
+    claves_nuevas = []
+    for r, fila in enumerate(filas):
+        j = ejercicios.get(fila)
+        if j is None:
+            j = ejercicios[fila] = len(ejercicios)
+            for i, valor in enumerate(fila):
+                valores[i].append(valor)
+            claves_nuevas.append(claves.setdefault(tuple(fila[p] for p in posiciones), len(claves)))
+        registro[r] = j
+
+    arrays = {'registro': np.concatenate([np.asarray(catalogo['registro']), registro])}
+    for i in range(len(COLUMNAS_CATALOGO)):
+        arrays[f'valores_{i}'] = np.asarray(valores[i], dtype=str)
+    arrays['clave'] = np.concatenate([np.asarray(catalogo['clave']), np.asarray(claves_nuevas, dtype=np.int32)])
+    return arrays
+
+
+def codigos_encoders(encoders):
+    """Valor -> código de cada categórica (tipos de Python, para buscar en un dict)."""
+    return {col: {v: i for i, v in enumerate(encoder.classes_.tolist())} for col, encoder in encoders.items()}
+
+
+def codificar(usuarios, codigos):
+    """
+    Matriz sin escalar (n, n_features) para una lista de dicts de usuario o
+    un DataFrame. Las categorías que no están en `codigos` se codifican como 0.
+    """
+    if isinstance(usuarios, pd.DataFrame):
+        return np.column_stack([
+            usuarios[col].astype(object).map(codigos[col]).fillna(0).to_numpy(dtype=float)
+            if col in codigos else usuarios[col].to_numpy(dtype=float)
+            for col in FEATURES
+        ])
+    return np.array([
+        [codigos[col].get(u[col], 0) if col in codigos else u[col] for col in FEATURES]
+        for u in usuarios
+    ], dtype=float)
+
+
+def deriva_escalado(X_indice, X_nuevo, constantes=None):
+    """
+    Cuánto se aleja el escalador de las filas del índice más las nuevas
+    (ambas ya escaladas con él): el mayor |media| o |desviación - 1| entre
+    las features, en desviaciones del escalador. 0 = como recién ajustado.
+    Las columnas `constantes` (varianza 0 al ajustar) no cuentan.
+    """
+    n_a, n_b = len(X_indice), len(X_nuevo)
+    media_a, media_b = X_indice.mean(axis=0, dtype=np.float64), X_nuevo.mean(axis=0, dtype=np.float64)
+    var_a, var_b = X_indice.var(axis=0, dtype=np.float64), X_nuevo.var(axis=0, dtype=np.float64)
+    # Media y varianza de la unión a partir de las de cada parte
+    n = n_a + n_b
+    delta = media_b - media_a
+    media = media_a + delta * n_b / n
+    var = (var_a * n_a + var_b * n_b + delta ** 2 * n_a * n_b / n) / n
+    deriva = np.maximum(np.abs(media), np.abs(np.sqrt(var) - 1))
+    if constantes is not None:
+        deriva = deriva[~np.asarray(constantes)]
+    return float(deriva.max()) if deriva.size else 0.0
+
+
+def dias_seleccionados(usuario):
+    """Días de la semana en que entrena el usuario, en orden de asignación."""
+    dias_entrenamiento = int(usuario['Frecuencia_entrenamiento_(días/semana)'])
+
+    # Opcional: permitir al usuario elegir qué días entrenar (ej. ["Lunes", "Miércoles", "Viernes"])
+    if 'Días_entrenamiento' in usuario and isinstance(usuario['Días_entrenamiento'], list):
+        dias = [d for d in usuario['Días_entrenamiento'] if d in DIAS_SEMANA]
+        if len(dias) < dias_entrenamiento:
+            # Completar con otros días si faltan
+            restantes = [d for d in DIAS_SEMANA if d not in dias]
+            dias += restantes[:dias_entrenamiento - len(dias)]
+        return dias
+    return DIAS_SEMANA[:dias_entrenamiento]
+
+
+def periodo_actual(fecha=None):
+    """Periodo del plan: la semana ISO de `fecha` (hoy por defecto), p. ej. '2026-W42'."""
+    iso = (fecha or datetime.date.today()).isocalendar()
+    return f"{iso.year}-W{iso.week:02d}"
+
+
+def semilla_plan(usuario_id, periodo=None):
+    """Semilla (entero de 64 bits) del plan de un usuario en un periodo; estable entre procesos."""
+    texto_semilla = f"{usuario_id}:{periodo or periodo_actual()}"
+    return int.from_bytes(hashlib.blake2b(texto_semilla.encode(), digest_size=8).digest(), 'little')
+
+
+def claves_aleatorias(semillas, n):
+    """
+    Matriz (len(semillas), n) de uint64 pseudoaleatorios deterministas: el
+    valor (u, j) sólo depende de semillas[u] y de j (splitmix64). Ordenar una
+    fila por estas claves da la misma permutación para un usuario tanto si
+    se calcula sólo como dentro de un lote.
+    """
+    with np.errstate(over='ignore'):
+        z = np.asarray(semillas, dtype=np.uint64)[:, None] + \
+            np.arange(1, n + 1, dtype=np.uint64)[None, :] * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def copiar_plan(plan):
+    """Copia de un plan (los registros de cada día son dicts mutables)."""
+    return {dia: dict(v) if isinstance(v, dict) else v for dia, v in plan.items()}
+
+
+def posiciones_dias(frecuencias, dias_elegidos=None):
+    """
+    Matriz (n, 7): para cada usuario y día de la semana, el orden de ese día
+    entre sus días de entrenamiento (0 = el primero) o -1 si descansa.
+
+    Sin días elegidos son los primeros `frecuencia` días de la semana; los
+    usuarios con una lista en dias_elegidos pasan por dias_seleccionados().
+    """
+    frecuencias = np.asarray(frecuencias, dtype=float).astype(int)
+    dias = np.arange(len(DIAS_SEMANA))
+    posiciones = np.where(dias[None, :] < frecuencias[:, None], dias[None, :], -1)
+    if dias_elegidos is not None:
+        for u, elegidos in enumerate(dias_elegidos):
+            if isinstance(elegidos, list):
+                posiciones[u] = -1
+                usuario = {'Frecuencia_entrenamiento_(días/semana)': frecuencias[u], 'Días_entrenamiento': elegidos}
+                for i, dia in enumerate(dias_seleccionados(usuario)):
+                    posiciones[u, DIAS_SEMANA.index(dia)] = i
+    return posiciones
+
+
+class ModeloPlan:
+    """
+    Artefactos del recomendador ya cargados y precalculados.
+
+    El catálogo está en arrays NumPy (ver compilar_catalogo) y cada ejercicio
+    tiene ya su registro de salida, así que una recomendación es una
+    llamada a kneighbors más indexado de arrays: sin pandas ni sklearn
+    fuera del índice. No se modifica después de construirse.
+    """
+
+    def __init__(self, model_knn, scaler, encoders, catalogo, tiempo_carga=None):
+        self.model_knn = model_knn
+        # Originales, para ampliar el modelo con filas nuevas (RecomendadorPlan.agregar)
+        self.scaler = scaler
+        self.encoders = encoders
+        self.catalogo = catalogo
+        self.media = np.asarray(scaler.mean_, dtype=float)
+        self.escala = np.asarray(scaler.scale_, dtype=float)
+        self.codigos = codigos_encoders(encoders)
+        self.registro = np.asarray(catalogo['registro'])
+        self.clave = np.asarray(catalogo['clave'])
+        valores = [np.asarray(catalogo[f'valores_{i}']).tolist() for i in range(len(COLUMNAS_CATALOGO))]
+        self.registros = [
+            {salida: valores[COLUMNAS_CATALOGO.index(col)][j] for salida, col in SALIDA.items()}
+            for j in range(len(self.clave))
+        ]
+        self.tiempo_carga = tiempo_carga
+
+    @property
+    def n_filas(self):
+        return len(self.registro)
+
+    def features(self, usuarios):
+        """Matriz escalada (n, n_features) para una lista de dicts de usuario o un DataFrame."""
+        return (codificar(usuarios, self.codigos) - self.media) / self.escala
+
+    def estratos(self):
+        """
+        Estrato (COLUMNAS_ESTRATO) de cada fila del índice, como un entero.
+        Nivel_experiencia es continuo en el dataset: se redondea al nivel entero.
+        """
+        X = filas_indice(self.model_knn)
+        columnas = []
+        for col in COLUMNAS_ESTRATO:
+            j = FEATURES.index(col)
+            valores = X[:, j] * self.escala[j] + self.media[j]
+            if col in self.codigos:
+                codigos = np.clip(np.rint(valores).astype(int), 0, len(self.codigos[col]) - 1)
+                valores = self.encoders[col].classes_[codigos]
+            if np.asarray(valores).dtype.kind == 'f':
+                valores = np.rint(valores)
+            columnas.append(np.unique(valores, return_inverse=True)[1])
+        return np.ravel_multi_index(columnas, [c.max() + 1 for c in columnas])
+
+    def compactado(self, max_filas, semilla=0):
+        """
+        ModeloPlan con como mucho max_filas filas representativas del índice
+        (ver compactacion.seleccionar_filas), mismo escalador, encoders y
+        ejercicios. Si ya cabe, devuelve el mismo modelo.
+        """
+        if self.n_filas <= max_filas:
+            return self
+        seleccion = seleccionar_filas(filas_indice(self.model_knn), self.estratos(), max_filas, semilla,
+                                      ejercicios=self.registro)
+        model_knn = reajustar_indice(self.model_knn, filas_indice(self.model_knn)[seleccion])
+        catalogo = dict(self.catalogo, registro=np.asarray(self.registro)[seleccion])
+        return ModeloPlan(model_knn, self.scaler, self.encoders, catalogo)
+
+    def vecinos(self, X_scaled):
+        """Ejercicios (índice en self.registros) de los vecinos de cada fila."""
+        _, indices = self.model_knn.kneighbors(X_scaled)
+        return self.registro[indices]
+
+    def candidatos(self, ejercicios, semilla=None):
+        """
+        Ejercicios sin repetir combinación de COLUMNAS_DIVERSIDAD, en orden
+        aleatorio (determinista si se da una semilla, ver claves_aleatorias).
+        """
+        _, primeros = np.unique(self.clave[ejercicios], return_index=True)
+        if semilla is None:
+            return np.random.permutation(ejercicios[primeros])
+        orden = np.argsort(claves_aleatorias([semilla], len(ejercicios))[0][primeros])
+        return ejercicios[primeros[orden]]
+
+    def candidatos_lote(self, ejercicios, semillas=None):
+        """
+        Versión por lotes de candidatos(): para una matriz (n, k) de
+        ejercicios devuelve la misma matriz con los ejercicios sin repetir de
+        cada fila delante, en orden aleatorio, y cuántos hay en cada fila.
+        Con una semilla por fila el orden es el mismo que el de candidatos().
+        """
+        claves = self.clave[ejercicios]
+        # Primera aparición de cada clave en la fila (como drop_duplicates): ordenar y comparar con la anterior
+        orden = np.argsort(claves, axis=1, kind='stable')
+        ordenadas = np.take_along_axis(claves, orden, axis=1)
+        primero = np.ones(claves.shape, dtype=bool)
+        primero[:, 1:] = ordenadas[:, 1:] != ordenadas[:, :-1]
+        unico = np.empty_like(primero)
+        np.put_along_axis(unico, orden, primero, axis=1)
+        # Orden aleatorio de los únicos; los repetidos quedan al final
+        if semillas is None:
+            aleatorio = np.random.random(claves.shape)
+            aleatorio[~unico] = np.inf
+        else:
+            # >> 1 deja libre el máximo de uint64 para los repetidos
+            aleatorio = claves_aleatorias(semillas, claves.shape[1]) >> np.uint64(1)
+            aleatorio[~unico] = np.iinfo(np.uint64).max
+        mezcla = np.argsort(aleatorio, axis=1)
+        return np.take_along_axis(ejercicios, mezcla, axis=1), unico.sum(axis=1)
+
+    def formatear(self, dias, candidatos):
+        """Plan de 7 días: un ejercicio por día de entrenamiento, el resto "Descanso"."""
+        resultado = dict.fromkeys(DIAS_SEMANA, "Descanso")
+        for i, dia in enumerate(dias):
+            # Reutilizar de forma balanceada si hay más días que candidatos
+            resultado[dia] = dict(self.registros[candidatos[i % len(candidatos)]])
+        return resultado
+
+    def plan(self, X_user, dias, semilla=None):
+        """Plan semanal de un usuario ya escalado (X_user de una fila) para sus días de entrenamiento."""
+        with metricas_ml.etapa('plan_semanal', 'kneighbors'):
+            ejercicios = self.vecinos(X_user)[0]
+        return self.formatear(dias, self.candidatos(ejercicios, semilla))
+
+    def generar_plan_semanal(self, usuario, semilla=None):
+        """
+        Genera un plan semanal (7 días) con ejercicios asignados solo en los días de entrenamiento.
+        usuario: dict con campos necesarios + "Días_entrenamiento" (opcional, si quieres elegir días específicos)
+        semilla: fija el orden de los ejercicios (ver semilla_plan); sin ella es aleatorio
+        """
+        with metricas_ml.etapa('plan_semanal', 'mapeo_features'):
+            X_user = self.features([usuario])
+        return self.plan(X_user, dias_seleccionados(usuario), semilla)
+
+    def generar_planes_semanales(self, usuarios, semillas=None):
+        """
+        Versión por lotes de generar_plan_semanal: una lista de dicts de
+        usuario o un DataFrame con las mismas columnas. Codifica y escala a
+        todos como una matriz, hace una sola llamada a kneighbors y asigna
+        los días con operaciones vectorizadas. Devuelve una lista de planes
+        (mismo orden y formato que generar_plan_semanal). semillas: una
+        por usuario, o None para un orden aleatorio.
+        """
+        if isinstance(usuarios, pd.DataFrame):
+            frecuencias = usuarios['Frecuencia_entrenamiento_(días/semana)'].to_numpy()
+            dias_elegidos = usuarios['Días_entrenamiento'].tolist() if 'Días_entrenamiento' in usuarios else None
+        else:
+            usuarios = list(usuarios)
+            frecuencias = [u['Frecuencia_entrenamiento_(días/semana)'] for u in usuarios]
+            dias_elegidos = [u.get('Días_entrenamiento') for u in usuarios]
+        if not len(usuarios):
+            return []
+
+        with metricas_ml.etapa('plan_semanal_lote', 'mapeo_features'):
+            X = self.features(usuarios)
+        with metricas_ml.etapa('plan_semanal_lote', 'kneighbors'):
+            ejercicios = self.vecinos(X)
+        with metricas_ml.etapa('plan_semanal_lote', 'asignacion'):
+            candidatos, n_unicos = self.candidatos_lote(ejercicios, semillas)
+            posiciones = posiciones_dias(frecuencias, dias_elegidos)
+            # Reutilizar de forma balanceada si hay más días que candidatos
+            columna = np.where(posiciones >= 0, posiciones % n_unicos[:, None], 0)
+            asignados = np.where(posiciones >= 0, np.take_along_axis(candidatos, columna, axis=1), -1)
+        with metricas_ml.etapa('plan_semanal_lote', 'formateo'):
+            registros = self.registros
+            return [
+                {dia: dict(registros[e]) if e >= 0 else "Descanso" for dia, e in zip(DIAS_SEMANA, fila)}
+                for fila in asignados.tolist()
+            ]
+
+
+class RecomendadorPlan:
+    """
+    Mantiene en memoria el ModeloPlan del proceso.
+
+    Se carga de forma perezosa en la primera recomendación; entrenar()
+    sustituye la referencia de una vez, así que una recomendación en curso
+    nunca mezcla el índice de un entrenamiento con el catálogo de otro.
+    """
+
+    def __init__(self, directorio=PLAN_DIR, max_cache=CACHE_MAX_ENTRADAS, ttl_cache=CACHE_TTL):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+        self._activo = None
+        self.cache = CachePredicciones(max_entradas=max_cache, ttl=ttl_cache)
+        os.register_at_fork(after_in_child=self._despues_de_fork)
+
+    def _despues_de_fork(self):
+        self._lock = threading.Lock()
+
+    @property
+    def cargado(self):
+        return self._activo is not None
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def existe(self):
+        """True si hay un modelo entrenado en el directorio."""
+        return all(os.path.exists(self._ruta(n)) for n in (MODELO_KNN, SCALER, ENCODERS))
+
+    # --- Entrenamiento ---
+
+    def _guardar(self, modelo):
+        """Escribe los artefactos de un ModeloPlan y lo deja como modelo activo."""
+        os.makedirs(self.directorio, exist_ok=True)
+        # Sin compresión para poder mapearlo en memoria (compartido entre workers)
+        guardar_objeto(modelo.model_knn, self._ruta(MODELO_KNN))
+        joblib.dump(modelo.scaler, self._ruta(SCALER))
+        joblib.dump(modelo.encoders, self._ruta(ENCODERS))
+        guardar_arrays(self._ruta(CATALOGO), modelo.catalogo, {'columnas': COLUMNAS_CATALOGO})
+
+        with self._lock:
+            self._activo = modelo
+        # Los planes en caché son del modelo anterior
+        self.cache.limpiar()
+
+    def entrenar(self, path=DATASET_PATH, usar_cache=True, n_vecinos=N_VECINOS, indice='auto', max_filas=None,
+                 **params_indice):
+        """
+        Ajusta el recomendador con el CSV `path`, guarda los artefactos y los
+        deja cargados. Devuelve un resumen (filas, tiempo, tamaño en disco).
+
+        indice: tipo de índice de vecinos (ver indices.INDICES); params_indice
+        se pasan a su constructor (p. ej. n_sondeos para 'ivf').
+        max_filas: si el dataset tiene más filas, el índice se compacta a
+        ese tamaño (ver compactar).
+        """
+        inicio = time.perf_counter()
+        datos, _ = cargar_dataset('plan', COLUMNAS_USADAS, preparar_datos, path=path, usar_cache=usar_cache)
+        encoders = {col: label_encoder(datos[f'clases_{i}']) for i, col in enumerate(LABEL_COLS)}
+
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(datos['X'])
+        model_knn = crear_indice(indice, n_vecinos, **params_indice)
+        model_knn.fit(X_scaled)
+        modelo = ModeloPlan(model_knn, scaler, encoders, compilar_catalogo(datos))
+        if max_filas:
+            modelo = modelo.compactado(max_filas)
+        self._guardar(modelo)
+        return {
+            'filas': modelo.n_filas,
+            'ejercicios': len(modelo.registros),
+            'indice': tipo_indice(modelo.model_knn),
+            'tiempo_s': time.perf_counter() - inicio,
+            'tamano_disco_bytes': sum(tamano(self._ruta(n)) for n in (MODELO_KNN, SCALER, ENCODERS, CATALOGO)),
+        }
+
+    def agregar(self, filas, umbral_deriva=UMBRAL_DERIVA, max_filas=None):
+        """
+        Añade al recomendador filas nuevas (DataFrame con COLUMNAS_USADAS o
+        ruta a un CSV con el esquema del dataset) sin reentrenar desde el CSV.
+
+        Las filas se codifican con los encoders y el escalador actuales y se
+        añaden al final del índice (ver indices.ampliar_indice) y del
+        catálogo. Si traen categorías que los encoders no conocen, o si con
+        ellas la deriva del escalado (deriva_escalado) supera umbral_deriva,
+        se reconstruyen encoders, escalador e índice sobre las filas del
+        índice más las nuevas. Con max_filas, si el índice ampliado lo
+        supera se compacta a ese tamaño. Guarda los artefactos, deja cargado
+        el modelo ampliado y devuelve un resumen.
+        """
+        inicio = time.perf_counter()
+        if not isinstance(filas, pd.DataFrame):
+            filas = leer_csv(COLUMNAS_USADAS, filas)
+        datos = filas[COLUMNAS_USADAS].dropna().reset_index(drop=True)
+        if datos.empty:
+            raise ValueError("No hay filas completas que añadir al recomendador")
+        modelo = self.modelo()
+
+        # Categorías de texto nuevas: no tienen código con los encoders actuales
+        encoders = modelo.encoders
+        textuales = [col for col in LABEL_COLS if encoders[col].classes_.dtype.kind not in 'iuf']
+        nuevas = {col: set(datos[col].astype(object).unique()) - set(modelo.codigos[col]) for col in textuales}
+        nuevas = {col: valores for col, valores in nuevas.items() if valores}
+        if nuevas:
+            encoders = dict(encoders)
+            for col, valores in nuevas.items():
+                encoders[col] = label_encoder(np.asarray(sorted(set(encoders[col].classes_.tolist()) | valores)))
+        X_nuevo = codificar(datos, codigos_encoders(encoders))
+        for col in LABEL_COLS:
+            if col not in textuales:
+                # Clases numéricas (Nivel_experiencia es continua en el dataset): un valor no visto
+                # toma el código de la clase más cercana por debajo, como el orden que le daría reentrenar
+                clases_col = encoders[col].classes_
+                posicion = np.searchsorted(clases_col, datos[col].to_numpy(dtype=float), side='right') - 1
+                X_nuevo[:, FEATURES.index(col)] = np.clip(posicion, 0, len(clases_col) - 1)
+
+        X_indice = filas_indice(modelo.model_knn)
+        X_nuevo_scaled = ((X_nuevo - modelo.media) / modelo.escala).astype(X_indice.dtype)
+        deriva = None
+        if not nuevas:
+            deriva = deriva_escalado(X_indice, X_nuevo_scaled, modelo.scaler.var_ == 0)
+        reconstruido = bool(nuevas) or deriva > umbral_deriva
+
+        scaler = modelo.scaler
+        if reconstruido:
+            X = np.asarray(X_indice, dtype=float) * modelo.escala + modelo.media
+            for col in nuevas:
+                # Los códigos de LabelEncoder siguen el orden de las clases: recodificar las filas antiguas
+                j = FEATURES.index(col)
+                recodificar = np.searchsorted(encoders[col].classes_, modelo.encoders[col].classes_)
+                X[:, j] = recodificar[np.rint(X[:, j]).astype(int)]
+            X = np.concatenate([X, X_nuevo])
+            scaler = StandardScaler().fit(X)
+            model_knn = reajustar_indice(modelo.model_knn, scaler.transform(X).astype(np.float32))
+        else:
+            model_knn = ampliar_indice(modelo.model_knn, X_nuevo_scaled)
+        catalogo = ampliar_catalogo(modelo.catalogo, {
+            f'catalogo_{i}': texto(datos[col]) for i, col in enumerate(COLUMNAS_CATALOGO)
+        })
+
+        ampliado = ModeloPlan(model_knn, scaler, encoders, catalogo)
+        if max_filas:
+            ampliado = ampliado.compactado(max_filas)
+        self._guardar(ampliado)
+        motivo = None
+        if nuevas:
+            motivo = f"categorías nuevas en {', '.join(nuevas)}"
+        elif reconstruido:
+            motivo = f"deriva {deriva:.3f} > {umbral_deriva}"
+        resumen = {
+            'filas_nuevas': len(datos),
+            'filas': ampliado.n_filas,
+            'ejercicios_nuevos': len(ampliado.registros) - len(modelo.registros),
+            'deriva': deriva,
+            'reconstruido': reconstruido,
+            'motivo': motivo,
+            'indice': tipo_indice(model_knn),
+            'tiempo_s': time.perf_counter() - inicio,
+        }
+        logger.info("Plan ampliado con %d filas en %.2f s (%s)", len(datos), resumen['tiempo_s'],
+                    f"reconstruido: {motivo}" if reconstruido else f"deriva {deriva:.3f}")
+        return resumen
+
+    def compactar(self, max_filas, semilla=0):
+        """
+        Reconstruye el índice con como mucho max_filas filas representativas
+        (ver ModeloPlan.compactado) y lo guarda. Paso offline: la calidad
+        frente al modelo completo se mide con ScriptsML/EvaluarCompactacionPlan.py.
+        """
+        inicio = time.perf_counter()
+        modelo = self.modelo()
+        compactado = modelo.compactado(max_filas, semilla)
+        self._guardar(compactado)
+        return {
+            'filas_antes': modelo.n_filas,
+            'filas': compactado.n_filas,
+            'ejercicios_en_indice': len(np.unique(compactado.registro)),
+            'indice': tipo_indice(compactado.model_knn),
+            'tiempo_s': time.perf_counter() - inicio,
+            'tamano_disco_bytes': sum(tamano(self._ruta(n)) for n in (MODELO_KNN, SCALER, ENCODERS, CATALOGO)),
+        }
+
+    # --- Carga ---
+
+    def _cargar_catalogo(self):
+        ruta = self._ruta(CATALOGO)
+        if os.path.exists(os.path.join(ruta, 'registro.npy')):
+            arrays, _ = cargar_arrays(ruta)
+            return arrays
+        # Artefactos anteriores sin catálogo precalculado: se compila desde la caché del dataset
+        arrays, _ = cargar_dataset('plan', COLUMNAS_USADAS, preparar_datos)
+        return compilar_catalogo(arrays)
+
+    def _cargar(self):
+        if not self.existe():
+            raise FileNotFoundError(
+                f"No hay modelo de plan en {self.directorio}: ejecutar `python manage.py entrenar_plan`"
+            )
+        inicio = time.perf_counter()
+        model_knn = cargar_objeto(self._ruta(MODELO_KNN))
+        scaler = joblib.load(self._ruta(SCALER))
+        encoders = joblib.load(self._ruta(ENCODERS))
+        catalogo = self._cargar_catalogo()
+        if len(catalogo['registro']) != model_knn.n_samples_fit_:
+            raise ValueError(
+                f"El catálogo ({len(catalogo['registro'])} filas) no corresponde al índice KNN "
+                f"({model_knn.n_samples_fit_}): reentrenar con `python manage.py entrenar_plan`"
+            )
+        return ModeloPlan(model_knn, scaler, encoders, catalogo, time.perf_counter() - inicio)
+
+    def cargar(self):
+        """Carga los artefactos si aún no están en memoria."""
+        if self._activo is None:
+            with self._lock:
+                if self._activo is None:
+                    activo = self._cargar()
+                    metricas_ml.registrar('plan_semanal', 'carga_artefactos', activo.tiempo_carga)
+                    self._activo = activo
+                    logger.info("Recomendador de plan cargado en %.3f s (%d filas, %d ejercicios, índice %s)",
+                                activo.tiempo_carga, activo.n_filas, len(activo.registros),
+                                tipo_indice(activo.model_knn))
+
+    def modelo(self):
+        """ModeloPlan activo (lo carga si hace falta). Usar el mismo objeto para toda una petición."""
+        self.cargar()
+        return self._activo
+
+    def generar_plan_semanal(self, usuario, usuario_id=None, periodo=None):
+        """
+        Plan semanal con el modelo activo (ver ModeloPlan.generar_plan_semanal).
+
+        Con usuario_id el plan es determinista (semilla_plan(usuario_id,
+        periodo)) y se guarda en la caché con clave (features escaladas,
+        días de entrenamiento, semilla): repetir la petición en el mismo
+        periodo no vuelve a consultar el índice.
+        """
+        modelo = self.modelo()
+        if usuario_id is None:
+            return modelo.generar_plan_semanal(usuario)
+        semilla = semilla_plan(usuario_id, periodo)
+        with metricas_ml.etapa('plan_semanal', 'mapeo_features'):
+            X_user = modelo.features([usuario])
+        dias = dias_seleccionados(usuario)
+        clave = (X_user.astype(np.float32).tobytes(), tuple(dias), semilla)
+        plan = self.cache.get(clave)
+        if plan is None:
+            plan = modelo.plan(X_user, dias, semilla)
+            self.cache.set(clave, plan, usuario_id=usuario_id)
+        return copiar_plan(plan)
+
+    def generar_planes_semanales(self, usuarios, usuarios_ids=None, periodo=None):
+        """
+        Planes de un lote de usuarios con el modelo activo (ver
+        ModeloPlan.generar_planes_semanales). Con usuarios_ids (uno por
+        usuario) cada plan es el mismo que daría generar_plan_semanal con
+        ese usuario_id y periodo; el lote no pasa por la caché.
+        """
+        semillas = None
+        if usuarios_ids is not None:
+            periodo = periodo or periodo_actual()
+            semillas = np.array([semilla_plan(u, periodo) for u in usuarios_ids], dtype=np.uint64)
+        return self.modelo().generar_planes_semanales(usuarios, semillas)
+
+    def stats(self):
+        activo = self._activo
+        return {
+            'cargado': activo is not None,
+            'filas_indice': activo.n_filas if activo is not None else None,
+            'indice': tipo_indice(activo.model_knn) if activo is not None else None,
+            'ejercicios': len(activo.registros) if activo is not None else None,
+            'tiempo_carga_s': activo.tiempo_carga if activo is not None else None,
+            'cache': self.cache.stats(),
+        }
+
+
+# Instancia única por proceso (worker)
+recomendador_plan = RecomendadorPlan()
+
+
+@metricas_ml.medir('plan_semanal')
+def generar_plan_semanal(usuario, usuario_id=None, periodo=None):
+    """Atajo a recomendador_plan.generar_plan_semanal."""
+    return recomendador_plan.generar_plan_semanal(usuario, usuario_id, periodo)
+
+
+@metricas_ml.medir('plan_semanal_lote')
+def generar_planes_semanales(usuarios, usuarios_ids=None, periodo=None):
+    """Atajo a recomendador_plan.generar_planes_semanales."""
+    return recomendador_plan.generar_planes_semanales(usuarios, usuarios_ids, periodo)
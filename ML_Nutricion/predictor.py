@@ -0,0 +1,387 @@
+"""
+Registro de modelos de MacroNutrientes.
+
+Carga una sola vez por proceso el paquete versionado generado por
+ScriptsML/MacroNutrientes.py (ver paquete.py) y expone una API de
+predicción segura entre hilos para las vistas. Las versiones nuevas se
+cargan en caliente, sin reiniciar el worker (settings.MACROS_RECARGA).
+
+Si existe modelo_macros_compilado/ (bosque exportado a arrays .npy, ver
+bosque.py) se mapea en memoria y se usa en lugar del pickle de sklearn, salvo que
+settings.MACROS_MOTOR = 'sklearn'. Con settings.MACROS_REJILLA = True y la
+rejilla construida (ScriptsML/RejillaMacros.py) las predicciones se
+interpolan desde la tabla precalculada (ver rejilla.py).
+
+La duración de cada etapa (carga, mapeo de features con el preprocesado,
+scaler.transform, model.predict) se registra en metricas_ml (ver metricas.py).
+"""
+import logging
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+from django.conf import settings
+
+from . import paquete
+from .artefactos import tamano
+from .bosque import BosqueCompilado
+from .cache import cache_macros, cuantizar
+from .metricas import metricas_ml
+from .rejilla import RejillaMacros
+from .features import CAMPOS_PERFIL, FEATURE_COLUMNS, macros_desde_prediccion
+
+logger = logging.getLogger(__name__)
+
+MACROS_DIR = os.path.join(settings.BASE_DIR, 'ModelosML', 'MacroNutrientes')
+
+
+class ModeloNoDisponible(FileNotFoundError):
+    """No hay ningún paquete del modelo publicado; la vista debería responder 503."""
+
+
+def rss_bytes():
+    """Memoria residente actual del proceso en bytes (None si no se puede leer)."""
+    try:
+        with open('/proc/self/statm') as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ModeloMacros:
+    """
+    Artefactos de una versión del modelo ya cargados en memoria.
+
+    No se modifica después de construirse: una petición que obtuvo este
+    objeto predice siempre con el modelo y el preprocesado de la misma
+    versión, aunque entretanto el registro pase a otra.
+    """
+
+    def __init__(self, version, model, preprocesado, rejilla, motor, tiempo_carga, memoria_bytes, tamano_disco):
+        self.version = version
+        self.model = model
+        self.preprocesado = preprocesado
+        # El escalado se aplica aparte: la caché y la rejilla trabajan con features sin escalar
+        self.mapeo = preprocesado[:-1]
+        self.scaler = preprocesado[-1]
+        self.rejilla = rejilla
+        self.motor = motor
+        self.tiempo_carga = tiempo_carga
+        self.memoria_bytes = memoria_bytes
+        self.tamano_disco = tamano_disco
+
+    def features(self, perfiles):
+        """Matriz (n, n_features) sin escalar para una lista de UserProfile o dicts."""
+        return self.mapeo.transform(perfiles)
+
+    def predict(self, features, ruta='macronutrientes'):
+        """
+        Escala y predice macronutrientes.
+
+        features: vector de una fila (n_features,) o matriz (n, n_features) en
+        el orden de features.FEATURE_COLUMNS. Devuelve un array (n, 3) con
+        Proteínas, Carbohidratos y Grasas. `ruta` es la etiqueta con la que se
+        registran los tiempos en metricas_ml.
+        """
+        X = np.asarray(features, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        if self.rejilla is not None:
+            # Modo rejilla: interpolar lo que cae en la tabla y usar el modelo para el resto
+            en_rejilla = self.rejilla.en_rejilla(X)
+            if en_rejilla.all():
+                with metricas_ml.etapa(ruta, 'rejilla'):
+                    return self.rejilla.predict(X)
+            y = np.empty((X.shape[0], self.rejilla.valores.shape[-1]))
+            with metricas_ml.etapa(ruta, 'rejilla'):
+                y[en_rejilla] = self.rejilla.predict(X[en_rejilla])
+            with metricas_ml.etapa(ruta, 'scaler_transform'):
+                X_scaled = self.scaler.transform(X[~en_rejilla])
+            with metricas_ml.etapa(ruta, 'model_predict'):
+                y[~en_rejilla] = self.model.predict(X_scaled)
+            return y
+
+        with metricas_ml.etapa(ruta, 'scaler_transform'):
+            X_scaled = self.scaler.transform(X)
+        with metricas_ml.etapa(ruta, 'model_predict'):
+            return self.model.predict(X_scaled)
+
+
+class RegistroMacros:
+    """
+    Mantiene en memoria el modelo de macronutrientes y su preprocesado.
+
+    Los artefactos se cargan de forma perezosa en la primera predicción y se
+    reutilizan en todas las peticiones del worker. Con settings.MACROS_RECARGA
+    activo, un hilo vigila el fichero ACTIVO (ver paquete.py) y, cuando el
+    entrenamiento publica una versión nueva, la carga y verifica en segundo
+    plano mientras se sigue sirviendo la anterior; después sustituye la
+    referencia al ModeloMacros de una vez, sin reiniciar el worker.
+    """
+
+    def __init__(self, directorio=MACROS_DIR):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+        self._activo = None
+        self._vigilante = None
+        self.recargas = 0
+        self.error_recarga = None
+        self._version_fallida = None
+        # Los hilos no sobreviven al fork (gunicorn con preload_app): el worker arranca el suyo
+        os.register_at_fork(after_in_child=self._despues_de_fork)
+
+    def _despues_de_fork(self):
+        self._lock = threading.Lock()
+        self._vigilante = None
+
+    @property
+    def cargado(self):
+        return self._activo is not None
+
+    @property
+    def version(self):
+        activo = self._activo
+        return activo.version if activo is not None else None
+
+    def _cargar_version(self):
+        """Carga la versión a la que apunta ACTIVO (o la estructura plana) sin tocar la activa."""
+        directorio = paquete.ruta_activa(self.directorio)
+        manifiesto = paquete.leer_manifiesto(directorio)
+        version = manifiesto['version'] if manifiesto is not None else None
+
+        model_path = os.path.join(directorio, 'modelo_macros.pkl')
+        compilado_path = os.path.join(directorio, 'modelo_macros_compilado')
+        preprocesado_path = os.path.join(directorio, 'preprocesado.pkl')
+
+        motor = getattr(settings, 'MACROS_MOTOR', 'compilado')
+        if motor == 'compilado' and os.path.exists(compilado_path):
+            model_path = compilado_path
+        else:
+            motor = 'sklearn'
+
+        rejilla_path = os.path.join(directorio, 'rejilla_macros')
+        usar_rejilla = getattr(settings, 'MACROS_REJILLA', False) and os.path.exists(rejilla_path)
+
+        rss_antes = rss_bytes()
+        inicio = time.perf_counter()
+        paquete.verificar(directorio)
+        if manifiesto is not None and manifiesto['feature_columns'] != list(FEATURE_COLUMNS):
+            raise ValueError(f"La versión {version} espera otras features: {manifiesto['feature_columns']}")
+        if not os.path.exists(preprocesado_path):
+            # Sin ACTIVO (checkout recién clonado: los artefactos no van en git) o artefactos antiguos
+            raise ModeloNoDisponible(
+                f"No hay ningún modelo de macronutrientes publicado en {self.directorio}: "
+                f"entrenar con `python ScriptsML/MacroNutrientes.py`"
+            )
+        preprocesado = joblib.load(preprocesado_path)
+        if motor == 'compilado':
+            model = BosqueCompilado.cargar(model_path)
+        else:
+            model = joblib.load(model_path)
+        rejilla = RejillaMacros.cargar(rejilla_path) if usar_rejilla else None
+        tiempo_carga = time.perf_counter() - inicio
+        rss_despues = rss_bytes()
+
+        memoria_bytes = None
+        if rss_antes is not None and rss_despues is not None:
+            memoria_bytes = max(rss_despues - rss_antes, 0)
+        tamano_disco = tamano(model_path) + tamano(preprocesado_path)
+        if rejilla is not None:
+            tamano_disco += tamano(rejilla_path)
+
+        return ModeloMacros(version, model, preprocesado, rejilla, motor, tiempo_carga, memoria_bytes, tamano_disco)
+
+    def cargar(self, vigilar=True):
+        """
+        Carga modelo y preprocesado si aún no están en memoria.
+
+        vigilar=False no arranca el hilo de recarga en caliente: es lo que usa
+        el master de gunicorn antes del fork (ver gunicorn.conf.py); cada
+        worker lo arranca en su primera llamada a modelo().
+        """
+        if self._activo is None:
+            with self._lock:
+                if self._activo is None:
+                    # Los fallos los cuenta @metricas_ml.medir de quien pidió el modelo
+                    activo = self._cargar_version()
+                    metricas_ml.registrar('macronutrientes', 'carga_artefactos', activo.tiempo_carga)
+                    self._activo = activo
+                    logger.info(
+                        "Modelo de macronutrientes %s (%s) cargado en %.3f s (memoria: %s bytes, disco: %s bytes)",
+                        activo.version, activo.motor, activo.tiempo_carga, activo.memoria_bytes, activo.tamano_disco
+                    )
+        if vigilar:
+            self._vigilar()
+
+    def modelo(self, vigilar=True):
+        """ModeloMacros activo (lo carga si hace falta). Usar el mismo objeto para toda una petición."""
+        self.cargar(vigilar)
+        return self._activo
+
+    def recargar(self):
+        """
+        Si ACTIVO apunta a otra versión, la carga, la prueba y la activa.
+
+        Devuelve True si hubo cambio. Si la versión nueva no se puede cargar
+        (checksum, features, fichero corrupto...) se lanza la excepción y se
+        sigue sirviendo la versión actual.
+        """
+        actual = self._activo
+        en_disco = paquete.version_activa(self.directorio)
+        if actual is not None and en_disco == actual.version:
+            return False
+        if en_disco is not None and en_disco == self._version_fallida:
+            # No reintentar cada intervalo una versión que ya falló; se espera a la siguiente
+            return False
+        try:
+            nuevo = self._cargar_version()
+            # Predicción de prueba antes del cambio: la primera petición no paga la carga perezosa de páginas
+            nuevo.predict(getattr(nuevo.scaler, 'mean_', np.zeros(len(FEATURE_COLUMNS))), ruta='recarga_macros')
+        except Exception:
+            self._version_fallida = en_disco
+            raise
+        if actual is not None and nuevo.version == actual.version:
+            return False
+        metricas_ml.registrar('recarga_macros', 'carga_artefactos', nuevo.tiempo_carga)
+        with self._lock:
+            self._activo = nuevo
+            self.recargas += 1
+        # Las predicciones cacheadas son de la versión anterior
+        cache_macros.limpiar()
+        logger.info("Modelo de macronutrientes actualizado: %s -> %s (%.3f s)",
+                    actual.version if actual is not None else None, nuevo.version, nuevo.tiempo_carga)
+        return True
+
+    def _vigilar(self):
+        config = getattr(settings, 'MACROS_RECARGA', {})
+        if self._vigilante is not None or not config.get('ACTIVA', False):
+            return
+        with self._lock:
+            if self._vigilante is None:
+                self._vigilante = threading.Thread(
+                    target=self._bucle_vigilancia, args=(config.get('INTERVALO_S', 10),),
+                    name='recarga-macros', daemon=True
+                )
+                self._vigilante.start()
+
+    def _bucle_vigilancia(self, intervalo):
+        while True:
+            time.sleep(intervalo)
+            if self._vigilante is not threading.current_thread():
+                return
+            try:
+                if self.recargar():
+                    self.error_recarga = None
+            except Exception as e:
+                self.error_recarga = f"{type(e).__name__}: {e}"
+                metricas_ml.error('recarga_macros', e)
+                logger.exception("No se pudo recargar el modelo de macronutrientes")
+
+    def predict(self, features, ruta='macronutrientes'):
+        """Predice con la versión activa (ver ModeloMacros.predict)."""
+        return self.modelo().predict(features, ruta)
+
+    def stats(self):
+        """Versión activa, tiempo de carga y huella de memoria de los artefactos."""
+        activo = self._activo
+        return {
+            'cargado': activo is not None,
+            'version': activo.version if activo is not None else None,
+            'version_en_disco': paquete.version_activa(self.directorio),
+            'recargas': self.recargas,
+            'error_recarga': self.error_recarga,
+            'motor': activo.motor if activo is not None else None,
+            'rejilla': activo is not None and activo.rejilla is not None,
+            'error_rejilla': activo.rejilla.errores if activo is not None and activo.rejilla is not None else None,
+            'tiempo_carga_s': activo.tiempo_carga if activo is not None else None,
+            'memoria_bytes': activo.memoria_bytes if activo is not None else None,
+            'tamano_disco_bytes': activo.tamano_disco if activo is not None else None,
+        }
+
+
+# Instancia única por proceso (worker)
+registro_macros = RegistroMacros()
+
+
+def predict(features):
+    """Atajo a registro_macros.predict."""
+    return registro_macros.predict(features)
+
+
+@metricas_ml.medir('macronutrientes')
+def predecir_perfil(perfil, usuario_id=None):
+    """
+    Macronutrientes (dict) para un perfil, pasando por la caché de predicciones.
+
+    El modelo recibe las features exactas del perfil (las mismas que en
+    predecir_lote); peso y porcentaje de grasa redondeados según
+    settings.MACROS_CACHE sólo forman la clave de la caché.
+    """
+    modelo = registro_macros.modelo()
+    with metricas_ml.etapa('macronutrientes', 'mapeo_features'):
+        features = modelo.features([perfil])
+    # La versión en la clave evita servir una predicción del modelo anterior tras una recarga
+    clave = (modelo.version, cuantizar(features[0]))
+    macros = cache_macros.get(clave)
+    if macros is None:
+        macros = macros_desde_prediccion(modelo.predict(features)[0])
+        cache_macros.set(clave, macros, usuario_id)
+    return dict(macros)
+
+
+@metricas_ml.medir('macronutrientes_lote')
+def predecir_lote(perfiles):
+    """
+    Predice macronutrientes para N perfiles con una sola llamada al modelo.
+
+    perfiles: lista de UserProfile o dicts con los campos del perfil.
+    Devuelve {'resultados': [...], 'metricas': {...}} con un resultado por
+    perfil (mismo orden) y el throughput del lote.
+    """
+    perfiles = list(perfiles)
+    if not perfiles:
+        return {'resultados': [], 'metricas': {'n': 0, 'tiempo_s': 0.0, 'perfiles_por_segundo': 0.0,
+                                               'version': registro_macros.version}}
+
+    modelo = registro_macros.modelo()
+    inicio = time.perf_counter()
+    with metricas_ml.etapa('macronutrientes_lote', 'mapeo_features'):
+        X = modelo.features(perfiles)
+    y_pred = modelo.predict(X, ruta='macronutrientes_lote')
+    resultados = [macros_desde_prediccion(fila) for fila in y_pred]
+    tiempo = time.perf_counter() - inicio
+
+    return {
+        'resultados': resultados,
+        'metricas': {
+            'n': len(perfiles),
+            'tiempo_s': tiempo,
+            'perfiles_por_segundo': len(perfiles) / tiempo if tiempo > 0 else None,
+            'version': modelo.version,
+        }
+    }
+
+
+def predecir_lote_usuarios(user_ids):
+    """
+    Igual que predecir_lote pero a partir de ids de usuario.
+
+    Los resultados se devuelven como dict {user_id: macros}; los ids sin
+    perfil se listan en 'no_encontrados'.
+    """
+    from FE_App.models import UserProfile
+
+    ids = list(dict.fromkeys(user_ids))
+    perfiles = list(UserProfile.objects.filter(usuario_id__in=ids).only('usuario_id', *CAMPOS_PERFIL))
+    lote = predecir_lote(perfiles)
+    encontrados = {p.usuario_id for p in perfiles}
+
+    return {
+        'resultados': {p.usuario_id: r for p, r in zip(perfiles, lote['resultados'])},
+        'no_encontrados': [i for i in ids if i not in encontrados],
+        'metricas': lote['metricas'],
+    }
@@ -0,0 +1,108 @@
+"""
+Pipeline de preprocesado del modelo de macronutrientes.
+
+Un único Pipeline de sklearn, ajustado al entrenar y guardado en el paquete
+del modelo (preprocesado.pkl), hace todo el camino de los datos de entrada
+a la matriz que recibe el modelo:
+
+    perfil      MapeoPerfil: perfiles -> columnas del dataset (features.py)
+    columnas    CodificadorColumnas: categóricas a códigos ordinales (clases
+                de entrenamiento, moda si falta o es desconocida) y mediana
+                para las numéricas que falten
+    escalado    StandardScaler
+
+Entrenamiento (filas del CSV) y servidor (perfiles de UserProfile) pasan por
+los mismos pasos, de modo que las categorías se codifican con las clases
+vistas al entrenar. CodificadorColumnas hace lo mismo que ColumnTransformer
++ OrdinalEncoder + SimpleImputer, pero con un par de operaciones NumPy por
+columna: con los de sklearn transformar un solo perfil costaba ~5 ms de
+validaciones, más que la propia predicción. No importa Django.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from .features import CATEGORICAS, NUMERICAS, NIVEL_EXPERIENCIA_PERFIL, MapeoPerfil
+
+
+class CodificadorColumnas(BaseEstimator, TransformerMixin):
+    """
+    Columnas del dataset (DataFrame o dict columna -> array) -> matriz float
+    en el orden categoricas + numericas.
+
+    Las categóricas se codifican como OrdinalEncoder (clases ordenadas); un
+    valor ausente o no visto al entrenar toma el código de la clase más
+    frecuente. Los NaN de las numéricas se rellenan con la mediana de
+    entrenamiento.
+    """
+
+    def __init__(self, categoricas=CATEGORICAS, numericas=NUMERICAS):
+        self.categoricas = categoricas
+        self.numericas = numericas
+
+    def fit(self, X, y=None):
+        self.categories_ = []
+        self.moda_ = []
+        for col in self.categoricas:
+            valores = pd.Series(np.asarray(X[col], dtype=object)).dropna()
+            clases = np.array(sorted(valores.unique()), dtype=object)
+            conteos = valores.value_counts()
+            self.categories_.append(clases)
+            self.moda_.append(float(np.searchsorted(clases, conteos.idxmax())))
+        self.statistics_ = np.array([np.nanmedian(np.asarray(X[col], dtype=float)) for col in self.numericas])
+        self._codigos = [{c: float(i) for i, c in enumerate(clases)} for clases in self.categories_]
+        self.n_features_in_ = len(self.categoricas) + len(self.numericas)
+        return self
+
+    def transform(self, X):
+        n_cat = len(self.categoricas)
+        primera = X[self.categoricas[0]] if n_cat else X[self.numericas[0]]
+        resultado = np.empty((len(primera), n_cat + len(self.numericas)))
+        for j, (col, codigos, moda) in enumerate(zip(self.categoricas, self._codigos, self.moda_)):
+            valores = X[col]
+            if isinstance(valores, pd.Series) and len(valores) > 1000:
+                resultado[:, j] = valores.astype(object).map(codigos).fillna(moda).to_numpy(dtype=float)
+            else:
+                resultado[:, j] = [codigos.get(v, moda) for v in valores]
+        for j, col in enumerate(self.numericas, start=n_cat):
+            resultado[:, j] = np.asarray(X[col], dtype=float)
+        numericas = resultado[:, n_cat:]
+        faltan = np.isnan(numericas)
+        if faltan.any():
+            numericas[faltan] = np.take(self.statistics_, np.nonzero(faltan)[1])
+        return resultado
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(tuple(self.categoricas) + tuple(self.numericas), dtype=object)
+
+
+def crear_preprocesado():
+    """Pipeline sin ajustar (perfil -> columnas -> escalado)."""
+    return Pipeline([
+        ('perfil', MapeoPerfil()),
+        ('columnas', CodificadorColumnas()),
+        ('escalado', StandardScaler()),
+    ])
+
+
+def features(preprocesado, X):
+    """Matriz de features sin escalar (entrada de la caché y de la rejilla)."""
+    return preprocesado[:-1].transform(X)
+
+
+def valores_rejilla(preprocesado):
+    """
+    Categorías y valores fijos que puede producir el preprocesado para un
+    perfil, para construir la rejilla (ver rejilla.py): códigos de las
+    categóricas, niveles de experiencia del perfil y las medianas con que se
+    imputan frecuencia y duración.
+    """
+    columnas = preprocesado.named_steps['columnas']
+    medianas = dict(zip(columnas.numericas, columnas.statistics_))
+    categorias = {col: list(range(len(clases))) for col, clases in zip(columnas.categoricas, columnas.categories_)}
+    categorias['Nivel_experiencia'] = sorted(NIVEL_EXPERIENCIA_PERFIL.values())
+    fijos = {col: float(medianas[col])
+             for col in ('Frecuencia_entrenamiento_(días/semana)', 'Duración_sesión_(horas)')}
+    return categorias, fijos
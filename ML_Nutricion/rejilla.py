@@ -0,0 +1,172 @@
+"""
+Modo rejilla: tabla precalculada de macronutrientes con interpolación multilineal.
+
+Para cada combinación de categóricas (Género × Objetivo × Nivel_experiencia)
+se evalúa el modelo entrenado sobre una rejilla de las features continuas
+(Edad, Peso, Altura, Porcentaje_grasa) y se guarda como array float32. La
+Masa_magra se deriva de peso y grasa igual que en features.py, y Frecuencia
+y Duración quedan fijas en las medianas con que las imputa el preprocesado
+(las categorías y los valores fijos salen de preprocesado.valores_rejilla).
+
+En producción una predicción es una búsqueda en la tabla + interpolación de
+los 16 vértices que rodean al punto, sin recorrer ningún árbol. Las filas que
+no caen en la rejilla (categoría desconocida u otros valores fijos) deben
+resolverse con el modelo real (ver RejillaMacros.en_rejilla).
+No importa Django.
+"""
+import itertools
+
+import numpy as np
+
+from .artefactos import guardar_arrays, cargar_arrays
+
+# Ejes por defecto: más densos en los rangos habituales, cubriendo los límites
+# de los validadores de UserProfile (edad 13-100, peso 20-400, altura 80-300 cm)
+EJES_DEFECTO = {
+    'Edad': [13, 18, 25, 30, 35, 40, 45, 50, 60, 70, 85, 100],
+    'Peso_(kg)': [20, 40, 50, 60, 70, 80, 90, 100, 115, 130, 150, 200, 300, 400],
+    'Altura_(m)': [0.8, 1.4, 1.5, 1.6, 1.7, 1.8, 1.9, 2.0, 2.2, 3.0],
+    'Porcentaje_grasa': [1, 5, 10, 15, 20, 25, 30, 35, 40, 50, 70],
+}
+
+
+def _masa_magra(peso, grasa):
+    return peso * (1 - (grasa / 100))
+
+
+class RejillaMacros:
+    """Tabla (categorías..., ejes..., salidas) en float32 más sus ejes."""
+
+    def __init__(self, feature_columns, ejes, categorias, fijos, valores, errores=None):
+        self.feature_columns = list(feature_columns)
+        self.ejes = {nombre: np.asarray(eje, dtype=np.float64) for nombre, eje in ejes.items()}
+        self.categorias = {nombre: [float(v) for v in vals] for nombre, vals in categorias.items()}
+        self.fijos = dict(fijos)
+        self.valores = valores
+        self.errores = errores or {}
+        self._col = {nombre: i for i, nombre in enumerate(self.feature_columns)}
+
+        # Tabla aplanada a (celdas, salidas) y desplazamientos de los 2^k vértices
+        self._valores_plano = valores.reshape(-1, valores.shape[-1])
+        pasos = np.cumprod((valores.shape[1:-1] + (1,))[::-1])[::-1]
+        self._pasos_cat = pasos[:len(self.categorias)]
+        self._pasos_ejes = pasos[len(self.categorias):]
+        self._esquinas = np.array(list(itertools.product((0, 1), repeat=len(self.ejes))), dtype=bool)
+        self._desplazamientos = self._esquinas @ self._pasos_ejes
+
+    @property
+    def nbytes(self):
+        return self.valores.nbytes
+
+    # --- Construcción ---
+
+    @classmethod
+    def construir(cls, predict, feature_columns, categorias, fijos, ejes=None, tamano_lote=50000):
+        """
+        Evalúa predict(X) (features sin escalar -> (n, salidas)) en todos los
+        puntos de la rejilla.
+
+        categorias: columna -> valores posibles; fijos: columna -> valor
+        constante (ver preprocesado.valores_rejilla).
+        """
+        ejes = ejes or EJES_DEFECTO
+        col = {nombre: i for i, nombre in enumerate(feature_columns)}
+
+        nombres_cat = list(categorias)
+        nombres_ejes = list(ejes)
+        puntos = np.array(list(itertools.product(
+            *[categorias[n] for n in nombres_cat], *[ejes[n] for n in nombres_ejes]
+        )), dtype=np.float64)
+
+        X = np.zeros((len(puntos), len(feature_columns)))
+        for j, nombre in enumerate(nombres_cat + nombres_ejes):
+            X[:, col[nombre]] = puntos[:, j]
+        for nombre, valor in fijos.items():
+            X[:, col[nombre]] = valor
+        X[:, col['Masa_magra_(kg)']] = _masa_magra(X[:, col['Peso_(kg)']], X[:, col['Porcentaje_grasa']])
+
+        y = np.concatenate([predict(X[i:i + tamano_lote]) for i in range(0, len(X), tamano_lote)])
+        forma = [len(categorias[n]) for n in nombres_cat] + [len(ejes[n]) for n in nombres_ejes]
+        valores = y.astype(np.float32).reshape(*forma, y.shape[1])
+        return cls(feature_columns, ejes, categorias, fijos, valores)
+
+    def evaluar_error(self, predict, n_muestras=5000, semilla=42):
+        """
+        Error de interpolación frente a predict() en puntos aleatorios dentro
+        de la rejilla. Devuelve {'max', 'p99', 'mae'} por salida.
+        """
+        rng = np.random.default_rng(semilla)
+        X = np.zeros((n_muestras, len(self.feature_columns)))
+        for nombre, vals in self.categorias.items():
+            X[:, self._col[nombre]] = rng.choice(vals, size=n_muestras)
+        for nombre, eje in self.ejes.items():
+            X[:, self._col[nombre]] = rng.uniform(eje[0], eje[-1], size=n_muestras)
+        for nombre, valor in self.fijos.items():
+            X[:, self._col[nombre]] = valor
+        X[:, self._col['Masa_magra_(kg)']] = _masa_magra(
+            X[:, self._col['Peso_(kg)']], X[:, self._col['Porcentaje_grasa']]
+        )
+
+        error = np.abs(self.predict(X) - predict(X))
+        self.errores = {
+            'max': error.max(axis=0).tolist(),
+            'p99': np.percentile(error, 99, axis=0).tolist(),
+            'mae': error.mean(axis=0).tolist(),
+        }
+        return self.errores
+
+    # --- Consulta ---
+
+    def en_rejilla(self, X):
+        """Máscara de filas que la rejilla puede resolver."""
+        X = np.atleast_2d(X)
+        mascara = np.ones(X.shape[0], dtype=bool)
+        for nombre, vals in self.categorias.items():
+            mascara &= np.isin(X[:, self._col[nombre]], vals)
+        for nombre, valor in self.fijos.items():
+            mascara &= X[:, self._col[nombre]] == valor
+        return mascara
+
+    def predict(self, X):
+        """
+        Interpolación multilineal (features sin escalar). Los valores continuos
+        fuera de rango se recortan a los extremos de cada eje.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+
+        # Celda base: combinación de categóricas + vértice inferior en cada eje
+        base = np.zeros(X.shape[0], dtype=np.intp)
+        for (nombre, vals), paso in zip(self.categorias.items(), self._pasos_cat):
+            base += np.searchsorted(vals, X[:, self._col[nombre]]) * paso
+
+        pesos = np.empty((X.shape[0], len(self.ejes)))
+        for d, ((nombre, eje), paso) in enumerate(zip(self.ejes.items(), self._pasos_ejes)):
+            v = np.clip(X[:, self._col[nombre]], eje[0], eje[-1])
+            i = np.clip(np.searchsorted(eje, v, side='right') - 1, 0, len(eje) - 2)
+            base += i * paso
+            pesos[:, d] = (v - eje[i]) / (eje[i + 1] - eje[i])
+
+        # Peso de cada vértice = producto de t o (1 - t) en cada eje
+        w = np.where(self._esquinas, pesos[:, None, :], 1 - pesos[:, None, :]).prod(axis=2)
+        vertices = self._valores_plano[base[:, None] + self._desplazamientos]
+        return np.einsum('nv,nvo->no', w, vertices)
+
+    # --- Persistencia ---
+
+    def guardar(self, directorio):
+        arrays = {'valores': self.valores}
+        arrays.update({f'eje_{i}': eje for i, eje in enumerate(self.ejes.values())})
+        guardar_arrays(directorio, arrays, {
+            'feature_columns': self.feature_columns,
+            'ejes': list(self.ejes),
+            'categorias': self.categorias,
+            'fijos': self.fijos,
+            'errores': self.errores,
+        })
+
+    @classmethod
+    def cargar(cls, directorio, mmap=True):
+        arrays, meta = cargar_arrays(directorio, mmap=mmap)
+        ejes = {nombre: arrays[f'eje_{i}'] for i, nombre in enumerate(meta['ejes'])}
+        return cls(meta['feature_columns'], ejes, meta['categorias'], meta['fijos'],
+                   arrays['valores'], meta.get('errores'))
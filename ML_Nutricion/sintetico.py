@@ -0,0 +1,102 @@
+"""
+Generador de datasets sintéticos con el esquema de Fit-Evolution_Dataset.csv.
+
+El dataset real sólo tiene 500 filas; para medir cómo escalan los scripts
+de entrenamiento hacen falta datos del mismo formato a 10k-10M filas.
+
+Cada fila sintética parte de una fila real elegida al azar (así se
+conservan las distribuciones de las categóricas y sus combinaciones, p. ej.
+Objetivo x Nivel_experiencia o Entrenamiento x Grupo_muscular_objetivo). A
+las numéricas continuas se les suma ruido gaussiano proporcional a su
+desviación típica, se recortan al rango observado y se redondean con los
+decimales del original; las columnas derivadas (IMC, masa magra, calorías
+de macronutrientes...) se recalculan para que sigan siendo coherentes.
+
+Se escribe por bloques, de modo que la memoria no depende de n_filas. No
+importa Django.
+"""
+import numpy as np
+import pandas as pd
+
+from .dataset import DATASET_PATH
+
+TAMANO_BLOQUE = 200_000
+RUIDO = 0.05
+
+# Columnas que se recalculan a partir de otras tras añadir el ruido
+# (columnas de las que dependen, fórmula)
+DERIVADAS = {
+    'IMC': (('Peso_(kg)', 'Altura_(m)'), lambda df: df['Peso_(kg)'] / df['Altura_(m)'] ** 2),
+    'IMC_calculado': (('Peso_(kg)', 'Altura_(m)'), lambda df: df['Peso_(kg)'] / df['Altura_(m)'] ** 2),
+    'Masa_magra_(kg)': (('Peso_(kg)', 'Porcentaje_grasa'),
+                        lambda df: df['Peso_(kg)'] * (1 - df['Porcentaje_grasa'] / 100)),
+    'Calorías_de_macronutrientes': (('Proteínas', 'Carbohidratos', 'Grasas'),
+                                    lambda df: 4 * df['Proteínas'] + 4 * df['Carbohidratos'] + 9 * df['Grasas']),
+    'Proteína_por_kg': (('Proteínas', 'Peso_(kg)'), lambda df: df['Proteínas'] / df['Peso_(kg)']),
+}
+
+
+def _decimales(serie):
+    """Número de decimales con que está escrita una columna numérica (máx. 6)."""
+    partes = serie.dropna().astype(str).str.partition('.')[2]
+    return min(int(partes.str.len().max() or 0), 6)
+
+
+def _columnas_con_ruido(base):
+    """Numéricas continuas: float con más de unos pocos valores distintos."""
+    return [c for c in base.columns
+            if base[c].dtype.kind == 'f' and base[c].nunique() > 10 and c not in DERIVADAS]
+
+
+def generar_dataset(path, n_filas, columnas=None, base_path=DATASET_PATH,
+                    tamano_bloque=TAMANO_BLOQUE, ruido=RUIDO, semilla=0):
+    """
+    Escribe en `path` un CSV de n_filas con el esquema del dataset base.
+
+    columnas: subconjunto (y orden) de columnas a escribir; None = todas.
+    Devuelve el número de filas escritas.
+    """
+    base = pd.read_csv(base_path)
+    columnas = list(base.columns) if columnas is None else list(columnas)
+    faltan = [c for c in columnas if c not in base.columns]
+    if faltan:
+        raise ValueError(f"Columnas faltantes en el dataset base: {faltan}")
+
+    # Sólo se remuestrean las columnas pedidas y las que hacen falta para recalcular derivadas
+    derivadas = {c: DERIVADAS[c] for c in columnas if c in DERIVADAS}
+    necesarias = list(dict.fromkeys(columnas + [d for deps, _ in derivadas.values() for d in deps]))
+    base = base[necesarias]
+
+    con_ruido = _columnas_con_ruido(base)
+    desviacion = base[con_ruido].std().to_numpy() * ruido
+    minimo, maximo = base[con_ruido].min().to_numpy(), base[con_ruido].max().to_numpy()
+    decimales = {c: _decimales(base[c]) for c in con_ruido + list(derivadas)}
+
+    rng = np.random.default_rng(semilla)
+    escritas = 0
+    while escritas < n_filas:
+        n = min(tamano_bloque, n_filas - escritas)
+        bloque = base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+        valores = bloque[con_ruido].to_numpy() + rng.normal(0, desviacion, (n, len(con_ruido)))
+        bloque[con_ruido] = np.clip(valores, minimo, maximo)
+        for col, (_, formula) in derivadas.items():
+            bloque[col] = formula(bloque)
+        for col, n_decimales in decimales.items():
+            bloque[col] = bloque[col].round(n_decimales)
+        bloque[columnas].to_csv(path, mode='w' if escritas == 0 else 'a', header=escritas == 0, index=False)
+        escritas += n
+    return escritas
+
+
+def diferencia_distribuciones(base, sintetico, columnas):
+    """
+    Máxima diferencia absoluta de proporciones por categoría entre dos
+    DataFrames, para cada columna categórica de `columnas`.
+    """
+    diferencias = {}
+    for col in columnas:
+        p_base = base[col].value_counts(normalize=True)
+        p_sint = sintetico[col].value_counts(normalize=True)
+        p_base, p_sint = p_base.align(p_sint, fill_value=0)
+        diferencias[col] = float((p_base - p_sint).abs().max())
+    return diferencias
@@ -1,3 +1,526 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.multioutput import MultiOutputRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer
+
+from .bosque import BosqueCompilado
+from .cache import IDX_GRASA, IDX_MASA_MAGRA, IDX_PESO, cuantizar
+from .compactacion import cuotas, representantes, seleccionar_filas
+from .dataset import cargar_dataset, leer_csv, texto
+from .features import CATEGORICAS, FEATURE_COLUMNS, NUMERICAS
+from .indices import IndiceIVF, ampliar_indice, crear_indice, filas_indice
+from .ingesta import _Reservoir, ingerir_por_bloques
+from .lru import CachePredicciones
+from .metricas import Histograma, MetricasML
+from .paquete import guardar_paquete, ruta_activa, verificar
+from .plan import COLUMNAS_USADAS, FEATURES, RecomendadorPlan
+from .predictor import ModeloMacros, ModeloNoDisponible, RegistroMacros
+from .preprocesado import crear_preprocesado
+from .rejilla import RejillaMacros
+from .sintetico import generar_dataset
+
+
+class DirectorioTemporalMixin:
+    """Directorio temporal por clase de tests, borrado al terminar."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directorio = tempfile.mkdtemp(prefix='tests_ml_')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directorio, ignore_errors=True)
+        super().tearDownClass()
+
+
+class EntrenadoMixin(DirectorioTemporalMixin):
+    """Recomendador del plan entrenado con un CSV sintético pequeño."""
+
+    filas = 3000
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.csv = os.path.join(cls.directorio, 'plan.csv')
+        generar_dataset(cls.csv, cls.filas, columnas=COLUMNAS_USADAS, semilla=0)
+        cls.recomendador = RecomendadorPlan(os.path.join(cls.directorio, 'plan'))
+        cls.recomendador.entrenar(cls.csv, usar_cache=False)
+
+
+def _preparar_edades(df):
+    return {'edad': df['Edad'].to_numpy(), 'genero': texto(df['Género'])}
+
+
+def _preparar_edades_redondeadas(df):
+    return {'edad': df['Edad'].round().to_numpy(), 'genero': texto(df['Género'])}
+
+
+# --- Motor de inferencia de macronutrientes ---
+
+class BosqueCompiladoTests(DirectorioTemporalMixin, SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(0)
+        cls.X = rng.normal(size=(400, 6))
+        cls.y = np.column_stack([cls.X[:, 0] * 3 + rng.normal(size=400), cls.X[:, 1] ** 2, cls.X[:, 2] - cls.X[:, 3]])
+
+    def _comprobar(self, model):
+        model.fit(self.X, self.y)
+        compilado = BosqueCompilado.desde_sklearn(model)
+        np.testing.assert_allclose(compilado.predict(self.X), model.predict(self.X), rtol=1e-12, atol=1e-9)
+        return compilado
+
+    def test_bosque_nativo_igual_que_sklearn(self):
+        self._comprobar(RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0))
+
+    def test_multioutput_igual_que_sklearn(self):
+        self._comprobar(MultiOutputRegressor(RandomForestRegressor(n_estimators=5, random_state=0)))
+
+    def test_guardar_y_cargar(self):
+        model = RandomForestRegressor(n_estimators=5, random_state=0)
+        compilado = self._comprobar(model)
+        directorio = os.path.join(self.directorio, 'compilado')
+        compilado.guardar(directorio)
+        np.testing.assert_allclose(BosqueCompilado.cargar(directorio).predict(self.X[:1]), model.predict(self.X[:1]))
+
+
+class CachePrediccionesTests(SimpleTestCase):
+
+    def _features(self, peso, grasa):
+        fila = np.ones(len(FEATURE_COLUMNS))
+        fila[IDX_PESO] = peso
+        fila[IDX_GRASA] = grasa
+        fila[IDX_MASA_MAGRA] = peso * (1 - grasa / 100)
+        return fila
+
+    def test_perfiles_casi_iguales_comparten_clave(self):
+        clave = cuantizar(self._features(80.1, 19.9), redondeo_peso=0.5, redondeo_grasa=0.5)
+        self.assertEqual(clave, cuantizar(self._features(79.9, 20.2), redondeo_peso=0.5, redondeo_grasa=0.5))
+        self.assertNotEqual(clave, cuantizar(self._features(80.4, 20), redondeo_peso=0.5, redondeo_grasa=0.5))
+        # La masa magra de la clave sale del peso y la grasa ya redondeados
+        self.assertEqual((clave[IDX_PESO], clave[IDX_GRASA]), (80.0, 20.0))
+        self.assertAlmostEqual(clave[IDX_MASA_MAGRA], 64.0)
+
+    def test_sin_redondeo(self):
+        features = self._features(80.1, 19.9)
+        self.assertEqual(cuantizar(features, redondeo_peso=0, redondeo_grasa=0), tuple(features))
+
+    def test_invalidar_usuario(self):
+        cache = CachePredicciones(max_entradas=10)
+        cache.set('a', 1, usuario_id=1)
+        cache.set('a', 1, usuario_id=2)
+        cache.invalidar_usuario(1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache._por_usuario, {})
+        self.assertEqual(cache.invalidaciones, 1)
+
+    def test_expulsion_poda_usuarios(self):
+        cache = CachePredicciones(max_entradas=2)
+        for usuario_id in range(5):
+            cache.set(usuario_id, usuario_id, usuario_id=usuario_id)
+        self.assertEqual(set(cache._por_usuario), {3, 4})
+        self.assertEqual(set(cache._usuarios), {3, 4})
+
+        # Un usuario cuya predicción cambia de clave deja de apuntar a la anterior
+        cache.set('nueva', 0, usuario_id=4)
+        cache.invalidar_usuario(4)
+        self.assertIsNone(cache.get('nueva'))
+        self.assertIsNone(cache.get(3))  # expulsada al entrar 'nueva'
+        self.assertEqual(cache._por_usuario, {})
+
+
+class MetricasTests(SimpleTestCase):
+
+    def test_buckets_del_histograma(self):
+        histograma = Histograma()
+        for ms in (0.01, 0.05, 0.07, 1, 3, 3, 20000):
+            histograma.observar(ms)
+        buckets = histograma.stats()['buckets']
+        # Cada bucket incluye su límite superior
+        self.assertEqual((buckets['0.05'], buckets['0.1'], buckets['1'], buckets['5'], buckets['+inf']), (2, 1, 1, 2, 1))
+        self.assertEqual(sum(buckets.values()), 7)
+        self.assertEqual(histograma.percentil(50), 1)
+        self.assertEqual(histograma.percentil(80), 5)
+        self.assertEqual(histograma.percentil(100), 20000)  # el bucket +inf se acota con el máximo
+        self.assertIsNone(Histograma().percentil(50))
+
+    def test_medir_cuenta_cada_error_una_vez(self):
+        metricas = MetricasML()
+
+        @metricas.medir('ruta')
+        def falla():
+            with metricas.etapa('ruta', 'interna'):
+                raise ValueError
+
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                falla()
+        stats = metricas.stats()['ruta']
+        self.assertEqual(stats['errores'], {'ValueError': 2})
+        self.assertEqual((stats['etapas']['total']['n'], stats['etapas']['interna']['n']), (2, 2))
+
+
+class PaqueteTests(DirectorioTemporalMixin, SimpleTestCase):
+
+    def test_verificar_detecta_checksum_incorrecto(self):
+        base = os.path.join(self.directorio, 'macros')
+        guardar_paquete(base, {'modelo': 'prueba'}, crear_preprocesado(), ['a', 'b'], ['c'])
+        version = ruta_activa(base)
+        verificar(version)
+
+        with open(os.path.join(version, 'preprocesado.pkl'), 'ab') as f:
+            f.write(b'\0')
+        with self.assertRaises(ValueError):
+            verificar(version)
+
+
+class RegistroMacrosTests(DirectorioTemporalMixin, SimpleTestCase):
+    targets = ['Proteínas', 'Carbohidratos', 'Grasas']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        df = leer_csv(list(FEATURE_COLUMNS) + cls.targets).dropna(subset=cls.targets)
+        cls.preprocesado = crear_preprocesado()
+        cls.X = cls.preprocesado.fit_transform(df[list(FEATURE_COLUMNS)])
+        cls.features = cls.preprocesado[:-1].transform(df[list(FEATURE_COLUMNS)])
+        cls.y = df[cls.targets].to_numpy()
+
+    def setUp(self):
+        self.base = tempfile.mkdtemp(dir=self.directorio)
+
+    def _publicar(self, semilla):
+        model = RandomForestRegressor(n_estimators=3, max_depth=4, random_state=semilla).fit(self.X, self.y)
+        version = guardar_paquete(self.base, model, self.preprocesado, FEATURE_COLUMNS, self.targets)
+        return version, model
+
+    def test_sin_paquete(self):
+        with self.assertRaises(ModeloNoDisponible):
+            RegistroMacros(self.base).modelo(vigilar=False)
+
+    def test_recargar_activa_la_version_nueva(self):
+        v1, _ = self._publicar(0)
+        registro = RegistroMacros(self.base)
+        anterior = registro.modelo(vigilar=False)
+        self.assertEqual(anterior.version, v1)
+        self.assertFalse(registro.recargar())
+
+        v2, model = self._publicar(1)
+        self.assertNotEqual(v2, v1)
+        self.assertTrue(registro.recargar())
+        self.assertEqual((registro.version, registro.recargas), (v2, 1))
+        np.testing.assert_allclose(registro.predict(self.features[:5]), model.predict(self.X[:5]))
+        # Quien ya tenía el modelo anterior termina su petición con él
+        self.assertEqual(anterior.version, v1)
+
+    def test_version_corrupta_no_se_activa_ni_se_reintenta(self):
+        v1, _ = self._publicar(0)
+        registro = RegistroMacros(self.base)
+        registro.modelo(vigilar=False)
+
+        self._publicar(1)
+        with open(os.path.join(ruta_activa(self.base), 'preprocesado.pkl'), 'ab') as f:
+            f.write(b'\0')
+        with self.assertRaises(ValueError):
+            registro.recargar()
+        self.assertEqual(registro.version, v1)
+        with mock.patch.object(registro, '_cargar_version') as cargar_version:
+            self.assertFalse(registro.recargar())
+            cargar_version.assert_not_called()
+
+        v3, _ = self._publicar(2)
+        self.assertTrue(registro.recargar())
+        self.assertEqual(registro.version, v3)
+
+
+class RejillaMacrosTests(DirectorioTemporalMixin, SimpleTestCase):
+    categorias = {'Género': [0, 1], 'Nivel_experiencia': [1.0, 2.0, 3.0]}
+    fijos = {'Frecuencia_entrenamiento_(días/semana)': 4.0, 'Duración_sesión_(horas)': 1.0}
+    ejes = {
+        'Edad': [18, 40, 100],
+        'Peso_(kg)': [40, 80, 200],
+        'Altura_(m)': [1.4, 1.8, 2.2],
+        'Porcentaje_grasa': [5, 20, 50],
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Lineal en cada feature (y la masa magra, bilineal en peso y grasa): la interpolación es exacta
+        cls.W = np.random.default_rng(0).uniform(-2, 2, size=(len(FEATURE_COLUMNS), 3))
+        cls.rejilla = RejillaMacros.construir(cls.lineal, FEATURE_COLUMNS, cls.categorias, cls.fijos, cls.ejes)
+
+    @classmethod
+    def lineal(cls, X):
+        return X @ cls.W
+
+    def _filas(self, n, semilla=1):
+        rng = np.random.default_rng(semilla)
+        X = np.zeros((n, len(FEATURE_COLUMNS)))
+        col = {nombre: i for i, nombre in enumerate(FEATURE_COLUMNS)}
+        for nombre, vals in self.categorias.items():
+            X[:, col[nombre]] = rng.choice(vals, size=n)
+        for nombre, eje in self.ejes.items():
+            X[:, col[nombre]] = rng.uniform(eje[0], eje[-1], size=n)
+        for nombre, valor in self.fijos.items():
+            X[:, col[nombre]] = valor
+        X[:, col['Masa_magra_(kg)']] = X[:, col['Peso_(kg)']] * (1 - X[:, col['Porcentaje_grasa']] / 100)
+        return X
+
+    def test_interpolacion_exacta_para_funcion_multilineal(self):
+        X = self._filas(200)
+        self.assertTrue(self.rejilla.en_rejilla(X).all())
+        np.testing.assert_allclose(self.rejilla.predict(X), self.lineal(X), rtol=1e-5, atol=1e-3)
+
+    def test_guardar_y_cargar(self):
+        directorio = os.path.join(self.directorio, 'rejilla')
+        self.rejilla.guardar(directorio)
+        X = self._filas(20)
+        np.testing.assert_array_equal(RejillaMacros.cargar(directorio).predict(X), self.rejilla.predict(X))
+
+    def test_fuera_de_rejilla_usa_el_modelo(self):
+        X = self._filas(6)
+        X[1, FEATURE_COLUMNS.index('Género')] = 5                          # categoría desconocida
+        X[4, FEATURE_COLUMNS.index('Duración_sesión_(horas)')] = 2.0       # no es el valor imputado
+        np.testing.assert_array_equal(self.rejilla.en_rejilla(X), [True, False, True, True, False, True])
+
+        # El modelo "real" predice otra cosa para distinguir qué filas resolvió cada uno
+        identidad = Pipeline([('mapeo', FunctionTransformer()), ('scaler', FunctionTransformer())])
+        modelo = ModeloMacros('v', mock.Mock(predict=lambda X: self.lineal(X) + 1000), identidad,
+                              self.rejilla, 'sklearn', 0, None, 0)
+        y = modelo.predict(X)
+        fuera = ~self.rejilla.en_rejilla(X)
+        np.testing.assert_allclose(y[fuera], self.lineal(X[fuera]) + 1000)
+        np.testing.assert_allclose(y[~fuera], self.lineal(X[~fuera]), rtol=1e-5, atol=1e-3)
+
+
+# --- Entrenamiento ---
+
+class DatasetCacheTests(DirectorioTemporalMixin, SimpleTestCase):
+    columnas = ['Edad', 'Género']
+
+    def setUp(self):
+        self.csv = os.path.join(self.directorio, 'dataset.csv')
+        self.cache_dir = os.path.join(self.directorio, f'cache_{self._testMethodName}')
+        generar_dataset(self.csv, 200, columnas=self.columnas, semilla=0)
+
+    def _cargar(self, preparar=_preparar_edades, **kwargs):
+        return cargar_dataset('prueba', self.columnas, preparar, path=self.csv, cache_dir=self.cache_dir, **kwargs)
+
+    def test_segunda_carga_desde_cache(self):
+        arrays, desde_cache = self._cargar()
+        self.assertFalse(desde_cache)
+        cacheados, desde_cache = self._cargar()
+        self.assertTrue(desde_cache)
+        self.assertEqual(set(cacheados), {'edad', 'genero'})
+        for nombre in arrays:
+            np.testing.assert_array_equal(cacheados[nombre], arrays[nombre])
+
+    def test_cambio_de_csv_o_de_preparacion_invalida(self):
+        self._cargar()
+        generar_dataset(self.csv, 200, columnas=self.columnas, semilla=1)
+        self.assertFalse(self._cargar()[1])
+        self.assertFalse(self._cargar(_preparar_edades_redondeadas)[1])
+        self.assertTrue(self._cargar(_preparar_edades_redondeadas)[1])
+        # Sólo queda la caché de la última versión
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_sin_cache(self):
+        self.assertFalse(self._cargar(usar_cache=False)[1])
+        self.assertFalse(self._cargar(usar_cache=False)[1])
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+
+class IngestaTests(DirectorioTemporalMixin, SimpleTestCase):
+    features = list(CATEGORICAS) + list(NUMERICAS)
+    obligatorias = ['Género', 'Objetivo', 'Edad', 'Peso_(kg)', 'Altura_(m)']
+    targets = ['Proteínas', 'Carbohidratos', 'Grasas']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.csv = os.path.join(cls.directorio, 'macros.csv')
+        generar_dataset(cls.csv, 2500, columnas=cls.features + cls.targets, semilla=0)
+
+    def _ingerir(self, tamano_bloque, tamano_muestra=10_000):
+        directorio = os.path.join(self.directorio, f'ingesta_{tamano_bloque}_{tamano_muestra}')
+        return ingerir_por_bloques(self.csv, self.features, self.obligatorias, self.targets, directorio,
+                                   crear_preprocesado(), tamano_bloque=tamano_bloque,
+                                   tamano_muestra=tamano_muestra)
+
+    def test_cuenta_filas(self):
+        arrays, _, resumen = self._ingerir(700)
+        df = leer_csv(self.features + self.targets, self.csv)
+        self.assertEqual(resumen['n_original'], len(df))
+        self.assertEqual(resumen['n_sin_nan'], len(df.dropna(subset=self.obligatorias)))
+        self.assertEqual(resumen['n_train'] + resumen['n_test'] + resumen['n_outliers'], resumen['n_sin_nan'])
+        self.assertEqual(arrays['X_train'].shape, (resumen['n_train'], len(resumen['feature_columns'])))
+        self.assertEqual(arrays['y_test'].shape, (resumen['n_test'], len(self.targets)))
+        self.assertFalse(os.path.exists(os.path.join(self.directorio, 'ingesta_700_10000', 'crudo.f32')))
+
+    def test_mismo_resultado_con_cualquier_tamano_de_bloque(self):
+        # Con la muestra abarcando todo el CSV el resultado no depende de cómo se parta
+        arrays, preprocesado, resumen = self._ingerir(10_000)
+        for tamano_bloque in (333, 1000):
+            with self.subTest(tamano_bloque=tamano_bloque):
+                otros, otro_preprocesado, otro_resumen = self._ingerir(tamano_bloque)
+                self.assertEqual(otro_resumen, resumen)
+                for nombre in arrays:
+                    np.testing.assert_allclose(otros[nombre], arrays[nombre], rtol=1e-5, atol=1e-5)
+                np.testing.assert_allclose(otro_preprocesado[-1].mean_, preprocesado[-1].mean_, rtol=1e-6)
+
+    def test_reservoir(self):
+        filas = np.arange(300, dtype=np.float32).reshape(-1, 2)
+        muestra = _Reservoir(40, 2, np.random.default_rng(0))
+        for inicio in range(0, len(filas), 35):
+            muestra.agregar(filas[inicio:inicio + 35])
+        self.assertEqual(muestra.filas.shape, (40, 2))
+        # Filas completas del bloque original, sin repetir
+        self.assertTrue((muestra.filas[:, 1] == muestra.filas[:, 0] + 1).all())
+        self.assertEqual(len(np.unique(muestra.filas[:, 0])), 40)
+
+        pequena = _Reservoir(400, 2, np.random.default_rng(0))
+        pequena.agregar(filas)
+        np.testing.assert_array_equal(pequena.filas, filas)
+
+
+# --- Recomendador del plan ---
+
+class PlanesSemillaTests(EntrenadoMixin, SimpleTestCase):
+
+    def test_lote_igual_que_uno_a_uno(self):
+        usuarios = leer_csv(FEATURES, self.csv).dropna().head(8).to_dict('records')
+        ids = list(range(100, 100 + len(usuarios)))
+        lote = self.recomendador.generar_planes_semanales(usuarios, ids, periodo='2026-W42')
+        for usuario, usuario_id, plan in zip(usuarios, ids, lote):
+            with self.subTest(usuario_id=usuario_id):
+                self.assertEqual(plan, self.recomendador.generar_plan_semanal(usuario, usuario_id, '2026-W42'))
+
+    def test_misma_semilla_mismo_plan(self):
+        usuario = leer_csv(FEATURES, self.csv).dropna().iloc[0].to_dict()
+        plan = self.recomendador.generar_plan_semanal(usuario, 7, '2026-W42')
+        self.recomendador.cache.limpiar()
+        self.assertEqual(plan, self.recomendador.generar_plan_semanal(usuario, 7, '2026-W42'))
+
+
+class IndiceIVFTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Catálogo agrupado, como el de ejercicios escalado
+        rng = np.random.default_rng(0)
+        centros = rng.normal(scale=5, size=(30, 8))
+        cls.X = (centros[rng.integers(0, 30, 6000)] + rng.normal(size=(6000, 8))).astype(np.float32)
+        cls.consultas = cls.X[rng.choice(len(cls.X), 300, replace=False)] + rng.normal(scale=0.3, size=(300, 8))
+        cls.exacto = crear_indice('brute', 10).fit(cls.X)
+
+    def _recall(self, indice):
+        aproximados = indice.kneighbors(self.consultas, return_distance=False)
+        exactos = self.exacto.kneighbors(self.consultas, return_distance=False)
+        return np.mean([len(np.intersect1d(a, e)) / len(e) for a, e in zip(aproximados, exactos)])
+
+    def test_recall_frente_a_busqueda_exacta(self):
+        indice = crear_indice('ivf', 10, n_sondeos=8, semilla=0).fit(self.X)
+        self.assertIsInstance(indice, IndiceIVF)
+        self.assertGreaterEqual(self._recall(indice), 0.9)
+
+    def test_sondeando_todas_las_listas_es_exacto(self):
+        indice = IndiceIVF(n_neighbors=10, n_listas=20).fit(self.X)
+        indice.n_sondeos = indice.n_listas_
+        distancias, indices = indice.kneighbors(self.consultas)
+        distancias_exactas, indices_exactos = self.exacto.kneighbors(self.consultas)
+        np.testing.assert_allclose(distancias, distancias_exactas, rtol=1e-4, atol=1e-4)
+        self.assertGreaterEqual(np.mean(indices == indices_exactos), 0.99)  # salvo empates de distancia
+
+    def test_filas_en_el_orden_original(self):
+        indice = IndiceIVF(n_listas=16).fit(self.X)
+        np.testing.assert_array_equal(filas_indice(indice), self.X)
+
+
+class AgregarCompactarTests(EntrenadoMixin, SimpleTestCase):
+
+    def test_agregar_persiste(self):
+        nuevas = os.path.join(self.directorio, 'nuevas.csv')
+        generar_dataset(nuevas, 500, columnas=COLUMNAS_USADAS, semilla=1)
+        filas_antes = self.recomendador.modelo().n_filas
+
+        resumen = self.recomendador.agregar(nuevas)
+        recargado = RecomendadorPlan(self.recomendador.directorio).modelo()
+        self.assertEqual(recargado.n_filas, filas_antes + resumen['filas_nuevas'])
+        self.assertEqual(len(recargado.registro), recargado.n_filas)
+
+    def test_ampliar_indice(self):
+        rng = np.random.default_rng(0)
+        X, nuevas = rng.normal(size=(2000, 5)), rng.normal(size=(50, 5))
+        for indice in (crear_indice('brute', 3).fit(X), IndiceIVF(n_neighbors=3).fit(X)):
+            with self.subTest(indice=type(indice).__name__):
+                ampliado = ampliar_indice(indice, nuevas)
+                self.assertEqual(ampliado.n_samples_fit_, len(X) + len(nuevas))
+                self.assertEqual(indice.n_samples_fit_, len(X))
+                np.testing.assert_allclose(filas_indice(ampliado), np.concatenate([X, nuevas]), rtol=1e-6)
+                # Cada fila nueva es su propio vecino más cercano, con su índice en el catálogo ampliado
+                distancias, indices = ampliado.kneighbors(nuevas, n_neighbors=1)
+                np.testing.assert_array_equal(indices[:, 0], np.arange(len(X), len(X) + len(nuevas)))
+                np.testing.assert_allclose(distancias, 0, atol=1e-2)  # float32: |q|² + |x|² - 2q·x
+
+
+class CompactacionTests(EntrenadoMixin, SimpleTestCase):
+
+    def test_compactar_persiste(self):
+        # Sobre una copia: el resto de tests de la clase usan el modelo sin compactar
+        directorio = shutil.copytree(self.recomendador.directorio, os.path.join(self.directorio, 'compactado'))
+        recomendador = RecomendadorPlan(directorio)
+        n_ejercicios = len(np.unique(recomendador.modelo().registro))
+        recomendador.compactar(n_ejercicios + 100)
+        compactado = RecomendadorPlan(directorio).modelo()
+        self.assertEqual(compactado.n_filas, n_ejercicios + 100)
+        self.assertEqual(len(np.unique(compactado.registro)), n_ejercicios)
+
+    def test_representantes_sin_cuota(self):
+        X = np.random.default_rng(0).normal(size=(50, 3))
+        self.assertEqual(len(representantes(X, 0)), 0)
+
+    def test_presupuesto_entre_ejercicios_y_ejercicios_mas_estratos(self):
+        # Tras reservar una fila por ejercicio quedan menos filas que estratos: alguno se queda sin cuota
+        modelo = self.recomendador.modelo()
+        n_ejercicios = len(np.unique(modelo.registro))
+        n_estratos = len(np.unique(modelo.estratos()))
+        self.assertGreater(n_estratos, 2)
+        for max_filas in (n_ejercicios + 1, n_ejercicios + n_estratos - 1):
+            compactado = modelo.compactado(max_filas)
+            self.assertEqual(compactado.n_filas, max_filas)
+            self.assertEqual(len(np.unique(compactado.registro)), n_ejercicios)
+
+    def test_cuotas_no_superan_el_presupuesto(self):
+        np.testing.assert_array_equal(cuotas([1000, 1, 1, 1], 4), [1, 1, 1, 1])
+        for tamanos, max_filas in (([1000] + [1] * 20, 25), ([5, 5, 5], 2), ([3, 3], 100), ([10, 20, 30], 7)):
+            with self.subTest(tamanos=tamanos, max_filas=max_filas):
+                cuota = cuotas(tamanos, max_filas)
+                self.assertEqual(cuota.sum(), min(max_filas, sum(tamanos)))
+                self.assertTrue((cuota <= tamanos).all())
+
+    def test_estrato_grande_y_muchos_unitarios(self):
+        rng = np.random.default_rng(2)
+        X = rng.normal(size=(1100, 3))
+        estratos = np.r_[np.zeros(1000), np.arange(1, 101)]
+        for max_filas in (5, 10, 101, 150):
+            with self.subTest(max_filas=max_filas):
+                self.assertLessEqual(len(seleccionar_filas(X, estratos, max_filas)), max_filas)
+
+    def test_seleccion_sin_repetidos(self):
+        rng = np.random.default_rng(1)
+        X = rng.normal(size=(2000, 4))
+        seleccion = seleccionar_filas(X, rng.integers(0, 9, len(X)), 203, ejercicios=rng.integers(0, 200, len(X)))
+        self.assertEqual(len(seleccion), 203)
+        self.assertEqual(len(np.unique(seleccion)), 203)
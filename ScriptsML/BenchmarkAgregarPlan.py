@@ -0,0 +1,77 @@
+"""
+Benchmark de RecomendadorPlan.agregar (ML_Nutricion/plan.py): añadir filas
+nuevas al recomendador frente a reentrenarlo con el CSV completo.
+
+Genera un CSV sintético de --filas filas (ML_Nutricion/sintetico.py) y otro
+de --nuevas filas, entrena con el primero en un directorio temporal y, para
+cada índice, mide:
+
+* entrenar con el CSV base
+* agregar las filas nuevas (sin reconstruir si la deriva no lo pide)
+* reentrenar con base + nuevas, que es lo que había que hacer antes
+
+y comprueba que cada fila nueva se encuentra a sí misma como vecino.
+
+Uso: python ScriptsML/BenchmarkAgregarPlan.py [--filas 1000000] [--nuevas 10000] [--indices kd_tree ivf]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from ML_Nutricion.dataset import leer_csv
+from ML_Nutricion.indices import INDICES, filas_indice
+from ML_Nutricion.plan import COLUMNAS_USADAS, RecomendadorPlan
+from ML_Nutricion.sintetico import generar_dataset
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Añadir filas al recomendador del plan vs reentrenar")
+    parser.add_argument('--filas', type=int, default=1_000_000, help="Filas del CSV sintético base")
+    parser.add_argument('--nuevas', type=int, default=10_000, help="Filas nuevas a añadir")
+    parser.add_argument('--indices', nargs='+', choices=INDICES, default=['kd_tree', 'ivf'])
+    args = parser.parse_args(argv)
+
+    directorio = tempfile.mkdtemp(prefix='agregar_plan_')
+    try:
+        base = os.path.join(directorio, 'base.csv')
+        nuevas = os.path.join(directorio, 'nuevas.csv')
+        completo = os.path.join(directorio, 'completo.csv')
+        print(f"🧪 Generando {args.filas} filas base + {args.nuevas} nuevas...")
+        generar_dataset(base, args.filas, columnas=COLUMNAS_USADAS, semilla=0)
+        generar_dataset(nuevas, args.nuevas, columnas=COLUMNAS_USADAS, semilla=1)
+        pd.concat([leer_csv(COLUMNAS_USADAS, base), leer_csv(COLUMNAS_USADAS, nuevas)]).to_csv(completo, index=False)
+
+        print(f"\n{'índice':<10}{'entrenar s':>12}{'agregar s':>11}{'reentrenar s':>14}{'deriva':>9}"
+              f"{'reconstruido':>14}{'auto-vecino':>13}")
+        for tipo in args.indices:
+            recomendador = RecomendadorPlan(os.path.join(directorio, tipo))
+            entrenar = recomendador.entrenar(base, usar_cache=False, indice=tipo)['tiempo_s']
+            resumen = recomendador.agregar(nuevas)
+
+            # Cada fila nueva (tal como quedó en el índice) debe salir entre sus propios vecinos
+            modelo = recomendador.modelo()
+            n = resumen['filas_nuevas']
+            consultas = filas_indice(modelo.model_knn)[-n:][:1000]
+            _, vecinos = modelo.model_knn.kneighbors(consultas)
+            auto = np.mean([modelo.n_filas - n + i in fila for i, fila in enumerate(vecinos)])
+
+            reentrenar = RecomendadorPlan(os.path.join(directorio, f'{tipo}_completo')).entrenar(
+                completo, usar_cache=False, indice=tipo)['tiempo_s']
+            deriva = f"{resumen['deriva']:.3f}" if resumen['deriva'] is not None else '-'
+            print(f"{tipo:<10}{entrenar:>12.2f}{resumen['tiempo_s']:>11.2f}{reentrenar:>14.2f}{deriva:>9}"
+                  f"{'sí' if resumen['reconstruido'] else 'no':>14}{auto:>13.3f}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: bosque compilado (ML_Nutricion/bosque.py) vs model.predict de sklearn.
+
+Comprueba que ambas predicciones son idénticas bit a bit y mide la latencia
+p50/p99 para lotes de 1, 32 y 1024 filas.
+
+Uso: python ScriptsML/BenchmarkBosque.py
+"""
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from ML_Nutricion.bosque import BosqueCompilado, _bosques_de
+from ML_Nutricion.paquete import ruta_activa
+
+# Artefactos de la versión activa del modelo de macronutrientes
+MODELOS_DIR = ruta_activa(os.path.join(PROJECT_DIR, 'ModelosML', 'MacroNutrientes'))
+TAMANOS_LOTE = [1, 32, 1024]
+
+
+def _latencias(fn, X, repeticiones):
+    fn(X)  # calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn(X)
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos = np.array(tiempos) * 1000
+    return np.percentile(tiempos, 50), np.percentile(tiempos, 99)
+
+
+def main():
+    print("📂 Cargando modelo...")
+    model = joblib.load(os.path.join(MODELOS_DIR, 'modelo_macros.pkl'))
+
+    inicio = time.perf_counter()
+    bosque = BosqueCompilado.desde_sklearn(model)
+    print(f"✅ Bosque compilado: {bosque.n_arboles} árboles, {bosque.n_nodos} nodos, "
+          f"{bosque.nbytes / 1e6:.1f} MB ({time.perf_counter() - inicio:.2f} s)")
+
+    # Datos en el espacio escalado (media 0, desviación 1), como los ve el modelo
+    rng = np.random.default_rng(42)
+    n_features = model.n_features_in_
+    X = rng.normal(size=(max(TAMANOS_LOTE), n_features))
+
+    # --- Exactitud (sklearn secuencial: mismo orden de suma) ---
+    # El modelo y cada bosque (el propio modelo si es nativo, o los envueltos por MultiOutputRegressor)
+    estimadores = {id(e): e for e in [model] + [b for b, _ in _bosques_de(model)]}.values()
+    n_jobs_original = [(e, e.n_jobs) for e in estimadores if hasattr(e, 'n_jobs')]
+    try:
+        for e, _ in n_jobs_original:
+            e.n_jobs = 1
+        identico = np.array_equal(model.predict(X), bosque.predict(X))
+    finally:
+        for e, n_jobs in n_jobs_original:
+            e.n_jobs = n_jobs
+    print(f"\n🔍 Predicciones idénticas bit a bit: {'sí' if identico else 'NO'}")
+
+    # --- Latencia ---
+    print("\n⏱️  Latencia (ms)            p50        p99")
+    for n in TAMANOS_LOTE:
+        repeticiones = 200 if n < 1024 else 30
+        lote = X[:n]
+        p50_sk, p99_sk = _latencias(model.predict, lote, repeticiones)
+        p50_bc, p99_bc = _latencias(bosque.predict, lote, repeticiones)
+        print(f"  lote={n:<5} sklearn     {p50_sk:9.3f}  {p99_sk:9.3f}")
+        print(f"  lote={n:<5} compilado   {p50_bc:9.3f}  {p99_bc:9.3f}")
+
+    if not identico:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Benchmark de escalado del entrenamiento y la inferencia con datasets sintéticos.
+
+Para cada tamaño genera un CSV sintético con el esquema del dataset real
+(ML_Nutricion/sintetico.py) y mide, cada etapa en un proceso nuevo:
+
+* generar:            escritura del CSV sintético.
+* macros_entrenar:    ScriptsML/MacroNutrientes.py completo sobre ese CSV
+                      (con --por-bloques a partir de --umbral-bloques filas).
+* macros_inferir:     carga del paquete y predicción de 1 fila y de un lote.
+* plan_entrenar:      lectura, codificación, StandardScaler y NearestNeighbors
+                      del plan de entrenamiento.
+* plan_inferir:       kneighbors de 1 usuario y de un lote.
+
+De cada etapa se guarda el tiempo de reloj, el pico de RSS del proceso
+(ru_maxrss de wait4) y el tamaño de los artefactos en un JSON con el commit
+actual, para comparar entre commits (--comparar otro.json).
+
+Uso: python ScriptsML/BenchmarkEntrenamiento.py [filas ...]   (por defecto 10k 100k 1M 10M)
+"""
+import argparse
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(PROJECT_DIR, 'ScriptsML')
+for ruta in (PROJECT_DIR, SCRIPTS_DIR):
+    if ruta not in sys.path:
+        sys.path.insert(0, ruta)
+
+TAMANOS = [10_000, 100_000, 1_000_000, 10_000_000]
+RESULTADOS_DIR = os.path.join(PROJECT_DIR, 'ModelosML', 'benchmarks')
+ARGS_MACROS = '--sin-graficos --sin-cache --busqueda halving'
+UMBRAL_BLOQUES = 1_000_000
+TAMANO_LOTE = 10_000
+REPETICIONES = 200
+PREFIJO_RESULTADO = 'RESULTADO '
+
+
+# --- Etapas (cada una se ejecuta en su propio proceso) ---
+
+def _latencia_ms(fn, X, repeticiones=REPETICIONES):
+    import numpy as np
+
+    fn(X)  # calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn(X)
+        tiempos.append(time.perf_counter() - inicio)
+    return float(np.percentile(tiempos, 50) * 1000)
+
+
+def _columnas_dataset():
+    from ML_Nutricion.dataset import ESQUEMA
+
+    # ESQUEMA tiene exactamente las columnas que usan los dos scripts de entrenamiento
+    return list(ESQUEMA)
+
+
+def etapa_generar(csv_path, filas, directorio, esquema_completo=False):
+    from ML_Nutricion.sintetico import generar_dataset
+
+    columnas = None if esquema_completo else _columnas_dataset()
+    generar_dataset(csv_path, filas, columnas=columnas)
+    return {'tamano_mb': os.path.getsize(csv_path) / 1e6}
+
+
+def etapa_macros_inferir(csv_path, filas, directorio, esquema_completo=False):
+    import joblib
+    import numpy as np
+    from ML_Nutricion.bosque import BosqueCompilado
+    from ML_Nutricion.paquete import ruta_activa
+
+    paquete_dir = ruta_activa(os.path.join(directorio, 'macros'))
+    compilado_dir = os.path.join(paquete_dir, 'modelo_macros_compilado')
+    if os.path.isdir(compilado_dir):
+        model, motor = BosqueCompilado.cargar(compilado_dir), 'compilado'
+    else:
+        model, motor = joblib.load(os.path.join(paquete_dir, 'modelo_macros.pkl')), 'sklearn'
+    scaler = joblib.load(os.path.join(paquete_dir, 'preprocesado.pkl'))[-1]
+
+    def predict(X):
+        return model.predict(scaler.transform(X))
+
+    rng = np.random.default_rng(0)
+    X_lote = scaler.mean_ + rng.standard_normal((TAMANO_LOTE, len(scaler.mean_))) * scaler.scale_
+    inicio = time.perf_counter()
+    predict(X_lote)
+    tiempo_lote = time.perf_counter() - inicio
+    return {
+        'motor': motor,
+        'latencia_1_ms': _latencia_ms(predict, X_lote[:1]),
+        'filas_por_segundo_lote': TAMANO_LOTE / tiempo_lote,
+    }
+
+
+def etapa_plan_entrenar(csv_path, filas, directorio, esquema_completo=False):
+    from ML_Nutricion.plan import RecomendadorPlan
+
+    resumen = RecomendadorPlan(os.path.join(directorio, 'plan')).entrenar(csv_path, usar_cache=False)
+    return {'filas_indice': resumen['filas'], 'tamano_artefactos_mb': resumen['tamano_disco_bytes'] / 1e6}
+
+
+def etapa_plan_inferir(csv_path, filas, directorio, esquema_completo=False):
+    import joblib
+    import numpy as np
+    from ML_Nutricion.artefactos import cargar_objeto
+    from ML_Nutricion.indices import tipo_indice
+
+    plan_dir = os.path.join(directorio, 'plan')
+    model_knn = cargar_objeto(os.path.join(plan_dir, 'fit_model_knn.pkl'))
+    scaler = joblib.load(os.path.join(plan_dir, 'fit_scaler.pkl'))
+    rng = np.random.default_rng(0)
+    X_lote = scaler.transform(scaler.mean_ + rng.standard_normal((1000, len(scaler.mean_))) * scaler.scale_)
+    inicio = time.perf_counter()
+    model_knn.kneighbors(X_lote)
+    tiempo_lote = time.perf_counter() - inicio
+    return {
+        'algoritmo': tipo_indice(model_knn),
+        'latencia_1_ms': _latencia_ms(model_knn.kneighbors, X_lote[:1], repeticiones=50),
+        'usuarios_por_segundo_lote': len(X_lote) / tiempo_lote,
+    }
+
+
+ETAPAS = {
+    'generar': etapa_generar,
+    'macros_inferir': etapa_macros_inferir,
+    'plan_entrenar': etapa_plan_entrenar,
+    'plan_inferir': etapa_plan_inferir,
+}
+
+
+# --- Medición ---
+
+def _ejecutar(cmd, limite_s=None):
+    """
+    Ejecuta cmd y devuelve (código, salida, segundos, pico de RSS en MB) del
+    proceso hijo. Pasados limite_s segundos el proceso se mata.
+    """
+    with tempfile.TemporaryFile('w+') as salida:
+        inicio = time.perf_counter()
+        proceso = subprocess.Popen(cmd, stdout=salida, stderr=subprocess.STDOUT, text=True, cwd=PROJECT_DIR)
+        temporizador = threading.Timer(limite_s, proceso.kill) if limite_s else None
+        if temporizador is not None:
+            temporizador.start()
+        # wait4 da el uso de recursos de ese hijo concreto (ru_maxrss en KB en Linux)
+        _, estado, uso = os.wait4(proceso.pid, 0)
+        tiempo = time.perf_counter() - inicio
+        if temporizador is not None:
+            temporizador.cancel()
+        proceso.returncode = os.waitstatus_to_exitcode(estado)
+        salida.seek(0)
+        return proceso.returncode, salida.read(), tiempo, uso.ru_maxrss / 1024
+
+
+def medir(etapa, filas, csv_path, directorio, args):
+    if etapa == 'macros_entrenar':
+        cmd = [sys.executable, os.path.join(SCRIPTS_DIR, 'MacroNutrientes.py'), '--dataset', csv_path,
+               '--directorio', os.path.join(directorio, 'macros'), *shlex.split(args.args_macros)]
+        if filas >= args.umbral_bloques:
+            cmd.append('--por-bloques')
+    else:
+        cmd = [sys.executable, os.path.abspath(__file__), '--etapa', etapa, '--csv', csv_path,
+               '--directorio', directorio, str(filas)]
+        if args.esquema_completo:
+            cmd.append('--esquema-completo')
+
+    codigo, salida, tiempo, pico_rss = _ejecutar(cmd, args.limite_s)
+    resultado = {'filas': filas, 'etapa': etapa, 'tiempo_s': tiempo, 'pico_rss_mb': pico_rss, 'ok': codigo == 0}
+    if codigo < 0:
+        # Matado por el límite de tiempo o por falta de memoria (OOM killer)
+        resultado['error'] = f"terminado por la señal {-codigo}"
+        return resultado
+    if codigo != 0:
+        resultado['error'] = salida.strip().splitlines()[-1] if salida.strip() else f"código {codigo}"
+        return resultado
+    if etapa == 'macros_entrenar':
+        from ML_Nutricion.artefactos import tamano
+        from ML_Nutricion.paquete import ruta_activa
+        resultado['tamano_artefactos_mb'] = tamano(ruta_activa(os.path.join(directorio, 'macros'))) / 1e6
+    else:
+        lineas = [l for l in salida.splitlines() if l.startswith(PREFIJO_RESULTADO)]
+        resultado.update(json.loads(lineas[-1][len(PREFIJO_RESULTADO):]))
+    return resultado
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PROJECT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _entorno():
+    import numpy
+    import sklearn
+
+    return {
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'sklearn': sklearn.__version__,
+        'cpus': os.cpu_count(),
+        'maquina': platform.machine(),
+    }
+
+
+def comparar(actual, anterior_path):
+    """Imprime el cociente actual/anterior de tiempo y pico de RSS por (filas, etapa)."""
+    with open(anterior_path, encoding='utf-8') as f:
+        anterior = json.load(f)
+    previos = {(r['filas'], r['etapa']): r for r in anterior['resultados'] if r.get('ok')}
+    print(f"\n📊 Comparación con {anterior.get('commit', '?')[:10]} (actual / anterior)")
+    for r in actual['resultados']:
+        previo = previos.get((r['filas'], r['etapa']))
+        if previo is None or not r.get('ok'):
+            continue
+        print(f"  {r['etapa']:16} {r['filas']:>10}  tiempo x{r['tiempo_s'] / previo['tiempo_s']:5.2f}  "
+              f"RSS x{r['pico_rss_mb'] / previo['pico_rss_mb']:5.2f}")
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('filas', type=int, nargs='*', default=TAMANOS)
+    parser.add_argument('--etapas', nargs='+', default=['generar', 'macros_entrenar', 'macros_inferir',
+                                                         'plan_entrenar', 'plan_inferir'],
+                        choices=['generar', 'macros_entrenar', *list(ETAPAS)[1:]])
+    parser.add_argument('--max-filas-macros', type=int, default=None,
+                        help="No entrenar el modelo de macronutrientes por encima de este tamaño.")
+    parser.add_argument('--umbral-bloques', type=int, default=UMBRAL_BLOQUES,
+                        help="A partir de este tamaño MacroNutrientes.py usa --por-bloques.")
+    parser.add_argument('--args-macros', default=ARGS_MACROS,
+                        help="Argumentos para MacroNutrientes.py.")
+    parser.add_argument('--limite-s', type=float, default=None,
+                        help="Tiempo máximo por etapa; las que lo superan se registran como fallidas.")
+    parser.add_argument('--esquema-completo', action='store_true',
+                        help="Generar las 51 columnas del dataset (por defecto sólo las que usan los modelos).")
+    parser.add_argument('--salida', default=None, help="Fichero JSON de resultados.")
+    parser.add_argument('--comparar', default=None, help="JSON de una ejecución anterior.")
+    # Uso interno: ejecutar una sola etapa en este proceso
+    parser.add_argument('--etapa', choices=list(ETAPAS), help=argparse.SUPPRESS)
+    parser.add_argument('--csv', help=argparse.SUPPRESS)
+    parser.add_argument('--directorio', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    if args.etapa:
+        resultado = ETAPAS[args.etapa](args.csv, args.filas[0], args.directorio, args.esquema_completo)
+        print(PREFIJO_RESULTADO + json.dumps(resultado))
+        return
+
+    commit = _commit()
+    informe = {
+        'commit': commit,
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'entorno': _entorno(),
+        'args_macros': args.args_macros,
+        'resultados': [],
+    }
+    salida = args.salida or os.path.join(RESULTADOS_DIR, f"entrenamiento_{(commit or 'sin_commit')[:10]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+
+    print("📊 Etapa                 filas  tiempo (s)  pico RSS (MB)  artefactos (MB)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for filas in args.filas:
+            csv_path = os.path.join(tmp, f'sintetico_{filas}.csv')
+            directorio = os.path.join(tmp, f'artefactos_{filas}')
+            os.makedirs(directorio)
+            etapas = ['generar'] + [e for e in args.etapas if e != 'generar']
+            for etapa in etapas:
+                if etapa.startswith('macros') and args.max_filas_macros and filas > args.max_filas_macros:
+                    continue
+                r = medir(etapa, filas, csv_path, directorio, args)
+                informe['resultados'].append(r)
+                tamano_mb = r.get('tamano_artefactos_mb', r.get('tamano_mb'))
+                print(f"  {etapa:16} {filas:>10}  {r['tiempo_s']:10.1f}  {r['pico_rss_mb']:13.0f}  "
+                      + (f"{tamano_mb:15.1f}" if tamano_mb is not None else ' ' * 15)
+                      + ('' if r['ok'] else f"  ❌ {r['error']}"))
+                # Guardar tras cada etapa: los tamaños grandes tardan horas
+                with open(salida, 'w', encoding='utf-8') as f:
+                    json.dump(informe, f, ensure_ascii=False, indent=2)
+            if os.path.exists(csv_path):
+                os.remove(csv_path)
+
+    print(f"\n💾 Resultados guardados en: {salida}")
+    if args.comparar:
+        comparar(informe, args.comparar)
+
+
+if __name__ == "__main__":
+    main()
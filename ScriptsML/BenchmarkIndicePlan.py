@@ -0,0 +1,124 @@
+"""
+Benchmark de los índices de vecinos del recomendador del plan
+(ML_Nutricion/indices.py): recall frente a la búsqueda exacta y latencia.
+
+Genera un catálogo sintético de --filas filas con el esquema del dataset
+(ML_Nutricion/sintetico.py) y otras --consultas filas como usuarios, las
+escala como el recomendador y, para cada índice, mide:
+
+* tiempo de ajuste
+* latencia p50/p99 de una consulta (como una petición de la web)
+* consultas por segundo en un lote (una sola llamada a kneighbors)
+* recall@k: fracción de los k vecinos exactos que devuelve el índice
+
+Para IVF se prueban varios n_sondeos sobre el mismo índice ajustado.
+
+Uso: python ScriptsML/BenchmarkIndicePlan.py [--filas 1000000] [--indices kd_tree ivf]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from ML_Nutricion.dataset import leer_csv
+from ML_Nutricion.indices import INDICES, crear_indice
+from ML_Nutricion.plan import FEATURES, LABEL_COLS, N_VECINOS
+from ML_Nutricion.sintetico import generar_dataset
+
+RESULTADOS_DIR = os.path.join(PROJECT_DIR, 'ModelosML', 'benchmarks')
+SONDEOS = [1, 2, 4, 8, 16, 32]
+CONSULTAS_LATENCIA = 200
+
+
+def matriz_escalada(n_filas, semilla=0):
+    """Filas sintéticas codificadas y escaladas como en RecomendadorPlan.entrenar (float32)."""
+    with tempfile.NamedTemporaryFile(suffix='.csv') as csv:
+        generar_dataset(csv.name, n_filas, columnas=FEATURES, semilla=semilla)
+        df = leer_csv(FEATURES, csv.name).dropna()
+    for col in LABEL_COLS:
+        df[col] = df[col].astype('category').cat.codes
+    return df.to_numpy(dtype=np.float32)
+
+
+def recall(indices, exactos):
+    k = exactos.shape[1]
+    return float(np.mean([len(np.intersect1d(a, b)) / k for a, b in zip(indices, exactos)]))
+
+
+def medir(indice, Q, exactos):
+    # Latencia de una consulta
+    indice.kneighbors(Q[:1])
+    tiempos = []
+    for fila in Q[:CONSULTAS_LATENCIA]:
+        inicio = time.perf_counter()
+        indice.kneighbors(fila[None, :])
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos = np.array(tiempos) * 1000
+
+    inicio = time.perf_counter()
+    _, indices = indice.kneighbors(Q)
+    tiempo_lote = time.perf_counter() - inicio
+    return {
+        'recall': recall(indices, exactos),
+        'latencia_p50_ms': float(np.percentile(tiempos, 50)),
+        'latencia_p99_ms': float(np.percentile(tiempos, 99)),
+        'consultas_por_segundo_lote': len(Q) / tiempo_lote,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall vs latencia de los índices del plan")
+    parser.add_argument('--filas', type=int, default=1_000_000, help="Filas del catálogo sintético")
+    parser.add_argument('--consultas', type=int, default=1000, help="Usuarios de consulta")
+    parser.add_argument('--indices', nargs='+', choices=INDICES, default=['brute', 'kd_tree', 'ball_tree', 'ivf'])
+    parser.add_argument('--salida', default=None, help="Fichero JSON de resultados")
+    args = parser.parse_args(argv)
+
+    print(f"🧪 Generando catálogo sintético de {args.filas} filas + {args.consultas} consultas...")
+    inicio = time.perf_counter()
+    X = matriz_escalada(args.filas + args.consultas)
+    scaler = StandardScaler().fit(X[:args.filas])
+    X_scaled = scaler.transform(X).astype(np.float32)
+    catalogo, Q = X_scaled[:args.filas], X_scaled[args.filas:]
+    print(f"✅ {len(catalogo)} filas x {catalogo.shape[1]} features ({time.perf_counter() - inicio:.1f} s)")
+
+    print("🔍 Vecinos exactos (brute)...")
+    exactos = crear_indice('brute', N_VECINOS).fit(catalogo).kneighbors(Q, return_distance=False)
+
+    resultados = []
+    print(f"\n{'índice':<16}{'ajuste s':>10}{'recall':>9}{'p50 ms':>9}{'p99 ms':>9}{'consultas/s':>13}")
+    for tipo in args.indices:
+        inicio = time.perf_counter()
+        indice = crear_indice(tipo, N_VECINOS).fit(catalogo)
+        ajuste = time.perf_counter() - inicio
+        variantes = [(tipo, {})]
+        if tipo == 'ivf':
+            variantes = [(f'ivf/{s}', {'n_sondeos': s}) for s in SONDEOS]
+        for nombre, params in variantes:
+            for clave, valor in params.items():
+                setattr(indice, clave, valor)
+            r = {'indice': nombre, 'ajuste_s': ajuste, **medir(indice, Q, exactos)}
+            resultados.append(r)
+            print(f"{nombre:<16}{ajuste:>10.2f}{r['recall']:>9.3f}{r['latencia_p50_ms']:>9.3f}"
+                  f"{r['latencia_p99_ms']:>9.3f}{r['consultas_por_segundo_lote']:>13.0f}")
+        del indice
+
+    salida = args.salida or os.path.join(RESULTADOS_DIR, f"indice_plan_{args.filas}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump({'filas': args.filas, 'consultas': args.consultas, 'k': N_VECINOS, 'resultados': resultados},
+                  f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados guardados en: {salida}")
+
+
+if __name__ == "__main__":
+    main()
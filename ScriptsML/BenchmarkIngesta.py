@@ -0,0 +1,140 @@
+"""
+Benchmark de memoria de la ingesta por bloques (ML_Nutricion/ingesta.py).
+
+Genera CSVs de N filas remuestreando Fit-Evolution_Dataset.csv (sólo las
+columnas del modelo de macronutrientes, con algo de ruido en las numéricas)
+y mide, en un proceso aparte para cada N:
+
+* bloques: ingerir_por_bloques() hasta las matrices float32 en disco.
+* memoria: leer_csv() completo + preparar_datos() de MacroNutrientes.py
+  (el camino actual), sólo hasta --max-filas-memoria filas.
+
+Se informa del pico de memoria anónima (heap de Python/NumPy/pandas,
+muestreado cada 20 ms) y del pico de RSS (VmHWM, que además cuenta las
+páginas de los ficheros mapeados, recuperables por el sistema).
+
+Uso: python ScriptsML/BenchmarkIngesta.py [filas ...]   (por defecto 1000000 10000000)
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for ruta in (PROJECT_DIR, os.path.join(PROJECT_DIR, 'ScriptsML')):
+    if ruta not in sys.path:
+        sys.path.insert(0, ruta)
+
+from ML_Nutricion.dataset import ESQUEMA, NUMERICO, leer_csv
+from ML_Nutricion.ingesta import ingerir_por_bloques
+from ML_Nutricion.preprocesado import crear_preprocesado
+from MacroNutrientes import FEATURES_OBLIGATORIAS, TARGET_COLS, TODAS_FEATURES, preparar_datos
+
+COLUMNAS = TODAS_FEATURES + TARGET_COLS
+
+
+def _estado_mb(campo):
+    with open('/proc/self/status') as f:
+        for linea in f:
+            if linea.startswith(campo + ':'):
+                return int(linea.split()[1]) / 1024
+    return 0.0
+
+
+class PicoMemoria:
+    """Muestrea RssAnon en un hilo y guarda el máximo."""
+
+    def __init__(self, intervalo=0.02):
+        self.intervalo = intervalo
+        self.pico = 0.0
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+
+    def _muestrear(self):
+        while not self._parar.is_set():
+            self.pico = max(self.pico, _estado_mb('RssAnon'))
+            time.sleep(self.intervalo)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._hilo.join()
+        self.pico = max(self.pico, _estado_mb('RssAnon'))
+
+
+def generar_csv(path, n_filas, tamano_bloque=500_000, semilla=0):
+    """CSV de n_filas remuestreando el dataset original por bloques."""
+    base = leer_csv(COLUMNAS)
+    numericas = [c for c in COLUMNAS if ESQUEMA[c] == NUMERICO]
+    desviacion = base[numericas].std().to_numpy() * 0.05
+    rng = np.random.default_rng(semilla)
+    escritas = 0
+    while escritas < n_filas:
+        n = min(tamano_bloque, n_filas - escritas)
+        bloque = base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+        bloque[numericas] = bloque[numericas].to_numpy() + rng.normal(0, desviacion, (n, len(numericas)))
+        bloque.to_csv(path, mode='w' if escritas == 0 else 'a', header=escritas == 0, index=False)
+        escritas += n
+
+
+def _medir(modo, csv_path, directorio, cola):
+    base_anon = _estado_mb('RssAnon')
+    inicio = time.perf_counter()
+    with PicoMemoria() as pico:
+        if modo == 'bloques':
+            arrays, _, resumen = ingerir_por_bloques(
+                csv_path, TODAS_FEATURES, FEATURES_OBLIGATORIAS, TARGET_COLS, directorio, crear_preprocesado()
+            )
+            filas = resumen['n_train'] + resumen['n_test']
+        else:
+            datos = preparar_datos(leer_csv(COLUMNAS, csv_path))
+            filas = len(datos['y'])
+    cola.put({
+        'tiempo_s': time.perf_counter() - inicio,
+        'pico_anon_mb': pico.pico - base_anon,
+        'vmhwm_mb': _estado_mb('VmHWM'),
+        'filas': filas,
+    })
+
+
+def medir(modo, csv_path, directorio):
+    ctx = mp.get_context('fork')
+    cola = ctx.Queue()
+    p = ctx.Process(target=_medir, args=(modo, csv_path, directorio, cola))
+    p.start()
+    resultado = cola.get()
+    p.join()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('filas', type=int, nargs='*', default=[1_000_000, 10_000_000])
+    parser.add_argument('--max-filas-memoria', type=int, default=1_000_000,
+                        help="Tamaño máximo para medir también el camino en memoria.")
+    args = parser.parse_args()
+
+    print("📊 Ingesta            filas   CSV (MB)  tiempo (s)  pico anón (MB)  VmHWM (MB)  filas finales")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.filas:
+            csv_path = os.path.join(tmp, f'dataset_{n}.csv')
+            generar_csv(csv_path, n)
+            tamano_mb = os.path.getsize(csv_path) / 1e6
+            modos = ['bloques'] + (['memoria'] if n <= args.max_filas_memoria else [])
+            for modo in modos:
+                r = medir(modo, csv_path, os.path.join(tmp, f'ingesta_{n}'))
+                print(f"  {modo:9} {n:>12}  {tamano_mb:9.0f}  {r['tiempo_s']:10.1f}  {r['pico_anon_mb']:14.0f}  "
+                      f"{r['vmhwm_mb']:10.0f}  {r['filas']:>13}")
+            os.remove(csv_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark de memoria por worker: artefactos por pickle vs mmap + precarga.
+
+Simula N workers de gunicorn con fork y mide en cada uno la memoria antes y
+después de tener los modelos listos (modelo de macronutrientes y KNN del
+plan de entrenamiento):
+
+* pickle:  cada worker hace joblib.load de los .pkl tras el fork (copia propia).
+* mmap:    el master carga el bosque compilado (.npy) y el KNN con
+           mmap_mode='r' antes del fork (preload_app); los workers comparten
+           las páginas.
+
+RSS cuenta las páginas compartidas completas en cada proceso; PSS las reparte
+entre los procesos que las comparten, así que la suma de PSS es el coste real.
+
+Uso: python ScriptsML/BenchmarkMemoria.py [n_workers ...]   (por defecto 4 16)
+"""
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+
+import joblib
+import numpy as np
+# Las librerías se importan en el master en ambos modos: sólo se mide el coste de los modelos
+import sklearn.ensemble  # noqa: F401
+import sklearn.multioutput  # noqa: F401
+import sklearn.neighbors  # noqa: F401
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from ML_Nutricion.artefactos import cargar_objeto
+from ML_Nutricion.bosque import BosqueCompilado
+from ML_Nutricion.paquete import cargar_feature_columns, ruta_activa
+
+# Artefactos de la versión activa del modelo de macronutrientes
+MACROS_DIR = ruta_activa(os.path.join(PROJECT_DIR, 'ModelosML', 'MacroNutrientes'))
+PLAN_DIR = os.path.join(PROJECT_DIR, 'ModelosML', 'PlanEntrenamiento')
+
+
+def _memoria():
+    """(RSS, PSS) del proceso actual en MB, leídos de /proc/self/smaps_rollup."""
+    valores = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for linea in f:
+            partes = linea.split()
+            if partes[0] in ('Rss:', 'Pss:'):
+                valores[partes[0][:-1]] = int(partes[1]) / 1024
+    return valores['Rss'], valores['Pss']
+
+
+def _cargar_pickle():
+    model = joblib.load(os.path.join(MACROS_DIR, 'modelo_macros.pkl'))
+    knn = joblib.load(os.path.join(PLAN_DIR, 'fit_model_knn.pkl'))
+    return model, knn
+
+
+def _cargar_mmap(bosque_dir):
+    model = BosqueCompilado.cargar(bosque_dir, mmap=True)
+    knn = cargar_objeto(os.path.join(PLAN_DIR, 'fit_model_knn.pkl'), mmap=True)
+    return model, knn
+
+
+def _worker(modelos, cargar, barrera, cola):
+    antes = _memoria()
+    model, knn = modelos if modelos is not None else cargar()
+    # Una predicción de cada modelo toca todas las páginas que usaría una petición
+    n_features = len(cargar_feature_columns(MACROS_DIR))
+    model.predict(np.zeros((64, n_features)))
+    knn.kneighbors(np.zeros((1, knn.n_features_in_)))
+    barrera.wait()  # todos los workers vivos y con los modelos cargados
+    cola.put((antes, _memoria()))
+    barrera.wait()
+
+
+def _exportar_bosque(bosque_dir):
+    model = joblib.load(os.path.join(MACROS_DIR, 'modelo_macros.pkl'))
+    BosqueCompilado.desde_sklearn(model).guardar(bosque_dir)
+
+
+def medir(n_workers, modo, bosque_dir):
+    ctx = mp.get_context('fork')
+    modelos = _cargar_mmap(bosque_dir) if modo == 'mmap' else None
+    barrera = ctx.Barrier(n_workers)
+    cola = ctx.Queue()
+    procesos = [
+        ctx.Process(target=_worker, args=(modelos, _cargar_pickle, barrera, cola))
+        for _ in range(n_workers)
+    ]
+    for p in procesos:
+        p.start()
+    resultados = [cola.get() for _ in procesos]
+    for p in procesos:
+        p.join()
+
+    antes = np.array([r[0] for r in resultados])
+    despues = np.array([r[1] for r in resultados])
+    return antes.mean(axis=0), despues.mean(axis=0), despues[:, 1].sum()
+
+
+def main():
+    n_workers_lista = [int(n) for n in sys.argv[1:]] or [4, 16]
+
+    # El bosque compilado se genera al entrenar; si no está, se exporta al vuelo
+    # en un proceso aparte para no dejar el modelo cargado en el master
+    bosque_dir = os.path.join(MACROS_DIR, 'modelo_macros_compilado')
+    tmp = None
+    if not os.path.isdir(bosque_dir):
+        tmp = tempfile.TemporaryDirectory()
+        bosque_dir = os.path.join(tmp.name, 'modelo_macros_compilado')
+        p = mp.get_context('fork').Process(target=_exportar_bosque, args=(bosque_dir,))
+        p.start()
+        p.join()
+
+    print("📊 Memoria por worker (MB, media)        RSS antes  RSS después  PSS después  PSS total")
+    for n in n_workers_lista:
+        for modo in ('pickle', 'mmap'):
+            antes, despues, pss_total = medir(n, modo, bosque_dir)
+            print(f"  workers={n:<3} {modo:7}                  {antes[0]:9.1f}  {despues[0]:11.1f}  "
+                  f"{despues[1]:11.1f}  {pss_total:9.1f}")
+
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
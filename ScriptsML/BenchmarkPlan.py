@@ -0,0 +1,198 @@
+"""
+Benchmark del recomendador del plan semanal (ML_Nutricion/plan.py).
+
+Compara, para perfiles sacados del dataset:
+
+* referencia: la implementación anterior de generar_plan_semanal (tres
+  joblib.load por llamada, LabelEncoder.transform, scaler.transform y
+  drop_duplicates/sample/to_dict de pandas sobre los vecinos).
+* modelo: ModeloPlan cargado una vez, con el catálogo precalculado en
+  arrays (una llamada a kneighbors más indexado).
+
+Comprueba que ambas proponen los mismos ejercicios candidatos (el orden
+es aleatorio en las dos) y mide la latencia p50/p99 por llamada.
+
+Después mide el throughput (planes por segundo) de generar_planes_semanales
+para lotes de --lotes usuarios frente a llamar a generar_plan_semanal uno a
+uno, y comprueba que ambos eligen de los mismos candidatos.
+
+Por último, el modo con semilla (usuario_id + periodo): comprueba que es
+determinista y que coincide entre lote y uno a uno, y simula --peticiones
+peticiones de --usuarios usuarios (recargas) para medir el acierto de la
+caché y la latencia con y sin ella.
+
+Uso: python ScriptsML/BenchmarkPlan.py [--usuarios 200] [--lotes 1000 100000] [--peticiones 5000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from ML_Nutricion.artefactos import cargar_objeto
+from ML_Nutricion.dataset import leer_csv
+from ML_Nutricion.plan import (
+    COLUMNAS_CATALOGO, COLUMNAS_DIVERSIDAD, ENCODERS, FEATURES, MODELO_KNN, SALIDA, SCALER,
+    RecomendadorPlan, recomendador_plan, dias_seleccionados,
+)
+
+
+def usuarios_de_prueba(n, semilla=0):
+    """n perfiles (dicts con FEATURES) elegidos al azar entre las filas completas del dataset."""
+    df = leer_csv(FEATURES).dropna()
+    df = df.sample(n=n, replace=len(df) < n, random_state=semilla)
+    return [{col: (v.item() if hasattr(v, 'item') else v) for col, v in fila.items()}
+            for fila in df.astype(object).to_dict('records')]
+
+
+def candidatos_referencia(usuario, directorio, catalogo):
+    """Implementación anterior (por llamada): carga de artefactos + pandas. Devuelve los registros."""
+    model_knn = cargar_objeto(os.path.join(directorio, MODELO_KNN))
+    scaler = joblib.load(os.path.join(directorio, SCALER))
+    encoders = joblib.load(os.path.join(directorio, ENCODERS))
+
+    usuario_input = usuario.copy()
+    for col, encoder in encoders.items():
+        if usuario_input[col] in encoder.classes_:
+            usuario_input[col] = encoder.transform([usuario_input[col]])[0]
+        else:
+            usuario_input[col] = 0
+    X_user = np.array([[usuario_input[col] for col in FEATURES]])
+
+    _, indices = model_knn.kneighbors(scaler.transform(X_user))
+    candidatos = catalogo.iloc[indices[0]].drop_duplicates(subset=COLUMNAS_DIVERSIDAD).sample(frac=1)
+    registros = candidatos.to_dict('records')
+    return [{salida: ej[col] for salida, col in SALIDA.items()} for ej in registros]
+
+
+def generar_referencia(usuario, directorio, catalogo):
+    candidatos = candidatos_referencia(usuario, directorio, catalogo)
+    resultado = dict.fromkeys(["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"], "Descanso")
+    for i, dia in enumerate(dias_seleccionados(usuario)):
+        resultado[dia] = candidatos[i % len(candidatos)]
+    return resultado
+
+
+def _latencias(fn, usuarios):
+    fn(usuarios[0])  # calentamiento
+    tiempos = []
+    for usuario in usuarios:
+        inicio = time.perf_counter()
+        fn(usuario)
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos = np.array(tiempos) * 1000
+    return np.percentile(tiempos, 50), np.percentile(tiempos, 99)
+
+
+def _clave(registro):
+    return tuple(sorted(registro.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del recomendador del plan semanal")
+    parser.add_argument('--usuarios', type=int, default=200, help="Perfiles de prueba")
+    parser.add_argument('--lotes', type=int, nargs='+', default=[1000, 100000], help="Tamaños de lote")
+    parser.add_argument('--peticiones', type=int, default=5000, help="Peticiones simuladas contra la caché")
+    args = parser.parse_args(argv)
+
+    print("📂 Cargando recomendador...")
+    modelo = recomendador_plan.modelo()
+    directorio = recomendador_plan.directorio
+    print(f"✅ {modelo.n_filas} filas, {len(modelo.registros)} ejercicios distintos ({modelo.tiempo_carga:.3f} s)")
+    # Catálogo como lo tenía la implementación anterior (DataFrame de texto por fila)
+    catalogo = pd.DataFrame({col: [modelo.registros[r][salida] for r in modelo.registro]
+                             for salida, col in SALIDA.items()})[COLUMNAS_CATALOGO]
+    usuarios = usuarios_de_prueba(args.usuarios)
+
+    # --- Mismos candidatos ---
+    distintos = 0
+    for usuario in usuarios:
+        referencia = {_clave(r) for r in candidatos_referencia(usuario, directorio, catalogo)}
+        ejercicios = modelo.candidatos(modelo.vecinos(modelo.features([usuario]))[0])
+        nuevos = {_clave(modelo.registros[e]) for e in ejercicios}
+        distintos += referencia != nuevos
+    print(f"\n🔍 Candidatos idénticos a la referencia: {len(usuarios) - distintos}/{len(usuarios)}")
+
+    # --- Latencia por llamada ---
+    print("\n⏱️  Latencia por plan (ms)    p50        p99")
+    p50, p99 = _latencias(lambda u: generar_referencia(u, directorio, catalogo), usuarios)
+    print(f"  referencia             {p50:9.3f}  {p99:9.3f}")
+    p50_nuevo, p99_nuevo = _latencias(modelo.generar_plan_semanal, usuarios)
+    print(f"  modelo                 {p50_nuevo:9.3f}  {p99_nuevo:9.3f}")
+    print(f"\n🚀 Mejora p50: x{p50 / p50_nuevo:.1f}")
+
+    # --- Lotes ---
+    usuarios_lote = usuarios_de_prueba(max(args.lotes), semilla=1)
+    for u, usuario in enumerate(usuarios_lote):
+        if u % 10 == 0:
+            usuario['Días_entrenamiento'] = ["Martes", "Jueves", "Sábado"]
+    muestra = usuarios_lote[:200]
+    candidatos, n_unicos = modelo.candidatos_lote(modelo.vecinos(modelo.features(muestra)))
+    planes = modelo.generar_planes_semanales(muestra)
+    for usuario, fila, n, plan in zip(muestra, candidatos, n_unicos, planes):
+        ejercicios = modelo.candidatos(modelo.vecinos(modelo.features([usuario]))[0])
+        referencia = modelo.generar_plan_semanal(usuario)
+        distintos += set(fila[:n]) != set(ejercicios)
+        distintos += [d for d, v in plan.items() if v == "Descanso"] != \
+            [d for d, v in referencia.items() if v == "Descanso"]
+    print(f"\n🔍 Lote = uno a uno (candidatos y días): {'sí' if not distintos else 'NO'}")
+
+    print("\n📦 Throughput            planes/s")
+    n_secuencial = min(args.lotes)
+    inicio = time.perf_counter()
+    for usuario in usuarios_lote[:n_secuencial]:
+        modelo.generar_plan_semanal(usuario)
+    print(f"  uno a uno ({n_secuencial:>6})   {n_secuencial / (time.perf_counter() - inicio):>10.0f}")
+    for n in args.lotes:
+        inicio = time.perf_counter()
+        modelo.generar_planes_semanales(usuarios_lote[:n])
+        print(f"  lote      ({n:>6})   {n / (time.perf_counter() - inicio):>10.0f}")
+        inicio = time.perf_counter()
+        df = pd.DataFrame(usuarios_lote[:n])
+        modelo.generar_planes_semanales(df)
+        print(f"  DataFrame ({n:>6})   {n / (time.perf_counter() - inicio):>10.0f}")
+
+    # --- Semilla y caché ---
+    recomendador = RecomendadorPlan(directorio)
+    ids = list(range(len(usuarios)))
+    primeros = [recomendador.generar_plan_semanal(u, i, '2026-W01') for i, u in zip(ids, usuarios)]
+    recomendador.cache.limpiar()
+    segundos = [recomendador.generar_plan_semanal(u, i, '2026-W01') for i, u in zip(ids, usuarios)]
+    lote = recomendador.generar_planes_semanales(usuarios, ids, '2026-W01')
+    otra_semana = [recomendador.generar_plan_semanal(u, i, '2026-W02') for i, u in zip(ids, usuarios)]
+    iguales = sum(a == b == c for a, b, c in zip(primeros, segundos, lote))
+    distintos += len(usuarios) - iguales
+    print(f"\n🎲 Con semilla: {iguales}/{len(usuarios)} planes iguales entre llamadas y con el lote; "
+          f"{sum(a != b for a, b in zip(primeros, otra_semana))} cambian de una semana a otra")
+
+    recomendador = RecomendadorPlan(directorio)
+    recomendador.cargar()
+    rng = np.random.default_rng(0)
+    peticiones = rng.integers(len(usuarios), size=args.peticiones)
+    tiempos = np.empty(len(peticiones))
+    for p, i in enumerate(peticiones):
+        inicio = time.perf_counter()
+        recomendador.generar_plan_semanal(usuarios[i], int(i))
+        tiempos[p] = time.perf_counter() - inicio
+    stats = recomendador.stats()['cache']
+    _, primera = np.unique(peticiones, return_index=True)
+    fallo = np.zeros(len(peticiones), dtype=bool)
+    fallo[primera] = True
+    print(f"\n🗃️  Caché: {args.peticiones} peticiones de {len(usuarios)} usuarios -> "
+          f"hit rate {stats['hit_rate']:.1%} ({stats['hits']} aciertos, {stats['misses']} fallos)")
+    print(f"  p50 fallo   {np.percentile(tiempos[fallo], 50) * 1000:9.3f} ms")
+    print(f"  p50 acierto {np.percentile(tiempos[~fallo], 50) * 1000:9.3f} ms")
+
+    if distintos:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
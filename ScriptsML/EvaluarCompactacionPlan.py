@@ -0,0 +1,142 @@
+"""
+Evaluación de la compactación del índice del recomendador del plan
+(ML_Nutricion/compactacion.py, RecomendadorPlan.compactar).
+
+Entrena el recomendador con un CSV sintético de --filas filas
+(ML_Nutricion/sintetico.py) y lo compacta a cada uno de --tamanos. Para
+--consultas usuarios (otro CSV sintético) compara los ejercicios
+candidatos del modelo completo con los del compactado:
+
+* jaccard: |A ∩ B| / |A ∪ B| de los ejercicios (sin repetir combinación de
+  COLUMNAS_DIVERSIDAD) que propone cada modelo para el mismo usuario
+* recall: fracción de los ejercicios del modelo completo que se mantienen
+* candidatos: media de ejercicios distintos por usuario (diversidad del plan)
+* cobertura: fracción de los ejercicios del catálogo que siguen en el índice
+* tamaño del índice en disco y latencia p50 de una consulta
+
+Como referencia, cada tamaño se compara también con una muestra aleatoria
+de filas del mismo tamaño.
+
+Uso: python ScriptsML/EvaluarCompactacionPlan.py [--filas 200000] [--tamanos 20000 5000 1000]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from ML_Nutricion.artefactos import guardar_objeto, tamano
+from ML_Nutricion.dataset import leer_csv
+from ML_Nutricion.indices import INDICES, filas_indice, reajustar_indice
+from ML_Nutricion.plan import COLUMNAS_USADAS, FEATURES, ModeloPlan, RecomendadorPlan
+from ML_Nutricion.sintetico import generar_dataset
+
+RESULTADOS_DIR = os.path.join(PROJECT_DIR, 'ModelosML', 'benchmarks')
+CONSULTAS_LATENCIA = 200
+
+
+def aleatorio(modelo, n_filas, semilla=0):
+    """ModeloPlan con n_filas filas del índice elegidas al azar (referencia)."""
+    seleccion = np.sort(np.random.default_rng(semilla).choice(modelo.n_filas, n_filas, replace=False))
+    model_knn = reajustar_indice(modelo.model_knn, filas_indice(modelo.model_knn)[seleccion])
+    catalogo = dict(modelo.catalogo, registro=np.asarray(modelo.registro)[seleccion])
+    return ModeloPlan(model_knn, modelo.scaler, modelo.encoders, catalogo)
+
+
+def conjuntos(modelo, X):
+    """Por usuario, el conjunto de claves de diversidad de sus ejercicios candidatos."""
+    return [set(fila) for fila in modelo.clave[modelo.vecinos(X)].tolist()]
+
+
+def comparar(completos, compactados):
+    jaccard, recall = [], []
+    for a, b in zip(completos, compactados):
+        jaccard.append(len(a & b) / len(a | b))
+        recall.append(len(a & b) / len(a))
+    return float(np.mean(jaccard)), float(np.mean(recall))
+
+
+def medir(nombre, modelo, X, completos, directorio, segundos=None):
+    ruta = os.path.join(directorio, f"{nombre.replace('/', '_')}.pkl")
+    guardar_objeto(modelo.model_knn, ruta)
+    modelo.model_knn.kneighbors(X[:1])
+    tiempos = []
+    for fila in X[:CONSULTAS_LATENCIA]:
+        inicio = time.perf_counter()
+        modelo.model_knn.kneighbors(fila[None, :])
+        tiempos.append(time.perf_counter() - inicio)
+    candidatos = conjuntos(modelo, X)
+    jaccard, recall = comparar(completos, candidatos)
+    return {
+        'modelo': nombre,
+        'filas': modelo.n_filas,
+        'jaccard': jaccard,
+        'recall': recall,
+        'candidatos_medios': float(np.mean([len(c) for c in candidatos])),
+        'cobertura': len(np.unique(modelo.registro)) / len(modelo.registros),
+        'tamano_indice_bytes': tamano(ruta),
+        'latencia_p50_ms': float(np.percentile(tiempos, 50) * 1000),
+        'compactacion_s': segundos,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Modelo del plan completo vs compactado")
+    parser.add_argument('--filas', type=int, default=200_000, help="Filas del CSV sintético de entrenamiento")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[20_000, 5_000, 1_000], help="Filas del índice compactado")
+    parser.add_argument('--consultas', type=int, default=1000, help="Usuarios de prueba")
+    parser.add_argument('--indice', choices=INDICES, default='auto')
+    parser.add_argument('--salida', default=None, help="Fichero JSON de resultados")
+    args = parser.parse_args(argv)
+
+    directorio = tempfile.mkdtemp(prefix='compactacion_plan_')
+    try:
+        entrenamiento = os.path.join(directorio, 'entrenamiento.csv')
+        consultas = os.path.join(directorio, 'consultas.csv')
+        print(f"🧪 Generando {args.filas} filas de entrenamiento + {args.consultas} usuarios...")
+        generar_dataset(entrenamiento, args.filas, columnas=COLUMNAS_USADAS, semilla=0)
+        generar_dataset(consultas, args.consultas, columnas=FEATURES, semilla=1)
+
+        recomendador = RecomendadorPlan(os.path.join(directorio, 'plan'))
+        recomendador.entrenar(entrenamiento, usar_cache=False, indice=args.indice)
+        completo = recomendador.modelo()
+        X = completo.features(leer_csv(FEATURES, consultas).dropna()).astype(np.float32)
+        completos = conjuntos(completo, X)
+
+        resultados = [medir('completo', completo, X, completos, directorio)]
+        for n in args.tamanos:
+            inicio = time.perf_counter()
+            compactado = completo.compactado(n)
+            segundos = time.perf_counter() - inicio
+            resultados.append(medir(f'estratos/{n}', compactado, X, completos, directorio, segundos))
+            resultados.append(medir(f'aleatorio/{n}', aleatorio(completo, min(n, completo.n_filas)), X, completos,
+                                    directorio))
+
+        print(f"\n{'modelo':<18}{'filas':>9}{'jaccard':>9}{'recall':>8}{'cand.':>7}{'cobert.':>9}"
+              f"{'MB':>8}{'p50 ms':>9}{'compactar s':>13}")
+        for r in resultados:
+            compactacion = f"{r['compactacion_s']:.2f}" if r['compactacion_s'] is not None else '-'
+            print(f"{r['modelo']:<18}{r['filas']:>9}{r['jaccard']:>9.3f}{r['recall']:>8.3f}"
+                  f"{r['candidatos_medios']:>7.1f}{r['cobertura']:>9.3f}{r['tamano_indice_bytes'] / 1e6:>8.2f}"
+                  f"{r['latencia_p50_ms']:>9.3f}{compactacion:>13}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    salida = args.salida or os.path.join(RESULTADOS_DIR, f"compactacion_plan_{args.filas}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump({'filas': args.filas, 'consultas': args.consultas, 'resultados': resultados},
+                  f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados guardados en: {salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,172 +1,420 @@
+import argparse
+import json
 import os
+import pickle
+import sys
+import time
 import pandas as pd
 import numpy as np
-import joblib
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
+from sklearn.inspection import permutation_importance
+from sklearn.linear_model import Ridge
 from sklearn.multioutput import MultiOutputRegressor
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.model_selection import train_test_split, cross_val_score, RandomizedSearchCV
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import PolynomialFeatures
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import train_test_split, cross_val_score, RandomizedSearchCV, HalvingRandomSearchCV
 from sklearn.metrics import mean_absolute_error, r2_score, mean_squared_error
 
-def main():
-    # --- Rutas ---
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    DATASET_PATH = os.path.join(BASE_DIR, 'Fit-Evolution_Dataset.csv')
-    MODELOS_DIR = os.path.join(BASE_DIR, 'ModelosML/MacroNutrientes')
-    os.makedirs(MODELOS_DIR, exist_ok=True)
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from ML_Nutricion.bosque import BosqueCompilado, _bosques_de
+from ML_Nutricion.dataset import DATASET_PATH, cargar_dataset, texto
+from ML_Nutricion.features import CATEGORICAS
+from ML_Nutricion.ingesta import TAMANO_BLOQUE, ingerir_por_bloques
+from ML_Nutricion.paquete import guardar_paquete, ruta_activa
+from ML_Nutricion.preprocesado import crear_preprocesado
+
+# --- Definir columnas ---
+# Variables obligatorias (deben estar en el dataset y en el formulario del usuario)
+FEATURES_OBLIGATORIAS = [
+    'Edad',
+    'Género',
+    'Peso_(kg)',
+    'Altura_(m)',
+    'Frecuencia_entrenamiento_(días/semana)',
+    'Duración_sesión_(horas)',
+    'Nivel_experiencia',
+    'Objetivo'
+]
+
+# Variables opcionales (pueden faltar en algunos usuarios)
+FEATURES_OPCIONALES = [
+    'Porcentaje_grasa',
+    'Masa_magra_(kg)'
+]
+
+TARGET_COLS = ['Proteínas', 'Carbohidratos', 'Grasas']
+
+TODAS_FEATURES = FEATURES_OBLIGATORIAS + FEATURES_OPCIONALES
+NUMERICAS = [col for col in TODAS_FEATURES if col not in CATEGORICAS]
+
+# --- Búsqueda de hiperparámetros ---
+N_ITER_ALEATORIA = 20
+CV_BUSQUEDA = 3
+FACTOR_HALVING = 3
+# Candidatos de successive halving cuando no se fija presupuesto de tiempo
+CANDIDATOS_HALVING_DEFECTO = 27
+
 
-    # --- Cargar datos ---
-    print("📂 Cargando dataset...")
-    df = pd.read_csv(DATASET_PATH)
-    print(f"✅ Dataset original: {df.shape[0]} filas")
-
-    # --- Definir columnas ---
-    # Variables obligatorias (deben estar en el dataset y en el formulario del usuario)
-    feature_cols_obligatorias = [
-        'Edad',
-        'Género',
-        'Peso_(kg)',
-        'Altura_(m)',
-        'Frecuencia_entrenamiento_(días/semana)',
-        'Duración_sesión_(horas)',
-        'Nivel_experiencia',
-        'Objetivo'
-    ]
-
-    # Variables opcionales (pueden faltar en algunos usuarios)
-    feature_cols_opcionales = [
-        'Porcentaje_grasa',
-        'Masa_magra_(kg)'
-    ]
-
-    target_cols = ['Proteínas', 'Carbohidratos', 'Grasas']
-
-    todas_features = feature_cols_obligatorias + feature_cols_opcionales
-
-    # Verificar columnas
-    missing_in_dataset = [col for col in todas_features if col not in df.columns]
-    if missing_in_dataset:
-        raise ValueError(f"Columnas faltantes en el dataset: {missing_in_dataset}")
-    missing_targets = [col for col in target_cols if col not in df.columns]
-    if missing_targets:
-        raise ValueError(f"Columnas objetivo faltantes: {missing_targets}")
-
-    X = df[todas_features].copy()
-    y = df[target_cols].copy()
+def preparar_datos(df):
+    """
+    Limpieza del dataset (lo que guarda la caché de dataset.py): NaN en
+    obligatorias y outliers (IQR). La codificación y la imputación de las
+    opcionales las hace el preprocesado (ML_Nutricion/preprocesado.py),
+    ajustado sólo con train.
+    """
+    X = df[TODAS_FEATURES].copy()
+    y = df[TARGET_COLS].copy()
 
     # --- Eliminar filas donde falten variables obligatorias ---
-    X = X.dropna(subset=feature_cols_obligatorias)
+    X = X.dropna(subset=FEATURES_OBLIGATORIAS)
     y = y.loc[X.index]
-    print(f"✅ Filas tras eliminar NaN en obligatorias: {X.shape[0]}")
-
-    # --- Imputar variables opcionales con mediana ---
-    for col in feature_cols_opcionales:
-        if X[col].isna().any():
-            mediana = X[col].median()
-            X[col].fillna(mediana, inplace=True)
-            print(f"  ⚠️  Imputando '{col}' con mediana: {mediana:.2f}")
-
-    # --- Codificar categóricas ---
-    print("🔄 Codificando variables categóricas...")
-    le_genero = LabelEncoder()
-    le_objetivo = LabelEncoder()
-    le_nivel = LabelEncoder()
-
-    X['Género'] = le_genero.fit_transform(X['Género'])
-    X['Objetivo'] = le_objetivo.fit_transform(X['Objetivo'])
-    X['Nivel_experiencia'] = le_nivel.fit_transform(X['Nivel_experiencia'])
-
-    # --- Detección de outliers (IQR) ---
+
+    # --- Detección de outliers (IQR, sobre las numéricas) ---
     print("🔍 Detectando outliers...")
-    Q1 = X.quantile(0.25)
-    Q3 = X.quantile(0.75)
+    numericas = X[NUMERICAS].astype(np.float32)
+    Q1 = numericas.quantile(0.25)
+    Q3 = numericas.quantile(0.75)
     IQR = Q3 - Q1
-    outlier_mask = ~((X < (Q1 - 3 * IQR)) | (X > (Q3 + 3 * IQR))).any(axis=1)
-    X_clean = X[outlier_mask]
-    y_clean = y[outlier_mask]
-    outliers_removed = len(X) - len(X_clean)
-    print(f"  ⚠️  Outliers removidos: {outliers_removed} ({outliers_removed/len(X)*100:.1f}%)")
-
-    # --- Dividir datos ---
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_clean, y_clean, test_size=0.2, random_state=42, stratify=X_clean['Objetivo']
+    outlier_mask = ~((numericas < (Q1 - 3 * IQR)) | (numericas > (Q3 + 3 * IQR))).any(axis=1)
+
+    datos = {
+        'numericas': numericas[outlier_mask].to_numpy(dtype=np.float32),
+        'y': y[outlier_mask].to_numpy(dtype=np.float32),
+        'n_original': len(df),
+        'n_sin_nan': len(X),
+    }
+    for i, col in enumerate(CATEGORICAS):
+        datos[f'categorica_{i}'] = texto(X.loc[outlier_mask, col])
+    return datos
+
+
+def _dataframe(datos):
+    """Reconstruye el DataFrame de features desde los arrays de preparar_datos()."""
+    X = pd.DataFrame(datos['numericas'], columns=NUMERICAS)
+    for i, col in enumerate(CATEGORICAS):
+        X[col] = datos[f'categorica_{i}']
+    return X
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Entrena el modelo de macronutrientes.")
+    parser.add_argument(
+        '--presupuesto-ms', type=float, default=None,
+        help="Latencia máxima de predict() para 1 fila (ms, p50). Activa la selección entre familias de modelos."
+    )
+    parser.add_argument(
+        '--presupuesto-mb', type=float, default=None,
+        help="Tamaño máximo del modelo serializado (MB). Activa la selección entre familias de modelos."
+    )
+    parser.add_argument(
+        '--multisalida', choices=['multioutput', 'nativo'], default='multioutput',
+        help="multioutput: un RandomForest por target (MultiOutputRegressor); "
+             "nativo: un único RandomForest multi-salida que comparte los árboles."
+    )
+    parser.add_argument(
+        '--comparar-multisalida', action='store_true',
+        help="Entrena también la otra variante con los mismos hiperparámetros y compara "
+             "tiempo de entrenamiento, tamaño, latencia y precisión."
     )
+    parser.add_argument(
+        '--busqueda', choices=['aleatoria', 'halving'], default='aleatoria',
+        help="aleatoria: RandomizedSearchCV + validación cruzada 5-fold del ganador; "
+             "halving: successive halving, reutilizando las puntuaciones CV de la búsqueda."
+    )
+    parser.add_argument(
+        '--recurso-halving', choices=['n_estimators', 'n_samples'], default='n_estimators',
+        help="Recurso que crece en cada ronda de successive halving."
+    )
+    parser.add_argument(
+        '--presupuesto-busqueda-s', type=float, default=None,
+        help="Tiempo máximo aproximado de la búsqueda halving (s): fija el número de candidatos."
+    )
+    parser.add_argument(
+        '--sin-graficos', action='store_true',
+        help="No genera los PNG (ni importa matplotlib). Útil en CI/cron."
+    )
+    parser.add_argument(
+        '--datos-graficos', action='store_true',
+        help="Exporta los datos de los gráficos como CSV/JSON (predicciones vs reales, histograma de errores)."
+    )
+    parser.add_argument(
+        '--dataset', default=DATASET_PATH,
+        help="CSV de entrenamiento (por defecto Fit-Evolution_Dataset.csv)."
+    )
+    parser.add_argument(
+        '--por-bloques', action='store_true',
+        help="Ingesta por bloques para datasets más grandes que la RAM: entrena sobre matrices "
+             "float32 mapeadas en disco (ModelosML/MacroNutrientes/ingesta/)."
+    )
+    parser.add_argument(
+        '--tamano-bloque', type=int, default=TAMANO_BLOQUE,
+        help="Filas por bloque en la ingesta por bloques."
+    )
+    parser.add_argument(
+        '--sin-cache', action='store_true',
+        help="Ignora la caché del dataset preparado y vuelve a leer el CSV."
+    )
+    parser.add_argument(
+        '--directorio', default=None,
+        help="Directorio de salida del modelo y sus métricas (por defecto ModelosML/MacroNutrientes; "
+             "otro directorio evita publicar una versión nueva al hacer benchmarks)."
+    )
+    return parser.parse_args(argv)
 
-    # --- Escalar ---
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
 
-    # --- Búsqueda de hiperparámetros ---
-    print("🔍 Buscando mejores hiperparámetros...")
-    param_distributions = {
-        'estimator__n_estimators': [100, 150, 200],
-        'estimator__max_depth': [10, 15, 20, None],
-        'estimator__min_samples_split': [2, 4, 6],
-        'estimator__min_samples_leaf': [1, 2, 3],
-        'estimator__max_features': ['sqrt', 'log2']
-    }
-    
-    rf_base = RandomForestRegressor(random_state=42, n_jobs=-1)
-    model_base = MultiOutputRegressor(rf_base)
-    
-    random_search = RandomizedSearchCV(
+def _bosque(modo, **params):
+    """RandomForest nativo multi-salida o envuelto en MultiOutputRegressor."""
+    rf = RandomForestRegressor(random_state=42, n_jobs=-1, **params)
+    return rf if modo == 'nativo' else MultiOutputRegressor(rf)
+
+
+def comparar_multisalida(modo, params, X_train, y_train, X_test, y_test):
+    """
+    Compara el bosque entrenado con la otra variante (mismos hiperparámetros).
+    Devuelve un DataFrame con una fila por variante.
+    """
+    otro_modo = 'nativo' if modo == 'multioutput' else 'multioutput'
+    variantes = {modo: _bosque(modo, **params), otro_modo: _bosque(otro_modo, **params)}
+    filas = []
+    for nombre, variante in variantes.items():
+        inicio = time.perf_counter()
+        variante.fit(X_train, y_train)
+        tiempo_fit = time.perf_counter() - inicio
+        mae = mean_absolute_error(y_test, variante.predict(X_test), multioutput='raw_values')
+        latencia_1, latencia_lote = _latencia_ms(variante, X_test)
+        n_arboles = sum(len(b.estimators_) for b, _ in _bosques_de(variante))
+        filas.append({
+            'Variante': nombre,
+            'Arboles': n_arboles,
+            'MAE_medio': mae.mean(),
+            'Tiempo_fit_s': tiempo_fit,
+            'Tamano_MB': _tamano_mb(variante),
+            'Latencia_1_fila_ms': latencia_1,
+            'Latencia_por_fila_lote_ms': latencia_lote,
+        })
+    comparacion = pd.DataFrame(filas)
+
+    print(f"  {'Variante':12} {'Árboles':>8} {'MAE':>7} {'Fit (s)':>8} {'MB':>7} {'1 fila (ms)':>12} {'lote (µs/fila)':>15}")
+    for fila in filas:
+        print(f"  {fila['Variante']:12} {fila['Arboles']:8d} {fila['MAE_medio']:7.2f} {fila['Tiempo_fit_s']:8.2f} "
+              f"{fila['Tamano_MB']:7.2f} {fila['Latencia_1_fila_ms']:12.2f} {fila['Latencia_por_fila_lote_ms'] * 1000:15.1f}")
+    base, alternativa = filas
+    print(f"  Ratio {otro_modo}/{modo}: fit ×{alternativa['Tiempo_fit_s'] / base['Tiempo_fit_s']:.2f}, "
+          f"tamaño ×{alternativa['Tamano_MB'] / base['Tamano_MB']:.2f}, "
+          f"latencia ×{alternativa['Latencia_1_fila_ms'] / base['Latencia_1_fila_ms']:.2f}")
+    return comparacion
+
+
+def _plan_halving(n_candidatos, max_recursos, factor=FACTOR_HALVING):
+    """Rondas (candidatos, recursos) de HalvingRandomSearchCV con min_resources='exhaust'."""
+    n_rondas = 1 + int(np.floor(np.log(n_candidatos) / np.log(factor) + 1e-9))
+    min_recursos = max_recursos // factor ** (n_rondas - 1)
+    return [(int(np.ceil(n_candidatos / factor ** i)), min_recursos * factor ** i) for i in range(n_rondas)]
+
+
+def _trabajo_halving(rondas, max_recursos):
+    """Trabajo de la búsqueda en entrenamientos completos equivalentes (sin el refit)."""
+    return CV_BUSQUEDA * sum(n * r / max_recursos for n, r in rondas)
+
+
+def busqueda_halving(model_base, param_distributions, prefijo, X_train, y_train, recurso, presupuesto_s):
+    """
+    Successive halving sobre n_estimators o sobre el número de muestras.
+
+    Con presupuesto_s se mide cuánto tarda un entrenamiento completo y se
+    elige el mayor número de candidatos cuyo coste estimado cabe en el
+    presupuesto. Devuelve (search ajustada, resumen para informe_busqueda).
+    """
+    param_distributions = dict(param_distributions)
+    arboles = param_distributions[f'{prefijo}n_estimators']
+    fraccion_arboles = np.mean(arboles) / max(arboles)
+    if recurso == 'n_estimators':
+        recurso_search = f'{prefijo}n_estimators'
+        del param_distributions[recurso_search]
+        max_recursos = max(arboles)
+    else:
+        recurso_search = 'n_samples'
+        max_recursos = len(X_train)
+    # Combinaciones distintas: no tiene sentido muestrear más candidatos
+    n_combinaciones = int(np.prod([len(v) for v in param_distributions.values()]))
+
+    # Coste de un entrenamiento completo (max_recursos, árboles máximos), escalado desde uno pequeño
+    arboles_prueba = 20
+    prueba = clone(model_base).set_params(**{f'{prefijo}n_estimators': arboles_prueba})
+    inicio = time.perf_counter()
+    prueba.fit(X_train, y_train)
+    t_unidad = (time.perf_counter() - inicio) * max(arboles) / arboles_prueba
+
+    def coste_estimado(n):
+        rondas = _plan_halving(n, max_recursos)
+        escala = 1 if recurso == 'n_estimators' else fraccion_arboles
+        return (_trabajo_halving(rondas, max_recursos) * escala + 1) * t_unidad
+
+    posibles = [n for n in (FACTOR_HALVING ** j for j in range(1, 8)) if n <= n_combinaciones]
+    posibles = [n for n in posibles if _plan_halving(n, max_recursos)[0][1] >= 1] or [FACTOR_HALVING]
+    if presupuesto_s is None:
+        n_candidatos = min(CANDIDATOS_HALVING_DEFECTO, max(posibles))
+    else:
+        dentro = [n for n in posibles if coste_estimado(n) <= presupuesto_s]
+        n_candidatos = max(dentro) if dentro else min(posibles)
+        if not dentro:
+            print(f"  ⚠️  Ni {n_candidatos} candidatos caben en {presupuesto_s:.0f} s (estimado {coste_estimado(n_candidatos):.0f} s)")
+
+    search = HalvingRandomSearchCV(
         model_base,
         param_distributions,
-        n_iter=20,
-        cv=3,
+        n_candidates=n_candidatos,
+        resource=recurso_search,
+        max_resources=max_recursos,
+        min_resources='exhaust',
+        factor=FACTOR_HALVING,
+        cv=CV_BUSQUEDA,
         scoring='neg_mean_absolute_error',
         random_state=42,
         n_jobs=-1,
         verbose=1
     )
-    
-    random_search.fit(X_train_scaled, y_train)
-    model = random_search.best_estimator_
-    
-    print(f"\n✅ Mejores hiperparámetros encontrados:")
-    for param, value in random_search.best_params_.items():
-        print(f"  {param}: {value}")
+    search.fit(X_train, y_train)
 
-    # --- Validación cruzada ---
-    print("\n🔄 Realizando validación cruzada (5-fold)...")
-    cv_scores = cross_val_score(
-        model, X_train_scaled, y_train,
-        cv=5,
-        scoring='neg_mean_absolute_error',
-        n_jobs=-1
-    )
-    print(f"  MAE promedio (CV): {-cv_scores.mean():.2f} ± {cv_scores.std():.2f} g")
+    rondas = list(zip(search.n_candidates_, search.n_resources_))
+    escala = 1 if recurso == 'n_estimators' else fraccion_arboles
+    return search, {
+        'rondas': rondas,
+        'recurso_final': rondas[-1][1],
+        'ajustes': CV_BUSQUEDA * sum(search.n_candidates_) + 1,
+        'ajustes_base': N_ITER_ALEATORIA * CV_BUSQUEDA + 1 + 5,
+        'equivalentes': _trabajo_halving(rondas, max_recursos) * escala + 1,
+        'equivalentes_base': (N_ITER_ALEATORIA * CV_BUSQUEDA + 1 + 5) * fraccion_arboles,
+        't_unidad_s': t_unidad,
+        'presupuesto_s': presupuesto_s,
+        'estimado_s': coste_estimado(n_candidatos),
+    }
 
-    # --- Evaluar ---
-    y_pred = model.predict(X_test_scaled)
-    mae = mean_absolute_error(y_test, y_pred, multioutput='raw_values')
-    r2 = r2_score(y_test, y_pred, multioutput='raw_values')
-    rmse = np.sqrt(mean_squared_error(y_test, y_pred, multioutput='raw_values'))
 
-    print("\n📊 Métricas (conjunto de prueba):")
-    for i, col in enumerate(target_cols):
-        print(f"  {col:15} → MAE: {mae[i]:5.2f} g, RMSE: {rmse[i]:5.2f} g, R²: {r2[i]:.3f}")
-    
-    # --- Importancia de features ---
-    print("\n🎯 Importancia de features (promedio entre targets):")
-    feature_importance = np.zeros(len(todas_features))
-    for estimator in model.estimators_:
-        feature_importance += estimator.feature_importances_
-    feature_importance /= len(model.estimators_)
-    
-    feature_importance_df = pd.DataFrame({
-        'Feature': todas_features,
-        'Importancia': feature_importance
-    }).sort_values('Importancia', ascending=False)
-    
-    for idx, row in feature_importance_df.head(10).iterrows():
-        print(f"  {row['Feature']:40} → {row['Importancia']:.4f}")
-    
-    # --- Visualizaciones ---
-    print("\n📈 Generando visualizaciones...")
+def informe_busqueda(resumen):
+    """Entrenamientos y tiempo de la búsqueda halving frente a aleatoria + CV 5-fold."""
+    rondas = ' → '.join(f"{n}×{r}" for n, r in resumen['rondas'])
+    print(f"\n📉 Successive halving (candidatos×recurso): {rondas}")
+    print(f"  Entrenamientos: {resumen['ajustes']} (búsqueda aleatoria + CV 5-fold: {resumen['ajustes_base']})")
+    print(f"  Trabajo en entrenamientos completos: {resumen['equivalentes']:.1f} "
+          f"(búsqueda aleatoria + CV 5-fold: ~{resumen['equivalentes_base']:.1f})")
+    # Mismo régimen de paralelismo: el tiempo del pipeline actual se escala por el trabajo relativo
+    tiempo_base = resumen['tiempo_s'] * resumen['equivalentes_base'] / resumen['equivalentes']
+    presupuesto = f", presupuesto {resumen['presupuesto_s']:.0f} s" if resumen['presupuesto_s'] is not None else ''
+    print(f"  Tiempo: {resumen['tiempo_s']:.1f} s (estimado {resumen['estimado_s']:.1f} s{presupuesto}); "
+          f"pipeline actual estimado ~{tiempo_base:.1f} s (ahorro ~{max(tiempo_base - resumen['tiempo_s'], 0):.1f} s)")
+
+
+def _candidatos(mejor_rf):
+    """Familias de modelos a comparar; el RandomForest de la búsqueda ya viene ajustado."""
+    return {
+        'RandomForest (búsqueda)': mejor_rf,
+        'RandomForest poco profundo': MultiOutputRegressor(RandomForestRegressor(
+            n_estimators=50, max_depth=8, min_samples_leaf=2, max_features='sqrt', random_state=42, n_jobs=1
+        )),
+        'HistGradientBoosting': MultiOutputRegressor(HistGradientBoostingRegressor(
+            max_iter=200, learning_rate=0.05, max_leaf_nodes=15, random_state=42
+        )),
+        'Ridge (features polinómicas)': make_pipeline(
+            PolynomialFeatures(degree=2, include_bias=False), Ridge(alpha=1.0)
+        ),
+    }
+
+
+def _motor_servicio(model):
+    """
+    Lo que predice en producción: los bosques se sirven compilados
+    (BosqueCompilado) y el resto con un solo hilo por petición. Así las
+    latencias de los candidatos se miden en las mismas condiciones.
+    """
+    if _es_bosque(model):
+        return BosqueCompilado.desde_sklearn(model)
+    if 'n_jobs' in model.get_params(deep=False):
+        model.set_params(n_jobs=1)
+    return model
+
+
+def _latencia_ms(model, X, repeticiones=50):
+    """p50 de predict() para una fila y tiempo por fila de predict() sobre todo X, con el motor de servicio."""
+    model = _motor_servicio(model)
+    fila = X[:1]
+    model.predict(fila)  # calentamiento
+    tiempos = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        model.predict(X[i % len(X):i % len(X) + 1])
+        tiempos.append(time.perf_counter() - inicio)
+    inicio = time.perf_counter()
+    model.predict(X)
+    por_fila_lote = (time.perf_counter() - inicio) / len(X)
+    return np.percentile(tiempos, 50) * 1000, por_fila_lote * 1000
+
+
+def _tamano_mb(model):
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1e6
+
+
+def seleccionar_modelo(mejor_rf, X_train, y_train, X_test, y_test, target_cols, presupuesto_ms, presupuesto_mb):
+    """
+    Ajusta y mide cada familia candidata y elige la más precisa (MAE medio)
+    dentro del presupuesto de latencia/tamaño. Devuelve (modelo, frontera_df).
+    """
+    filas = []
+    modelos = {}
+    for nombre, candidato in _candidatos(mejor_rf).items():
+        tiempo_fit = np.nan  # el RandomForest de la búsqueda ya está ajustado
+        if candidato is not mejor_rf:
+            inicio = time.perf_counter()
+            candidato.fit(X_train, y_train)
+            tiempo_fit = time.perf_counter() - inicio
+
+        mae = mean_absolute_error(y_test, candidato.predict(X_test), multioutput='raw_values')
+        latencia_1, latencia_lote = _latencia_ms(candidato, X_test)
+        tamano = _tamano_mb(candidato)
+        dentro = ((presupuesto_ms is None or latencia_1 <= presupuesto_ms) and
+                  (presupuesto_mb is None or tamano <= presupuesto_mb))
+
+        modelos[nombre] = candidato
+        fila = {'Modelo': nombre, 'MAE_medio': mae.mean()}
+        fila.update({f'MAE_{col}': mae[i] for i, col in enumerate(target_cols)})
+        fila.update({
+            'Latencia_1_fila_ms': latencia_1,
+            'Latencia_por_fila_lote_ms': latencia_lote,
+            'Tamano_MB': tamano,
+            'Tiempo_fit_s': tiempo_fit,
+            'Dentro_presupuesto': dentro,
+        })
+        filas.append(fila)
+        print(f"  {nombre:30} → MAE: {mae.mean():5.2f} g, 1 fila: {latencia_1:7.2f} ms, "
+              f"lote: {latencia_lote * 1000:7.1f} µs/fila, {tamano:6.2f} MB {'✅' if dentro else '❌'}")
+
+    frontera = pd.DataFrame(filas)
+    validos = frontera[frontera['Dentro_presupuesto']]
+    if validos.empty:
+        print("  ⚠️  Ningún modelo cumple el presupuesto; se usa el de menor latencia")
+        elegido = frontera.loc[frontera['Latencia_1_fila_ms'].idxmin(), 'Modelo']
+    else:
+        elegido = validos.loc[validos['MAE_medio'].idxmin(), 'Modelo']
+    frontera['Seleccionado'] = frontera['Modelo'] == elegido
+    print(f"  🏆 Modelo seleccionado: {elegido}")
+    return modelos[elegido], frontera
+
+
+def _es_bosque(model):
+    return all(isinstance(b, RandomForestRegressor) for b, _ in _bosques_de(model))
+
+
+def generar_graficos(modelos_dir, target_cols, feature_importance_df, y_test, y_pred, errors, r2):
+    """PNG de métricas y de distribución de errores (matplotlib se importa sólo aquí)."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
     fig, axes = plt.subplots(2, 2, figsize=(15, 12))
     
     # 1. Importancia de features
@@ -207,14 +455,13 @@ def main():
     ax4.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    plot_path = os.path.join(MODELOS_DIR, 'metricas_modelo.png')
+    plot_path = os.path.join(modelos_dir, 'metricas_modelo.png')
     plt.savefig(plot_path, dpi=300, bbox_inches='tight')
     print(f"  ✅ Gráficos guardados en: {plot_path}")
     plt.close()
     
     # --- Distribución de errores ---
     fig, axes = plt.subplots(1, 3, figsize=(15, 4))
-    errors = y_test.values - y_pred
     
     for i, (col, ax) in enumerate(zip(target_cols, axes)):
         ax.hist(errors[:, i], bins=30, edgecolor='black', alpha=0.7)
@@ -225,11 +472,215 @@ def main():
         ax.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    error_plot_path = os.path.join(MODELOS_DIR, 'distribucion_errores.png')
+    error_plot_path = os.path.join(modelos_dir, 'distribucion_errores.png')
     plt.savefig(error_plot_path, dpi=300, bbox_inches='tight')
     print(f"  ✅ Distribución de errores guardada en: {error_plot_path}")
     plt.close()
 
+
+def exportar_datos_graficos(modelos_dir, target_cols, y_real, y_pred, errors, bins=30):
+    """
+    Los datos de los gráficos en formatos ligeros para dashboards:
+    predicciones_test.csv (real vs predicho por fila) e histograma_errores.json
+    (bordes y conteos de los mismos 30 bins que distribucion_errores.png).
+    """
+    predicciones = pd.DataFrame({
+        f'{col}_{tipo}': valores[:, i]
+        for i, col in enumerate(target_cols)
+        for tipo, valores in (('real', y_real), ('predicho', y_pred))
+    })
+    predicciones_path = os.path.join(modelos_dir, 'predicciones_test.csv')
+    predicciones.to_csv(predicciones_path, index=False)
+    print(f"  ✅ Predicciones vs reales guardadas en: {predicciones_path}")
+
+    histogramas = {}
+    for i, col in enumerate(target_cols):
+        conteos, bordes = np.histogram(errors[:, i], bins=bins)
+        histogramas[col] = {
+            'bordes': bordes.tolist(),
+            'conteos': conteos.tolist(),
+            'media': float(errors[:, i].mean()),
+            'std': float(errors[:, i].std()),
+        }
+    histograma_path = os.path.join(modelos_dir, 'histograma_errores.json')
+    with open(histograma_path, 'w', encoding='utf-8') as f:
+        json.dump(histogramas, f, ensure_ascii=False, indent=2)
+    print(f"  ✅ Histograma de errores guardado en: {histograma_path}")
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    # --- Rutas ---
+    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    MODELOS_DIR = args.directorio or os.path.join(BASE_DIR, 'ModelosML/MacroNutrientes')
+    os.makedirs(MODELOS_DIR, exist_ok=True)
+
+    todas_features = TODAS_FEATURES
+    target_cols = TARGET_COLS
+
+    if args.por_bloques:
+        # --- Ingesta por bloques: matrices float32 mapeadas en disco, sin cargar el CSV entero ---
+        print(f"📂 Cargando dataset por bloques de {args.tamano_bloque} filas...")
+        inicio_carga = time.perf_counter()
+        arrays, preprocesado, resumen = ingerir_por_bloques(
+            args.dataset, todas_features, FEATURES_OBLIGATORIAS, target_cols,
+            os.path.join(MODELOS_DIR, 'ingesta'), crear_preprocesado(), tamano_bloque=args.tamano_bloque
+        )
+        todas_features = resumen['feature_columns']
+        print(f"✅ Dataset original: {resumen['n_original']} filas ({time.perf_counter() - inicio_carga:.2f} s)")
+        print(f"✅ Filas tras eliminar NaN en obligatorias: {resumen['n_sin_nan']}")
+        print(f"  ⚠️  Outliers removidos: {resumen['n_outliers']} ({resumen['n_outliers']/resumen['n_sin_nan']*100:.1f}%)")
+        X_train_scaled, X_test_scaled = arrays['X_train'], arrays['X_test']
+        y_train = arrays['y_train']
+        y_test = pd.DataFrame(np.asarray(arrays['y_test']), columns=target_cols)
+    else:
+        # --- Cargar datos (limpios y codificados, desde la caché si el CSV no cambió) ---
+        print("📂 Cargando dataset...")
+        inicio_carga = time.perf_counter()
+        datos, desde_cache = cargar_dataset(
+            'macros', TODAS_FEATURES + TARGET_COLS, preparar_datos, path=args.dataset, usar_cache=not args.sin_cache
+        )
+        origen = "caché" if desde_cache else "CSV"
+        print(f"✅ Dataset original: {int(datos['n_original'])} filas ({origen}, {time.perf_counter() - inicio_carga:.2f} s)")
+        print(f"✅ Filas tras eliminar NaN en obligatorias: {int(datos['n_sin_nan'])}")
+        outliers_removed = int(datos['n_sin_nan']) - len(datos['y'])
+        print(f"  ⚠️  Outliers removidos: {outliers_removed} ({outliers_removed/int(datos['n_sin_nan'])*100:.1f}%)")
+
+        X_clean = _dataframe(datos)
+        y_clean = pd.DataFrame(datos['y'], columns=target_cols)
+
+        # --- Dividir datos ---
+        X_train, X_test, y_train, y_test = train_test_split(
+            X_clean, y_clean, test_size=0.2, random_state=42, stratify=X_clean['Objetivo']
+        )
+
+        # --- Preprocesar (codificar, imputar y escalar; ajustado sólo con train) ---
+        preprocesado = crear_preprocesado()
+        X_train_scaled = preprocesado.fit_transform(X_train)
+        X_test_scaled = preprocesado.transform(X_test)
+        todas_features = list(preprocesado[:-1].get_feature_names_out())
+
+    # --- Búsqueda de hiperparámetros ---
+    print(f"🔍 Buscando mejores hiperparámetros (RandomForest {args.multisalida}, búsqueda {args.busqueda})...")
+    # Con MultiOutputRegressor los parámetros del bosque llevan el prefijo estimator__
+    prefijo = 'estimator__' if args.multisalida == 'multioutput' else ''
+    param_distributions = {
+        f'{prefijo}n_estimators': [100, 150, 200],
+        f'{prefijo}max_depth': [10, 15, 20, None],
+        f'{prefijo}min_samples_split': [2, 4, 6],
+        f'{prefijo}min_samples_leaf': [1, 2, 3],
+        f'{prefijo}max_features': ['sqrt', 'log2']
+    }
+    
+    model_base = _bosque(args.multisalida)
+    
+    inicio_busqueda = time.perf_counter()
+    if args.busqueda == 'halving':
+        search, resumen_busqueda = busqueda_halving(
+            model_base, param_distributions, prefijo, X_train_scaled, y_train,
+            args.recurso_halving, args.presupuesto_busqueda_s
+        )
+    else:
+        search = RandomizedSearchCV(
+            model_base,
+            param_distributions,
+            n_iter=N_ITER_ALEATORIA,
+            cv=CV_BUSQUEDA,
+            scoring='neg_mean_absolute_error',
+            random_state=42,
+            n_jobs=-1,
+            verbose=1
+        )
+        search.fit(X_train_scaled, y_train)
+        resumen_busqueda = None
+    tiempo_busqueda = time.perf_counter() - inicio_busqueda
+    model = search.best_estimator_
+    
+    print(f"\n✅ Mejores hiperparámetros encontrados:")
+    for param, value in search.best_params_.items():
+        print(f"  {param}: {value}")
+
+    # --- Validación cruzada ---
+    if args.busqueda == 'halving':
+        # La búsqueda ya validó al ganador: se reutilizan sus puntuaciones en vez de reentrenarlo 5 veces
+        cv_mae = -search.cv_results_['mean_test_score'][search.best_index_]
+        cv_std = search.cv_results_['std_test_score'][search.best_index_]
+        print(f"\n🔄 Validación cruzada de la búsqueda ({CV_BUSQUEDA}-fold, {resumen_busqueda['recurso_final']} {args.recurso_halving}):")
+        print(f"  MAE promedio (CV): {cv_mae:.2f} ± {cv_std:.2f} g")
+        resumen_busqueda['tiempo_s'] = tiempo_busqueda
+        informe_busqueda(resumen_busqueda)
+    else:
+        print("\n🔄 Realizando validación cruzada (5-fold)...")
+        cv_scores = cross_val_score(
+            model, X_train_scaled, y_train,
+            cv=5,
+            scoring='neg_mean_absolute_error',
+            n_jobs=-1
+        )
+        print(f"  MAE promedio (CV): {-cv_scores.mean():.2f} ± {cv_scores.std():.2f} g")
+        print(f"  ⏱️  Búsqueda + validación: {time.perf_counter() - inicio_busqueda:.1f} s, "
+              f"{N_ITER_ALEATORIA * CV_BUSQUEDA + 1 + 5} entrenamientos")
+
+    # --- Comparación multi-salida nativa vs MultiOutputRegressor ---
+    comparacion_df = None
+    if args.comparar_multisalida:
+        print("\n🌲 Comparando RandomForest multi-salida nativo vs MultiOutputRegressor...")
+        mejores_params = {k[len(prefijo):]: v for k, v in search.best_params_.items()}
+        comparacion_df = comparar_multisalida(
+            args.multisalida, mejores_params, X_train_scaled, y_train, X_test_scaled, y_test
+        )
+
+    # --- Selección por presupuesto de inferencia ---
+    frontera_df = None
+    if args.presupuesto_ms is not None or args.presupuesto_mb is not None:
+        print(f"\n⚖️  Comparando familias de modelos (presupuesto: {args.presupuesto_ms} ms, {args.presupuesto_mb} MB)...")
+        model, frontera_df = seleccionar_modelo(
+            model, X_train_scaled, y_train, X_test_scaled, y_test, target_cols,
+            args.presupuesto_ms, args.presupuesto_mb
+        )
+
+    # --- Evaluar ---
+    y_pred = model.predict(X_test_scaled)
+    mae = mean_absolute_error(y_test, y_pred, multioutput='raw_values')
+    r2 = r2_score(y_test, y_pred, multioutput='raw_values')
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred, multioutput='raw_values'))
+
+    print("\n📊 Métricas (conjunto de prueba):")
+    for i, col in enumerate(target_cols):
+        print(f"  {col:15} → MAE: {mae[i]:5.2f} g, RMSE: {rmse[i]:5.2f} g, R²: {r2[i]:.3f}")
+    
+    # --- Importancia de features ---
+    print("\n🎯 Importancia de features (promedio entre targets):")
+    estimadores = getattr(model, 'estimators_', [])
+    if estimadores and all(hasattr(e, 'feature_importances_') for e in estimadores):
+        feature_importance = np.zeros(len(todas_features))
+        for estimator in estimadores:
+            feature_importance += estimator.feature_importances_
+        feature_importance /= len(estimadores)
+    else:
+        # Modelos sin feature_importances_ (p. ej. Ridge): importancia por permutación
+        feature_importance = permutation_importance(
+            model, X_test_scaled, y_test, n_repeats=5, random_state=42
+        ).importances_mean
+    
+    feature_importance_df = pd.DataFrame({
+        'Feature': todas_features,
+        'Importancia': feature_importance
+    }).sort_values('Importancia', ascending=False)
+    
+    for idx, row in feature_importance_df.head(10).iterrows():
+        print(f"  {row['Feature']:40} → {row['Importancia']:.4f}")
+    
+    # --- Visualizaciones ---
+    errors = y_test.values - y_pred
+    if args.datos_graficos:
+        print("\n📈 Exportando datos de los gráficos...")
+        exportar_datos_graficos(MODELOS_DIR, target_cols, y_test.values, y_pred, errors)
+    if not args.sin_graficos:
+        print("\n📈 Generando visualizaciones...")
+        generar_graficos(MODELOS_DIR, target_cols, feature_importance_df, y_test, y_pred, errors, r2)
+
     # --- Guardar métricas ---
     metricas_df = pd.DataFrame({
         'Target': target_cols,
@@ -240,6 +691,16 @@ def main():
     metricas_path = os.path.join(MODELOS_DIR, 'metricas.csv')
     metricas_df.to_csv(metricas_path, index=False)
     print(f"\n� Métricas guardadas en: {metricas_path}")
+
+    if frontera_df is not None:
+        frontera_path = os.path.join(MODELOS_DIR, 'frontera_modelos.csv')
+        frontera_df.to_csv(frontera_path, index=False)
+        print(f"⚖️  Frontera precisión-latencia guardada en: {frontera_path}")
+
+    if comparacion_df is not None:
+        comparacion_path = os.path.join(MODELOS_DIR, 'comparacion_multisalida.csv')
+        comparacion_df.to_csv(comparacion_path, index=False)
+        print(f"🌲 Comparación multi-salida guardada en: {comparacion_path}")
     
     # Guardar importancia de features
     feature_importance_path = os.path.join(MODELOS_DIR, 'feature_importance.csv')
@@ -247,15 +708,26 @@ def main():
     print(f"📊 Importancia de features guardada en: {feature_importance_path}")
 
     # --- Guardar ---
-    print("\n�💾 Guardando modelo y utilidades...")
-    joblib.dump(model, os.path.join(MODELOS_DIR, 'modelo_macros.pkl'))
-    joblib.dump(le_genero, os.path.join(MODELOS_DIR, 'le_genero.pkl'))
-    joblib.dump(le_objetivo, os.path.join(MODELOS_DIR, 'le_objetivo.pkl'))
-    joblib.dump(le_nivel, os.path.join(MODELOS_DIR, 'le_nivel.pkl'))
-    joblib.dump(scaler, os.path.join(MODELOS_DIR, 'scaler.pkl'))
-    joblib.dump(todas_features, os.path.join(MODELOS_DIR, 'feature_columns.pkl'))  # ¡Importante!
-
-    print(f"\n✅ ¡Modelo listo! Guardado en: {MODELOS_DIR}/")
+    # Un único paquete versionado (modelo, preprocesado, features, métricas y
+    # checksums); el servidor lo detecta y lo carga en caliente (ML_Nutricion/paquete.py)
+    print("\n💾 Guardando paquete del modelo...")
+    compilado = None
+    if _es_bosque(model):
+        # Bosque compilado en arrays NumPy para inferencia de baja latencia
+        compilado = BosqueCompilado.desde_sklearn(model)
+        print(f"⚡ Bosque compilado: {compilado.n_arboles} árboles, {compilado.n_nodos} nodos")
+    metricas_paquete = {
+        col: {'MAE': float(mae[i]), 'RMSE': float(rmse[i]), 'R2': float(r2[i])}
+        for i, col in enumerate(target_cols)
+    }
+    version = guardar_paquete(
+        MODELOS_DIR, model, preprocesado, todas_features, target_cols,
+        metricas=metricas_paquete, compilado=compilado
+    )
+    print(f"🏷️  Versión activa: {version}")
+    print("ℹ️  La rejilla precalculada es de cada versión: ScriptsML/RejillaMacros.py la publica como versión nueva")
+
+    print(f"\n✅ ¡Modelo listo! Guardado en: {ruta_activa(MODELOS_DIR)}/")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+Construye la rejilla precalculada de macronutrientes (ML_Nutricion/rejilla.py).
+
+Evalúa el modelo entrenado por MacroNutrientes.py en todos los puntos de la
+rejilla, informa del error máximo de interpolación frente al modelo real y
+la publica como una versión nueva del paquete (la activa más
+rejilla_macros/, ver paquete.derivar_version): las versiones publicadas no
+se modifican y los workers la cargan con la recarga en caliente. La vista
+la usa si settings.MACROS_REJILLA está activo.
+
+Uso: python ScriptsML/RejillaMacros.py
+"""
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from ML_Nutricion.paquete import cargar_feature_columns, derivar_version, ruta_activa
+from ML_Nutricion.preprocesado import valores_rejilla
+from ML_Nutricion.rejilla import RejillaMacros
+
+MODELOS_DIR = os.path.join(PROJECT_DIR, 'ModelosML', 'MacroNutrientes')
+TARGETS = ['Proteínas', 'Carbohidratos', 'Grasas']
+
+
+def main():
+    print("📂 Cargando modelo y preprocesado...")
+    paquete_dir = ruta_activa(MODELOS_DIR)
+    model = joblib.load(os.path.join(paquete_dir, 'modelo_macros.pkl'))
+    preprocesado = joblib.load(os.path.join(paquete_dir, 'preprocesado.pkl'))
+    feature_columns = cargar_feature_columns(paquete_dir)
+    categorias, fijos = valores_rejilla(preprocesado)
+    scaler = preprocesado[-1]
+
+    def predict(X):
+        return model.predict(scaler.transform(X))
+
+    print("🔄 Evaluando el modelo sobre la rejilla...")
+    inicio = time.perf_counter()
+    rejilla = RejillaMacros.construir(predict, feature_columns, categorias, fijos)
+    print(f"✅ Rejilla {rejilla.valores.shape} ({rejilla.nbytes / 1e6:.1f} MB) "
+          f"en {time.perf_counter() - inicio:.1f} s")
+
+    print("\n🔍 Error de interpolación frente al modelo (5000 puntos aleatorios):")
+    errores = rejilla.evaluar_error(predict)
+    for i, col in enumerate(TARGETS):
+        print(f"  {col:15} → máx: {errores['max'][i]:6.2f} g, p99: {errores['p99'][i]:6.2f} g, "
+              f"MAE: {errores['mae'][i]:5.2f} g")
+
+    # --- Latencia de consulta ---
+    X = np.zeros((1, len(feature_columns)))
+    for nombre, eje in rejilla.ejes.items():
+        X[0, feature_columns.index(nombre)] = eje[len(eje) // 2]
+    for nombre, valor in rejilla.fijos.items():
+        X[0, feature_columns.index(nombre)] = valor
+    repeticiones = 2000
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        rejilla.predict(X)
+    por_fila = (time.perf_counter() - inicio) / repeticiones
+    X_lote = np.repeat(X, 10000, axis=0)
+    inicio = time.perf_counter()
+    rejilla.predict(X_lote)
+    por_fila_lote = (time.perf_counter() - inicio) / len(X_lote)
+    print(f"\n⏱️  Consulta: {por_fila * 1e6:.1f} µs (1 fila), {por_fila_lote * 1e6:.2f} µs/fila (lote de 10000)")
+
+    version = derivar_version(MODELOS_DIR, {'rejilla_macros': rejilla})
+    print(f"\n💾 Rejilla publicada en la versión {version}: {ruta_activa(MODELOS_DIR)}/rejilla_macros/")
+
+
+if __name__ == "__main__":
+    main()
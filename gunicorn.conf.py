@@ -0,0 +1,33 @@
+"""
+Configuración de gunicorn (se lee automáticamente desde la raíz del proyecto).
+
+Con preload_app la aplicación Django se importa en el master y los modelos ML
+se cargan ahí antes de hacer fork: los workers heredan los arrays mapeados
+en memoria (ver ML_Nutricion/artefactos.py) y el sistema operativo comparte
+sus páginas en lugar de tener una copia por worker.
+"""
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    # Sólo con preload_app Django ya está configurado en el master
+    if not server.cfg.preload_app:
+        return
+    from ML_Nutricion.plan import recomendador_plan
+    from ML_Nutricion.predictor import registro_macros
+    # Sin hilo de recarga en el master: un hilo vivo al hacer fork puede dejar
+    # locks tomados en los workers; cada worker arranca el suyo
+    precargas = (
+        ('macronutrientes', lambda: registro_macros.cargar(vigilar=False), registro_macros.stats),
+        ('plan', recomendador_plan.cargar, recomendador_plan.stats),
+    )
+    for nombre, cargar, stats in precargas:
+        try:
+            cargar()
+            server.log.info("Modelo de %s precargado en el master: %s", nombre, stats())
+        except (OSError, ValueError) as e:
+            # ValueError: checksum del paquete o catálogo que no corresponde al índice
+            server.log.warning("No se pudo precargar el modelo de %s: %s", nombre, e)